@@ -0,0 +1,138 @@
+import os
+import json
+import time
+import threading
+from datetime import datetime
+import cv2
+import numpy as np
+
+# Cache settings
+ANALYSIS_CACHE_MAX_DISTANCE = int(os.environ.get("ANALYSIS_CACHE_MAX_DISTANCE", "6"))  # Hamming distance out of 64 bits
+ANALYSIS_CACHE_MAX_ENTRIES = int(os.environ.get("ANALYSIS_CACHE_MAX_ENTRIES", "50"))
+ANALYSIS_CACHE_MAX_AGE_SEC = float(os.environ.get("ANALYSIS_CACHE_MAX_AGE", str(24 * 3600)))
+
+# Bucket sizes used to decide whether two sensor summaries are "the same"
+TEMPERATURE_BUCKET = 1.0  # °C
+HUMIDITY_BUCKET = 5.0     # %
+
+
+def image_phash(image):
+    """64-bit DCT perceptual hash of a BGR or greyscale frame"""
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(image, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:8, :8].flatten()
+    # Ignore the DC term so overall brightness shifts do not dominate
+    bits = low > np.median(low[1:])
+    return int("".join("1" if b else "0" for b in bits), 2)
+
+
+def sensor_bucket(sensor_data):
+    """Coarse key for the sensor summary sent alongside the tank image"""
+    parts = []
+    for metric, size in (("temperature", TEMPERATURE_BUCKET), ("humidity", HUMIDITY_BUCKET)):
+        stats = sensor_data[metric]
+        parts.append(":".join(f"{round(stats[stat] / size)}" for stat in ("min", "max", "avg", "current")))
+    return f"t{parts[0]}|h{parts[1]}"
+
+
+class AnalysisCache:
+    """Persistent cache of model results keyed by perceptual image hash.
+
+    Entries match when they are of the same kind, share the same context key
+    (e.g. the sensor bucket) and their hashes are within ``max_distance`` bits.
+    The least recently used entry is evicted once ``max_entries`` is reached,
+    and entries older than ``max_age`` seconds are never returned.
+    """
+
+    def __init__(self, path, max_distance=ANALYSIS_CACHE_MAX_DISTANCE,
+                 max_entries=ANALYSIS_CACHE_MAX_ENTRIES, max_age=ANALYSIS_CACHE_MAX_AGE_SEC):
+        self.path = path
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._entries = []
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r') as f:
+                self._entries = json.load(f)
+        except Exception as e:
+            print(f"[{datetime.now()}] WARNING: Failed to load analysis cache: {str(e)}")
+            self._entries = []
+
+    def _save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self._entries, f)
+        os.replace(tmp_path, self.path)
+
+    def _persist(self):
+        try:
+            self._save()
+        except Exception as e:
+            print(f"[{datetime.now()}] WARNING: Failed to persist analysis cache: {str(e)}")
+
+    def _expire(self, now):
+        self._entries = [e for e in self._entries if now - e["created"] <= self.max_age]
+
+    def lookup(self, kind, phash, context=None, max_age=None):
+        """Return the closest cached result or None, only from the last ``max_age`` seconds if given"""
+        if self.max_entries <= 0:
+            return None
+        with self._lock:
+            now = time.time()
+            self._expire(now)
+            best = None
+            best_distance = self.max_distance + 1
+            for entry in self._entries:
+                if entry["kind"] != kind or entry["context"] != context:
+                    continue
+                if max_age is not None and now - entry["created"] > max_age:
+                    continue
+                distance = bin(entry["phash"] ^ phash).count("1")
+                if distance < best_distance:
+                    best, best_distance = entry, distance
+            if best is None:
+                return None
+            # Hits are at most a couple per capture, so the LRU order is saved with each one to survive restarts
+            best["last_used"] = now
+            self._persist()
+            return best["result"]
+
+    def fallback(self, kind, phash):
+        """Return the closest unexpired result of ``kind`` at any distance or context.
+
+        Used when the model is unavailable, so a stale answer beats none.
+        """
+        with self._lock:
+            self._expire(time.time())
+            candidates = [e for e in self._entries if e["kind"] == kind]
+            if not candidates:
+                return None
+            return min(candidates, key=lambda e: bin(e["phash"] ^ phash).count("1"))["result"]
+
+    def store(self, kind, phash, result, context=None):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            now = time.time()
+            self._expire(now)
+            self._entries = [e for e in self._entries
+                             if not (e["kind"] == kind and e["context"] == context and e["phash"] == phash)]
+            self._entries.append({
+                "kind": kind,
+                "phash": phash,
+                "context": context,
+                "result": result,
+                "created": now,
+                "last_used": now
+            })
+            if len(self._entries) > self.max_entries:
+                self._entries.sort(key=lambda e: e["last_used"])
+                self._entries = self._entries[-self.max_entries:]
+            self._persist()
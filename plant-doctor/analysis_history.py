@@ -0,0 +1,112 @@
+import sqlite3
+import threading
+from datetime import datetime
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS plant_results (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    recorded_at REAL NOT NULL,
+    plant_id INTEGER NOT NULL,
+    plant_type TEXT NOT NULL,
+    plant_status TEXT NOT NULL,
+    plant_diagnosis TEXT NOT NULL,
+    plant_position TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS plant_results_recorded_at ON plant_results (recorded_at);
+CREATE INDEX IF NOT EXISTS plant_results_plant_id ON plant_results (plant_id, recorded_at);
+CREATE INDEX IF NOT EXISTS plant_results_plant_type ON plant_results (plant_type, recorded_at);
+CREATE INDEX IF NOT EXISTS plant_results_status ON plant_results (plant_status, recorded_at);
+
+CREATE TABLE IF NOT EXISTS tank_results (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    recorded_at REAL NOT NULL,
+    tank_status TEXT NOT NULL,
+    temperature_analysis TEXT NOT NULL,
+    humidity_analysis TEXT NOT NULL,
+    combined_diagnosis TEXT NOT NULL,
+    recommendations TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tank_results_recorded_at ON tank_results (recorded_at);
+CREATE INDEX IF NOT EXISTS tank_results_status ON tank_results (tank_status, recorded_at);
+"""
+
+PLANT_COLUMNS = ("plant_id", "plant_type", "plant_status", "plant_diagnosis", "plant_position")
+TANK_COLUMNS = ("tank_status", "temperature_analysis", "humidity_analysis", "combined_diagnosis", "recommendations")
+
+
+def _row_to_dict(row):
+    record = dict(row)
+    record["recorded_at"] = datetime.fromtimestamp(record["recorded_at"]).isoformat()
+    return record
+
+
+class AnalysisHistory:
+    """Append-only SQLite log of every PlantHealth and TankHealth result.
+
+    Rows are indexed by plant_id, plant_type, status and time so the history
+    endpoints are answered by index range scans rather than log queries.
+    """
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+
+    def record_plants(self, plants, recorded_at):
+        """Append one row per plant from a HealthResponse ``log``"""
+        rows = [(recorded_at.timestamp(), *(plant[c] for c in PLANT_COLUMNS)) for plant in plants]
+        with self._lock, self._db:
+            self._db.executemany(
+                f"INSERT INTO plant_results (recorded_at, {', '.join(PLANT_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+    def record_tank(self, tank, recorded_at):
+        with self._lock, self._db:
+            self._db.execute(
+                f"INSERT INTO tank_results (recorded_at, {', '.join(TANK_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?)",
+                (recorded_at.timestamp(), *(tank[c] for c in TANK_COLUMNS)))
+
+    def plant_timeline(self, plant_id, start=None, end=None, limit=500):
+        """Results for one plant in time order"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT * FROM plant_results WHERE plant_id = ? AND recorded_at >= ? AND recorded_at <= ? "
+                "ORDER BY recorded_at LIMIT ?",
+                (plant_id, start or 0, end or float("inf"), limit)).fetchall()
+        return [_row_to_dict(row) for row in rows]
+
+    def status_counts(self, start=None, end=None, plant_type=None):
+        """Number of plant and tank results per status in a time range"""
+        bounds = (start or 0, end or float("inf"))
+        with self._lock:
+            if plant_type:
+                plant_rows = self._db.execute(
+                    "SELECT plant_status AS status, COUNT(*) AS count FROM plant_results "
+                    "WHERE plant_type = ? AND recorded_at >= ? AND recorded_at <= ? GROUP BY plant_status",
+                    (plant_type, *bounds)).fetchall()
+            else:
+                plant_rows = self._db.execute(
+                    "SELECT plant_status AS status, COUNT(*) AS count FROM plant_results "
+                    "WHERE recorded_at >= ? AND recorded_at <= ? GROUP BY plant_status", bounds).fetchall()
+            tank_rows = self._db.execute(
+                "SELECT tank_status AS status, COUNT(*) AS count FROM tank_results "
+                "WHERE recorded_at >= ? AND recorded_at <= ? GROUP BY tank_status", bounds).fetchall()
+        return {
+            "plants": {row["status"]: row["count"] for row in plant_rows},
+            "tank": {row["status"]: row["count"] for row in tank_rows}
+        }
+
+    def latest_critical(self, limit=20):
+        """Most recent critical plant and tank findings, newest first"""
+        with self._lock:
+            plant_rows = self._db.execute(
+                "SELECT * FROM plant_results WHERE plant_status = 'critical' ORDER BY recorded_at DESC LIMIT ?",
+                (limit,)).fetchall()
+            tank_rows = self._db.execute(
+                "SELECT * FROM tank_results WHERE tank_status = 'critical' ORDER BY recorded_at DESC LIMIT ?",
+                (limit,)).fetchall()
+        return {
+            "plants": [_row_to_dict(row) for row in plant_rows],
+            "tank": [_row_to_dict(row) for row in tank_rows]
+        }
@@ -0,0 +1,309 @@
+"""Benchmark the plant-doctor pipeline against a synthetic camera and local stubs.
+
+Nothing leaves the machine: frames come from SyntheticCapture, model calls go
+to a local chat-completions stub and sensor queries to a Prometheus stub that
+also swallows the OTLP exports. Results are written as JSON; with --compare
+the run fails when a median latency or a route's throughput regressed by
+more than --tolerance against an earlier result file.
+
+    python benchmarks/run.py --output results.json
+    python benchmarks/run.py --compare results.json
+"""
+import os
+import re
+import io
+import sys
+import json
+import time
+import argparse
+import platform
+import shutil
+import socket
+import tempfile
+import statistics
+import subprocess
+import contextlib
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVICE_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, SERVICE_DIR)
+
+from stubs import PLANT_RESULT, SyntheticCapture, openai_stub, prometheus_stub
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20, help="Runs of each pipeline stage")
+    parser.add_argument("--route-requests", type=int, default=200, help="Requests per Flask route")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent clients per Flask route")
+    parser.add_argument("--openai-latency", type=float, default=0.5, help="Seconds the model stub takes to answer")
+    parser.add_argument("--prometheus-latency", type=float, default=0.01, help="Seconds the Prometheus stub takes to answer")
+    parser.add_argument("--sensor-mode", choices=("raw", "promql"), default="raw")
+    parser.add_argument("--output", help="Write the results to this JSON file instead of stdout")
+    parser.add_argument("--compare", help="Earlier results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative regression for --compare")
+    parser.add_argument("--verbose", action="store_true", help="Show the service's own output")
+    return parser.parse_args()
+
+
+def summarise(durations, wall=None):
+    """Latency percentiles in milliseconds, plus throughput when ``wall`` is given"""
+    ms = sorted(d * 1000 for d in durations)
+
+    def percentile(p):
+        return ms[min(len(ms) - 1, round(p / 100 * (len(ms) - 1)))]
+
+    summary = {
+        "count": len(ms),
+        "mean_ms": statistics.fmean(ms),
+        "min_ms": ms[0],
+        "p50_ms": percentile(50),
+        "p95_ms": percentile(95),
+        "p99_ms": percentile(99),
+        "max_ms": ms[-1]
+    }
+    if wall is not None:
+        summary["throughput_rps"] = len(ms) / wall
+    return summary
+
+
+def measure(fn, iterations, setup=None):
+    durations = []
+    for _ in range(iterations):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        result = fn()
+        durations.append(time.perf_counter() - started)
+        if result is None or (isinstance(result, dict) and result.get("status", "success") != "success"):
+            raise RuntimeError(f"{getattr(fn, '__name__', fn)} failed: {result}")
+    return summarise(durations)
+
+
+def benchmark_pipeline(service, tank, iterations):
+    results = {}
+    frame = tank.camera.latest_frame()[1]
+
+    results["take_picture"] = measure(lambda: service.take_picture(tank), iterations)
+    results["encode_image"] = measure(lambda: service.encode_image(frame, roi=tank.roi), iterations)
+    results["vision_screen"] = measure(lambda: tank.screen.screen(frame, datetime.now()), iterations)
+
+    cache_ttl = tank.sensor_client.cache_ttl
+    tank.sensor_client.cache_ttl = 0
+    results["fetch_sensor_data.uncached"] = measure(lambda: service.fetch_sensor_data(tank), iterations)
+    tank.sensor_client.cache_ttl = cache_ttl
+    service.fetch_sensor_data(tank)
+    results["fetch_sensor_data.cached"] = measure(lambda: service.fetch_sensor_data(tank), iterations)
+
+    # Every run sends the whole frame to the model stub, then only the changed plants'
+    # regions (none, the synthetic plants never change), then every run reuses the analysis cache
+    max_entries = tank.analysis_cache.max_entries
+    full_interval = tank.plant_regions.full_interval
+    tank.analysis_cache.max_entries = 0
+    tank.plant_regions.full_interval = 0
+    results["capture_and_analyze.model"] = measure(lambda: service.capture_and_analyze(tank), iterations)
+    tank.plant_regions.full_interval = full_interval
+    results["capture_and_analyze.regions"] = measure(lambda: service.capture_and_analyze(tank), iterations)
+    tank.analysis_cache.max_entries = max_entries
+    service.capture_and_analyze(tank)
+    results["capture_and_analyze.cached"] = measure(lambda: service.capture_and_analyze(tank), iterations)
+    return results
+
+
+def route_paths(app, values):
+    """``(rule, path)`` for every GET route, filling URL arguments from ``values``"""
+    paths = []
+    for rule in app.url_map.iter_rules():
+        # Live streams never finish, so they cannot be timed per request
+        if rule.endpoint in ("static", "get_stream") or "GET" not in rule.methods:
+            continue
+        if not rule.arguments <= set(values):
+            print(f"Skipping {rule.rule}, no value for {', '.join(sorted(rule.arguments - set(values)))}",
+                  file=sys.stderr)
+            continue
+        paths.append((rule.rule, re.sub(r"<(?:[^:<>]+:)?([^<>]+)>", lambda m: str(values[m.group(1)]), rule.rule)))
+    # Capture triggers last, so their background runs do not overlap the read-only routes
+    return sorted(paths, key=lambda route: route[1].endswith("/capture"))
+
+
+def load_route(base_url, path, total, concurrency):
+    durations = []
+    statuses = {}
+    lock = threading.Lock()
+
+    def client(count):
+        with requests.Session() as session:
+            for _ in range(count):
+                started = time.perf_counter()
+                response = session.get(base_url + path, timeout=30)
+                elapsed = time.perf_counter() - started
+                with lock:
+                    durations.append(elapsed)
+                    statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    shares = [total // concurrency + (1 if i < total % concurrency else 0) for i in range(concurrency)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(client, [n for n in shares if n]))
+    summary = summarise(durations, time.perf_counter() - started)
+    summary["status_codes"] = {str(code): count for code, count in sorted(statuses.items())}
+    return summary
+
+
+def benchmark_routes(service, tank, total, concurrency):
+    from werkzeug.serving import make_server
+
+    server = make_server("127.0.0.1", 0, service.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    images = tank.image_store.list(limit=1)
+    job = tank.capture_queue.submit("benchmark")
+    values = {
+        "tank_id": tank.id,
+        "plant_id": PLANT_RESULT["log"][0]["plant_id"],
+        "name": images[0]["name"] if images else "missing.jpg",
+        "job_id": job.id
+    }
+    try:
+        # Keyed by rule so results from different runs line up
+        return {f"GET {rule}": load_route(base_url, path, total, concurrency)
+                for rule, path in route_paths(service.app, values)}
+    finally:
+        server.shutdown()
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=SERVICE_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def compare(results, baseline, tolerance):
+    """Return a line for every benchmark that got slower or lost throughput"""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        if current["p50_ms"] > previous["p50_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p50 {previous['p50_ms']:.2f}ms -> {current['p50_ms']:.2f}ms")
+        if "throughput_rps" in current and "throughput_rps" in previous \
+                and current["throughput_rps"] < previous["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{name}: {previous['throughput_rps']:.1f} -> {current['throughput_rps']:.1f} req/s")
+    return regressions
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def run(args):
+    openai_server = openai_stub(args.openai_latency)
+    prometheus_server = prometheus_stub(args.prometheus_latency)
+    workdir = tempfile.mkdtemp(prefix="plant-doctor-bench-")
+    os.environ.update({
+        "OPENAI_API_KEY": "benchmark",
+        "OPENAI_BASE_URL": f"{openai_server.url}/v1",
+        "OPENAI_RATE_PER_MIN": "1000000",  # Measure the pipeline, not the rate limiter
+        "OPENAI_BURST": "1000",
+        "OPENAI_MAX_CONCURRENCY": "16",
+        "OPENAI_DAILY_BUDGET": "0",
+        "PROMETHEUS_URL": prometheus_server.url,
+        "OTLP_ENDPOINT": prometheus_server.url,
+        "SENSOR_MODE": args.sensor_mode,
+        "IMAGE_DIR": workdir,
+        "TANK_CONFIG": os.path.join(workdir, "tanks.json"),
+        "CAMERA_SETTLE_SEC": "0.5",
+        "SCREEN_INTERVAL_SEC": "0",
+        "LEADER_CONTROL_PORT": str(free_port())
+    })
+    cv2.VideoCapture = SyntheticCapture
+
+    started = time.perf_counter()
+    import main as service
+    imported = time.perf_counter() - started
+
+    # Start like a production worker: leader election, cameras, scheduler and the startup capture
+    client = service.create_app().test_client()
+    served = time.perf_counter() - started
+    client.get("/")
+    first_page = time.perf_counter() - started
+    deadline = time.monotonic() + 60
+    while client.get("/api/ready").status_code != 200:
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"Service not ready: {client.get('/api/ready').get_json()}")
+        time.sleep(0.05)
+    ready = time.perf_counter() - started
+    startup_results = {
+        "startup.import": summarise([imported]),
+        "startup.create_app": summarise([served]),
+        "startup.first_dashboard": summarise([first_page]),
+        "startup.ready": summarise([ready])
+    }
+
+    tank = service.default_tank
+    startup = tank.capture_queue.submit("benchmark")
+    while startup.in_flight:
+        time.sleep(0.1)
+
+    results = startup_results
+    results.update(benchmark_pipeline(service, tank, args.iterations))
+    results.update(benchmark_routes(service, tank, args.route_requests, args.concurrency))
+    tank.camera.stop()
+    openai_server.close()
+    prometheus_server.close()
+    shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def main():
+    args = parse_args()
+    output = sys.stdout
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    with quiet:
+        results = run(args)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "opencv": cv2.__version__,
+            "config": {k: v for k, v in vars(args).items() if k not in ("output", "compare", "verbose")}
+        },
+        "results": results
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, output, indent=2)
+        output.write("\n")
+
+    for name, summary in results.items():
+        rps = f"  {summary['throughput_rps']:8.1f} req/s" if "throughput_rps" in summary else ""
+        print(f"{name:55s} p50 {summary['p50_ms']:9.2f}ms  p95 {summary['p95_ms']:9.2f}ms{rps}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare, "r") as f:
+            regressions = compare(results, json.load(f)["results"], args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
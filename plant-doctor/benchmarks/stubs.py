@@ -0,0 +1,185 @@
+import json
+import time
+import math
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import cv2
+import numpy as np
+
+# Canned structured outputs, keyed by the response_format schema name
+PLANT_RESULT = {"log": [
+    {"plant_status": "info", "plant_type": "venus flytrap", "plant_id": 1,
+     "plant_diagnosis": "Healthy traps with good red colouring", "plant_position": "top left",
+     "plant_box": {"x": 0.167, "y": 0.204, "width": 0.188, "height": 0.333}},
+    {"plant_status": "warning", "plant_type": "pitcher plant", "plant_id": 2,
+     "plant_diagnosis": "Older pitchers browning at the lip", "plant_position": "centre",
+     "plant_box": {"x": 0.38, "y": 0.306, "width": 0.229, "height": 0.407}},
+    {"plant_status": "info", "plant_type": "sundew", "plant_id": 3,
+     "plant_diagnosis": "Dewy tentacles, active growth", "plant_position": "bottom right",
+     "plant_box": {"x": 0.677, "y": 0.602, "width": 0.156, "height": 0.278}}
+]}
+TANK_RESULT = {
+    "tank_status": "info",
+    "temperature_analysis": "Stable between 20 and 26°C",
+    "humidity_analysis": "Humidity holds above 80%",
+    "combined_diagnosis": "Conditions suit the plants",
+    "recommendations": "No action needed"
+}
+RESULTS = {"HealthResponse": PLANT_RESULT, "TankHealth": TANK_RESULT}
+
+
+class SyntheticCapture:
+    """Stands in for cv2.VideoCapture with generated 1080p frames.
+
+    Every frame has a few plant-coloured blobs and a little sensor noise, so
+    the JPEG size and perceptual hash behave like a real tank.
+    """
+
+    def __init__(self, port=0, fps=30.0, seed=0):
+        self.fps = fps
+        self.rng = np.random.default_rng(seed)
+        base = np.full((1080, 1920, 3), (60, 80, 70), np.uint8)
+        cv2.circle(base, (500, 400), 180, (40, 160, 50), -1)    # flytrap
+        cv2.circle(base, (950, 550), 220, (50, 120, 150), -1)   # pitcher
+        cv2.circle(base, (1450, 800), 150, (60, 60, 190), -1)   # sundew
+        self.base = base
+        self._next_frame = time.monotonic()
+
+    def isOpened(self):
+        return True
+
+    def set(self, prop, value):
+        return True
+
+    def grab(self):
+        # Pace grabs like a real device so the capture thread does not spin
+        delay = self._next_frame - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        self._next_frame = max(self._next_frame + 1.0 / self.fps, time.monotonic())
+        return True
+
+    def retrieve(self):
+        noise = self.rng.integers(0, 8, size=(1080 // 8, 1920 // 8, 1), dtype=np.uint8)
+        frame = self.base + cv2.resize(noise, (1920, 1080), interpolation=cv2.INTER_NEAREST)[:, :, None]
+        return True, frame
+
+    def read(self):
+        self.grab()
+        return self.retrieve()
+
+    def release(self):
+        pass
+
+
+class StubServer:
+    """Threaded HTTP server on a free localhost port, stopped with ``close``"""
+
+    def __init__(self, handler):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class QuietHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, body, status=200):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def read_body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+
+def openai_stub(latency=0.0):
+    """OpenAI chat-completions stub that answers after ``latency`` seconds.
+
+    The reply is the canned result for the request's response_format, so
+    ``client.beta.chat.completions.parse`` returns a validated model.
+    """
+
+    class Handler(QuietHandler):
+        requests = 0
+
+        def do_POST(self):
+            request = json.loads(self.read_body())
+            Handler.requests += 1
+            time.sleep(latency)
+            name = request.get("response_format", {}).get("json_schema", {}).get("name")
+            if name not in RESULTS:
+                self.send_json({"error": {"message": f"Unknown response format {name}", "type": "invalid_request_error"}}, 400)
+                return
+            self.send_json({
+                "id": f"chatcmpl-{Handler.requests}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model", "gpt-4o"),
+                "choices": [{
+                    "index": 0,
+                    "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": json.dumps(RESULTS[name])}
+                }],
+                "usage": {"prompt_tokens": 1100, "completion_tokens": 120, "total_tokens": 1220}
+            })
+
+    return StubServer(Handler)
+
+
+def sensor_value(metric, t):
+    """Smooth day/night curves for the synthetic sensor series"""
+    phase = 2 * math.pi * (t % 86400) / 86400
+    if metric == "humidity_percent":
+        return 88.0 + 6.0 * math.cos(phase)
+    return 23.0 + 3.0 * math.sin(phase)
+
+
+def prometheus_stub(latency=0.0):
+    """Prometheus query_range stub serving both the raw series and the PromQL summaries.
+
+    Also accepts OTLP exports on /v1/*, so the service's exporters have a
+    local endpoint during a benchmark.
+    """
+
+    class Handler(QuietHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path != "/api/v1/query_range":
+                self.send_json({"status": "error", "error": "not found"}, 404)
+                return
+            params = {k: v[0] for k, v in parse_qs(url.query).items()}
+            time.sleep(latency)
+            start, end = float(params["start"]), float(params["end"])
+            step = 300 if params.get("step", "5m") == "5m" else float(params["step"])
+            timestamps = np.arange(start - start % step, end, step)
+            query = params["query"]
+            names = [name for name in ("temperature_celsius", "humidity_percent") if name in query]
+            result = []
+            for name in names:
+                values = [[float(t), f"{sensor_value(name, t):.2f}"] for t in timestamps]
+                if query.startswith("rate("):
+                    values = [[t, "0.0001"] for t, _ in values]
+                result.append({"metric": {"__name__": name}, "values": values})
+            self.send_json({"status": "success", "data": {"resultType": "matrix", "result": result}})
+
+        def do_POST(self):
+            self.read_body()
+            self.send_response(200)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+    return StubServer(Handler)
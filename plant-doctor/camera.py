@@ -0,0 +1,174 @@
+import os
+import time
+import threading
+from collections import deque
+from datetime import datetime
+import cv2
+from opentelemetry import trace
+
+CAMERA_PORT = int(os.environ.get("CAMERA_PORT", "0"))
+CAMERA_SETTLE_SEC = float(os.environ.get("CAMERA_SETTLE_SEC", "2"))    # Exposure warm-up after (re)opening
+CAMERA_SAMPLE_FPS = float(os.environ.get("CAMERA_SAMPLE_FPS", "2"))    # Frames decoded into the ring buffer per second
+CAMERA_LIVE_FPS = float(os.environ.get("CAMERA_LIVE_FPS", "10"))        # Decode rate while live viewers are watching
+CAMERA_BUFFER_SIZE = int(os.environ.get("CAMERA_BUFFER_SIZE", "4"))
+CAMERA_MAX_BACKOFF_SEC = 30
+
+tracer = trace.get_tracer(__name__)
+
+# Set camera properties - these are the settings that worked well
+CAMERA_SETTINGS = [
+    (cv2.CAP_PROP_FRAME_WIDTH, 1920),
+    (cv2.CAP_PROP_FRAME_HEIGHT, 1080),
+    (cv2.CAP_PROP_BRIGHTNESS, 0),   # Matches v4l2 brightness setting
+    (cv2.CAP_PROP_CONTRAST, 32),    # Matches v4l2 contrast setting
+    (cv2.CAP_PROP_SATURATION, 64),  # Matches v4l2 saturation setting
+    (cv2.CAP_PROP_HUE, 0),          # Matches v4l2 hue setting
+    (cv2.CAP_PROP_SHARPNESS, 5),    # Matches v4l2 sharpness setting
+    (cv2.CAP_PROP_GAIN, 10),        # Matches v4l2 gain setting
+    (cv2.CAP_PROP_AUTO_WB, 1),      # Auto white balance ON
+    (cv2.CAP_PROP_BACKLIGHT, 0),    # Backlight compensation OFF
+    (cv2.CAP_PROP_EXPOSURE, 200),   # Exposure setting
+]
+
+
+class CameraManager:
+    """Keeps the camera open on a background thread.
+
+    The device is opened and configured once. Every frame is grabbed so the
+    driver queue never goes stale, and frames are decoded into a small ring
+    buffer at ``sample_fps``, or at ``live_fps`` while a listener is
+    subscribed. Captures are served from the newest frame taken after the
+    exposure has settled. If the device disappears it is reopened with
+    exponential backoff.
+    """
+
+    def __init__(self, port=CAMERA_PORT, settle_sec=CAMERA_SETTLE_SEC, sample_fps=CAMERA_SAMPLE_FPS,
+                 buffer_size=CAMERA_BUFFER_SIZE, live_fps=CAMERA_LIVE_FPS):
+        self.port = port
+        self.settle_sec = settle_sec
+        self.sample_interval = 1.0 / sample_fps if sample_fps > 0 else 0.0
+        self.live_fps = live_fps
+        self.live_interval = min(self.sample_interval, 1.0 / live_fps) if live_fps > 0 else self.sample_interval
+        self.frames = deque(maxlen=buffer_size)
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stop = threading.Event()
+        self._settled_at = None
+        self._listeners = []
+        self.reconnects = 0
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        with self._cond:
+            if self.running:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name=f"camera-{self.port}", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _open(self):
+        with tracer.start_as_current_span("camera.open", attributes={"camera.port": self.port}) as span:
+            cam = cv2.VideoCapture(self.port)
+            span.set_attribute("camera.opened", cam.isOpened())
+            if not cam.isOpened():
+                cam.release()
+                return None
+            for prop, value in CAMERA_SETTINGS:
+                cam.set(prop, value)
+            span.set_attribute("camera.settle_sec", self.settle_sec)
+            return cam
+
+    def _run(self):
+        backoff = 1.0
+        while not self._stop.is_set():
+            cam = self._open()
+            if cam is None:
+                print(f"[{datetime.now()}] ERROR: Could not open camera on port {self.port}, retrying in {backoff:.0f}s")
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, CAMERA_MAX_BACKOFF_SEC)
+                continue
+
+            print(f"[{datetime.now()}] Camera opened on port {self.port}")
+            with self._cond:
+                self.frames.clear()
+                self._settled_at = time.monotonic() + self.settle_sec
+            last_sample = 0.0
+            try:
+                while not self._stop.is_set():
+                    if not cam.grab():
+                        print(f"[{datetime.now()}] ERROR: Lost camera on port {self.port}, reconnecting in {backoff:.0f}s")
+                        self.reconnects += 1
+                        break
+
+                    now = time.monotonic()
+                    interval = self.live_interval if self._listeners else self.sample_interval
+                    if now < self._settled_at or now - last_sample < interval:
+                        continue
+
+                    result, frame = cam.retrieve()
+                    if result and frame is not None:
+                        last_sample = now
+                        backoff = 1.0  # Only a delivered frame proves the device works
+                        captured_at = datetime.now()
+                        with self._cond:
+                            self.frames.append((captured_at, frame))
+                            self._cond.notify_all()
+                            listeners = list(self._listeners)
+                        for listener in listeners:
+                            try:
+                                listener(captured_at, frame)
+                            except Exception as e:
+                                print(f"[{datetime.now()}] ERROR: Frame listener failed on camera {self.port}: {str(e)}")
+            finally:
+                cam.release()
+            # A device that opens but will not deliver frames backs off like one that will not open
+            self._stop.wait(backoff)
+            backoff = min(backoff * 2, CAMERA_MAX_BACKOFF_SEC)
+
+    def subscribe(self, listener):
+        """Call ``listener(captured_at, frame)`` on the camera thread for every decoded frame.
+
+        Listeners must return quickly, they hold up the next grab.
+        """
+        with self._cond:
+            self._listeners.append(listener)
+        self.start()
+
+    def unsubscribe(self, listener):
+        with self._cond:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def latest_frame(self, timeout=10.0):
+        """Return ``(captured_at, frame)`` for the newest settled frame, or None"""
+        self.start()
+        with tracer.start_as_current_span("camera.read", attributes={"camera.port": self.port}) as span:
+            started = time.monotonic()
+            with self._cond:
+                # Only waits while the camera is still opening or warming up
+                found = self._cond.wait_for(lambda: len(self.frames) > 0, timeout=timeout)
+                span.set_attribute("camera.wait_ms", (time.monotonic() - started) * 1000)
+                if not found:
+                    span.set_attribute("camera.frame_available", False)
+                    return None
+                captured_at, frame = self.frames[-1]
+            span.set_attribute("camera.frame_available", True)
+            span.set_attribute("camera.frame_age_ms", (datetime.now() - captured_at).total_seconds() * 1000)
+            span.set_attribute("camera.reconnects", self.reconnects)
+            return captured_at, frame
+
+    def next_frame(self, after, timeout=10.0):
+        """Wait for a frame captured after ``after`` and return it, or None"""
+        self.start()
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.frames and self.frames[-1][0] > after, timeout=timeout):
+                return None
+            return self.frames[-1]
@@ -1,6 +1,11 @@
-import subprocess
+import os
+import sys
 import time
 import socket
+import requests
+
+# Check the live view by reading plant-doctor's own MJPEG stream. The service
+# keeps the camera open, so opening /dev/video0 here would fight it for the device.
 
 # Get the device's IP address
 def get_ip():
@@ -14,28 +19,44 @@ def get_ip():
         print(f"[ERROR] Failed to get device IP: {e}")
         return "127.0.0.1"  # Fallback to localhost
 
-# Define the RTSP stream URL
-ip_address = get_ip()
-rtsp_url = f"rtsp://localhost:8554/mystream"
-
-# FFmpeg command to stream webcam to RTSP
-ffmpeg_cmd = [
-    "ffmpeg", "-re", "-f", "v4l2", "-i", "/dev/video0",
-    "-c:v", "libx264", "-preset", "ultrafast", "-tune", "zerolatency",
-    "-f", "rtsp", rtsp_url
-]
+# Define the stream URL, e.g. http://localhost:5000/tanks/tank-1/stream?fps=5
+stream_url = sys.argv[1] if len(sys.argv) > 1 else os.environ.get("STREAM_URL", "http://localhost:5000/stream")
+frames_to_check = int(os.environ.get("CHECK_FRAMES", "30"))
 
-# Start the RTSP server process
-print(f"[INFO] Starting RTSP stream at {rtsp_url}")
-rtsp_process = subprocess.Popen(ffmpeg_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+print(f"[INFO] Live view available at http://{get_ip()}:5000/stream")
+print(f"[INFO] Reading {frames_to_check} frames from {stream_url}")
 
 try:
-    while True:
-        time.sleep(1)  # Keep the script running
-        output = rtsp_process.stderr.readline()
-        if output:
-            print(f"[DEBUG] {output.strip()}")  # Print FFmpeg logs
+    with requests.get(stream_url, stream=True, timeout=10) as response:
+        if response.status_code != 200:
+            print(f"[ERROR] Stream returned {response.status_code}: {response.text}")
+            sys.exit(1)
+
+        started = time.monotonic()
+        total_bytes = 0
+        for count in range(1, frames_to_check + 1):
+            # Every part is a boundary line, headers with Content-Length, a blank line and the JPEG
+            headers = {}
+            while True:
+                line = response.raw.readline()
+                if not line:
+                    print(f"[ERROR] Stream ended after {count - 1} frames")
+                    sys.exit(1)
+                line = line.decode("latin-1").strip()
+                if not line and headers:
+                    break
+                if ":" in line:
+                    name, value = line.split(":", 1)
+                    headers[name.strip().lower()] = value.strip()
+            jpeg = response.raw.read(int(headers["content-length"]))
+            total_bytes += len(jpeg)
+            print(f"[DEBUG] Frame {count}: {len(jpeg)} bytes")
+
+        elapsed = time.monotonic() - started
+        print(f"[INFO] {frames_to_check} frames in {elapsed:.1f}s ({frames_to_check / elapsed:.1f} fps, "
+              f"{total_bytes / frames_to_check / 1024:.0f} KiB per frame)")
+except requests.RequestException as e:
+    print(f"[ERROR] Failed to read the stream: {e}")
+    sys.exit(1)
 except KeyboardInterrupt:
-    print("[INFO] Stopping RTSP stream.")
-    rtsp_process.terminate()
-    print("[INFO] RTSP Server stopped.")
+    print("[INFO] Stopping stream check.")
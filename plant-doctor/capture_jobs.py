@@ -0,0 +1,106 @@
+import uuid
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+# How many finished jobs to remember for /api/jobs/<id>
+MAX_JOB_HISTORY = 50
+
+
+class CaptureJob:
+    """State of a single capture-and-analyze run"""
+
+    def __init__(self, source, tank=None):
+        self.id = uuid.uuid4().hex
+        self.tank = tank
+        self.status = "queued"  # queued, running, succeeded, failed
+        self.progress = "queued"
+        self.sources = [source]
+        self.submitted_at = datetime.now()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+
+    @property
+    def in_flight(self):
+        return self.status in ("queued", "running")
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "tank": self.tank,
+            "status": self.status,
+            "progress": self.progress,
+            "sources": list(self.sources),
+            "submitted_at": self.submitted_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "result": self.result,
+            "error": self.error
+        }
+
+
+class CaptureJobQueue:
+    """Runs one tank's capture jobs one at a time in the background.
+
+    The tank's camera and latest analysis are shared, so only one of its jobs
+    runs at a time. A trigger that arrives while a job is queued or running is
+    merged into that job rather than starting another capture.
+
+    Queues for several tanks may share one bounded ``executor`` so their
+    jobs run in parallel without one thread per tank.
+    """
+
+    def __init__(self, runner, executor=None, tank=None):
+        self.runner = runner
+        self.tank = tank
+        self.executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix="capture")
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+        self._active = None
+
+    def submit(self, source="manual"):
+        """Queue a capture, or join the one already in flight. Returns the job."""
+        with self._lock:
+            if self._active is not None and self._active.in_flight:
+                self._active.sources.append(source)
+                return self._active
+
+            job = CaptureJob(source, self.tank)
+            self._jobs[job.id] = job
+            while len(self._jobs) > MAX_JOB_HISTORY:
+                self._jobs.popitem(last=False)
+            self._active = job
+
+        self.executor.submit(self._run, job)
+        return job
+
+    def current(self):
+        """The job queued or running right now, or None"""
+        with self._lock:
+            return self._active if self._active is not None and self._active.in_flight else None
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _set_progress(self, job, stage):
+        job.progress = stage
+
+    def _run(self, job):
+        job.status = "running"
+        job.started_at = datetime.now()
+        try:
+            job.result = self.runner(progress=lambda stage: self._set_progress(job, stage))
+            job.status = "succeeded" if job.result and job.result.get("status") == "success" else "failed"
+            if job.status == "failed" and job.result:
+                job.error = job.result.get("message")
+        except Exception as e:
+            print(f"[{datetime.now()}] ERROR: Capture job {job.id} failed: {str(e)}")
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.progress = "finished"
+            job.finished_at = datetime.now()
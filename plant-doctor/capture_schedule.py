@@ -0,0 +1,161 @@
+import os
+import threading
+from datetime import datetime, timedelta
+
+# Automatic captures only run while the tank lights are on, as "start-end" hours; "0-24" for always
+CAPTURE_HOURS = os.environ.get("CAPTURE_HOURS", "9-18")
+
+# Time between automatic captures, by the worst plant or tank status of the last analysis.
+# While everything stays at info the interval grows by CAPTURE_BACKOFF_FACTOR per analysis.
+CAPTURE_STABLE_INTERVAL_SEC = float(os.environ.get("CAPTURE_STABLE_INTERVAL_SEC", str(4 * 3600)))
+CAPTURE_MAX_INTERVAL_SEC = float(os.environ.get("CAPTURE_MAX_INTERVAL_SEC", str(12 * 3600)))
+CAPTURE_BACKOFF_FACTOR = float(os.environ.get("CAPTURE_BACKOFF_FACTOR", "1.5"))
+CAPTURE_WARNING_INTERVAL_SEC = float(os.environ.get("CAPTURE_WARNING_INTERVAL_SEC", "3600"))
+CAPTURE_CRITICAL_INTERVAL_SEC = float(os.environ.get("CAPTURE_CRITICAL_INTERVAL_SEC", "1200"))
+
+# Automatic triggers this soon after the previous analysis are coalesced into it
+CAPTURE_MIN_GAP_SEC = float(os.environ.get("CAPTURE_MIN_GAP_SEC", "600"))
+
+# How often the scheduler checks which tanks are due
+CAPTURE_CHECK_SEC = 60
+
+# A capture makes up to two model calls, one for the plants and one for the tank
+CALLS_PER_CAPTURE = 2
+
+STATUS_RANK = {"info": 0, "warning": 1, "critical": 2}
+
+
+def parse_hours(value):
+    """Parse a "9-18" hour window into ``(start, end)``"""
+    start, end = (int(v) for v in value.split("-"))
+    return start, end
+
+
+def worst_status(statuses):
+    """The most severe of some info/warning/critical statuses, info if there are none"""
+    ranked = [status.lower() for status in statuses if status and status.lower() in STATUS_RANK]
+    return max(ranked, key=STATUS_RANK.get, default="info")
+
+
+class CaptureSchedule:
+    """When one tank is next captured automatically.
+
+    Every analysis sets the next run from its worst status: soon while
+    something is at warning or critical, and further out for every stable
+    analysis in a row, up to ``max_interval``.
+    """
+
+    def __init__(self, stable_interval=CAPTURE_STABLE_INTERVAL_SEC, max_interval=CAPTURE_MAX_INTERVAL_SEC,
+                 backoff=CAPTURE_BACKOFF_FACTOR, warning_interval=CAPTURE_WARNING_INTERVAL_SEC,
+                 critical_interval=CAPTURE_CRITICAL_INTERVAL_SEC):
+        self.intervals = {"warning": warning_interval, "critical": critical_interval}
+        self.stable_interval = stable_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.status = None
+        self.interval = stable_interval
+        self.analysed_at = None
+        self.next_due = None  # None until the first analysis, so the tank is due straight away
+        self.last_trigger = None
+        self._lock = threading.Lock()
+
+    def record(self, status, analysed_at=None):
+        """Schedule the next capture after an analysis whose worst status was ``status``"""
+        analysed_at = analysed_at or datetime.now()
+        with self._lock:
+            if status in self.intervals:
+                self.interval = self.intervals[status]
+            elif self.status == "info":
+                self.interval = min(self.max_interval, self.interval * self.backoff)
+            else:
+                self.interval = self.stable_interval
+            self.status = status
+            self.analysed_at = analysed_at
+            self.next_due = analysed_at + timedelta(seconds=self.interval)
+
+    def triggered(self, source, now=None):
+        """Note an automatic capture; a failed run is retried one interval later"""
+        now = now or datetime.now()
+        with self._lock:
+            self.last_trigger = {"source": source, "at": now}
+            self.next_due = now + timedelta(seconds=self.interval)
+
+    def postpone(self, now=None):
+        """Check again one interval from now, e.g. while the budget is spent"""
+        now = now or datetime.now()
+        with self._lock:
+            self.next_due = now + timedelta(seconds=self.interval)
+
+    def due(self, now=None):
+        now = now or datetime.now()
+        return self.next_due is None or now >= self.next_due
+
+    def recently_analysed(self, min_gap, now=None):
+        now = now or datetime.now()
+        return self.analysed_at is not None and (now - self.analysed_at).total_seconds() < min_gap
+
+    def to_dict(self):
+        return {
+            "status": self.status,
+            "interval_sec": self.interval,
+            "analysed_at": self.analysed_at.isoformat() if self.analysed_at else None,
+            "next_due": self.next_due.isoformat() if self.next_due else None,
+            "last_trigger": {"source": self.last_trigger["source"], "at": self.last_trigger["at"].isoformat()}
+            if self.last_trigger else None
+        }
+
+
+class CaptureScheduler:
+    """Decides which automatic triggers become captures.
+
+    Scheduled runs follow each tank's CaptureSchedule inside the ``hours``
+    window. Every automatic trigger, whether scheduled, a screen escalation or
+    an alert, is coalesced into a capture already in flight or one that
+    finished within ``min_gap``, and is skipped when ``budget`` has fewer
+    calls left than a capture needs. Manual captures bypass the scheduler.
+    """
+
+    def __init__(self, tanks, budget=None, hours=parse_hours(CAPTURE_HOURS), min_gap=CAPTURE_MIN_GAP_SEC):
+        self.tanks = tanks
+        self.budget = budget
+        self.hours = hours
+        self.min_gap = min_gap
+
+    def in_hours(self, now=None):
+        start, end = self.hours
+        return start <= (now or datetime.now()).hour < end
+
+    def trigger(self, tank, source):
+        """Queue an automatic capture of ``tank``. Returns ``(job, None)`` or ``(None, reason)`` if skipped."""
+        job = tank.capture_queue.current()
+        if job is not None:
+            return tank.capture_queue.submit(source), None
+        if tank.schedule.recently_analysed(self.min_gap):
+            return None, "coalesced"
+        remaining = self.budget.remaining if self.budget is not None else None
+        if remaining is not None and remaining < CALLS_PER_CAPTURE:
+            return None, "budget"
+        tank.schedule.triggered(source)
+        return tank.capture_queue.submit(source), None
+
+    def to_dict(self):
+        return {
+            "hours": list(self.hours),
+            "min_gap_sec": self.min_gap,
+            "budget": self.budget.to_dict() if self.budget is not None else None,
+            "tanks": {tank_id: tank.schedule.to_dict() for tank_id, tank in self.tanks.items()}
+        }
+
+
+def alert_tanks(alert, tanks):
+    """Tanks a Grafana alert refers to.
+
+    An alert matches a tank through a ``tank_id`` label or through every
+    label the tank's sensor series are selected by. A tank without sensor
+    labels matches every alert.
+    """
+    labels = alert.get("labels") or {}
+    if labels.get("tank_id") in tanks:
+        return [tanks[labels["tank_id"]]]
+    return [tank for tank in tanks.values()
+            if all(labels.get(name) == value for name, value in tank.sensor_labels.items())]
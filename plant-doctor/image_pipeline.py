@@ -0,0 +1,109 @@
+import os
+import json
+import base64
+import hashlib
+from datetime import datetime, timezone
+from functools import cached_property
+import cv2
+import numpy as np
+from analysis_cache import image_phash
+
+# Preprocessing settings applied once per capture, before the JPEG is shared
+IMAGE_MAX_SIDE = int(os.environ.get("IMAGE_MAX_SIDE", "0"))           # Longest side in pixels, 0 keeps full size
+IMAGE_JPEG_QUALITY = int(os.environ.get("IMAGE_JPEG_QUALITY", "85"))
+
+
+def parse_roi(value):
+    """Parse an "x,y,width,height" string into a tuple, or None if unset"""
+    if not value:
+        return None
+    x, y, w, h = (int(v) for v in value.split(","))
+    return x, y, w, h
+
+
+def default_roi():
+    """The IMAGE_ROI crop ("x,y,width,height" in source pixels) of a single-tank setup, or None.
+
+    Read when asked rather than on import, so a malformed value is reported
+    instead of stopping the service from loading.
+    """
+    try:
+        return parse_roi(os.environ.get("IMAGE_ROI", ""))
+    except ValueError:
+        print(f"[{datetime.now()}] WARNING: Ignoring malformed IMAGE_ROI {os.environ.get('IMAGE_ROI')!r}, "
+              f"expected x,y,width,height")
+        return None
+
+
+class ProcessedImage:
+    """A capture encoded once to JPEG and shared by the model calls and disk writer"""
+
+    def __init__(self, pixels, jpeg, captured_at=None):
+        self.pixels = pixels
+        self.jpeg = jpeg
+        self.captured_at = captured_at or datetime.now()
+
+    @cached_property
+    def b64(self):
+        return base64.b64encode(self.jpeg).decode("utf-8")
+
+    @cached_property
+    def data_url(self):
+        return f"data:image/jpeg;base64,{self.b64}"
+
+    @cached_property
+    def b64_json(self):
+        """Serialised body for /api/image/base64, built once per capture"""
+        return json.dumps({"status": "success", "data": self.b64}).encode("utf-8")
+
+    @cached_property
+    def etag(self):
+        return hashlib.md5(self.jpeg).hexdigest()
+
+    @property
+    def last_modified(self):
+        return self.captured_at.astimezone(timezone.utc)
+
+    @cached_property
+    def phash(self):
+        return image_phash(self.pixels)
+
+    def write(self, path):
+        """Write the encoded JPEG to ``path`` atomically"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(self.jpeg)
+        os.replace(tmp_path, path)
+
+
+def crop_roi(frame, roi):
+    """Return the ``(x, y, width, height)`` region of a frame, or the whole frame"""
+    if not roi:
+        return frame
+    x, y, w, h = roi
+    return frame[y:y + h, x:x + w]
+
+
+def preprocess_frame(frame, max_side=IMAGE_MAX_SIDE, quality=IMAGE_JPEG_QUALITY, roi=None, captured_at=None):
+    """Crop to ``roi`` (the whole frame if None), downscale and JPEG-encode a raw camera frame in memory"""
+    frame = crop_roi(frame, roi)
+
+    height, width = frame.shape[:2]
+    scale = max_side / max(height, width) if max_side else 1.0
+    if scale < 1.0:
+        frame = cv2.resize(frame, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+
+    ok, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError("Failed to encode frame as JPEG")
+    return ProcessedImage(frame, buffer.tobytes(), captured_at)
+
+
+def load_image(path):
+    """Load an already-encoded JPEG from disk without re-encoding it"""
+    with open(path, "rb") as f:
+        jpeg = f.read()
+    pixels = cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if pixels is None:
+        raise ValueError(f"Failed to decode image: {path}")
+    return ProcessedImage(pixels, jpeg, datetime.fromtimestamp(os.path.getmtime(path)))
@@ -0,0 +1,168 @@
+import os
+import time
+import sqlite3
+import threading
+from datetime import datetime
+import cv2
+from opentelemetry import trace
+
+# Retention limits, 0 disables a limit
+IMAGE_RETENTION_COUNT = int(os.environ.get("IMAGE_RETENTION_COUNT", "5"))
+IMAGE_RETENTION_BYTES = int(os.environ.get("IMAGE_RETENTION_BYTES", "0"))
+IMAGE_RETENTION_DAYS = float(os.environ.get("IMAGE_RETENTION_DAYS", "0"))
+IMAGE_THUMBNAIL_WIDTH = int(os.environ.get("IMAGE_THUMBNAIL_WIDTH", "0"))  # 0 disables thumbnails
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    name TEXT PRIMARY KEY,
+    captured_at REAL NOT NULL,
+    bytes INTEGER NOT NULL,
+    thumbnail TEXT,
+    thumbnail_bytes INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS images_captured_at ON images (captured_at);
+"""
+
+tracer = trace.get_tracer(__name__)
+
+
+class ImageStore:
+    """Archive of captured frames with a SQLite index.
+
+    Inserts and evictions touch only the newest and oldest rows, and the
+    running count and byte totals are kept in memory. Retention therefore
+    costs the same however many frames are kept, and listings never scan
+    the directory.
+    """
+
+    def __init__(self, directory, index_path, max_count=IMAGE_RETENTION_COUNT, max_bytes=IMAGE_RETENTION_BYTES,
+                 max_age_days=IMAGE_RETENTION_DAYS, thumbnail_width=IMAGE_THUMBNAIL_WIDTH):
+        self.directory = directory
+        self.max_count = max_count
+        self.max_bytes = max_bytes
+        self.max_age_sec = max_age_days * 86400
+        self.thumbnail_width = thumbnail_width
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(index_path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")  # Web workers read while the leader writes
+        self._db.executescript(SCHEMA)
+        self._backfill()
+        self.count, self.total_bytes = self._db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(bytes + thumbnail_bytes), 0) FROM images").fetchone()
+
+    def _backfill(self):
+        """Index frames left by older versions that only kept files on disk"""
+        if self._db.execute("SELECT 1 FROM images LIMIT 1").fetchone():
+            return
+        rows = []
+        for name in os.listdir(self.directory):
+            if name.startswith("plant_") and name.endswith(".jpg"):
+                path = os.path.join(self.directory, name)
+                stat = os.stat(path)
+                rows.append((name, stat.st_mtime, stat.st_size))
+        if rows:
+            with self._db:
+                self._db.executemany("INSERT OR IGNORE INTO images (name, captured_at, bytes) VALUES (?, ?, ?)", rows)
+            print(f"[{datetime.now()}] Indexed {len(rows)} existing images")
+
+    def _write_thumbnail(self, image, name):
+        height, width = image.pixels.shape[:2]
+        if not self.thumbnail_width or width <= self.thumbnail_width:
+            return None, 0
+        size = (self.thumbnail_width, round(height * self.thumbnail_width / width))
+        thumb = cv2.resize(image.pixels, size, interpolation=cv2.INTER_AREA)
+        ok, buffer = cv2.imencode(".jpg", thumb, [cv2.IMWRITE_JPEG_QUALITY, 75])
+        if not ok:
+            return None, 0
+        thumb_name = f"thumb_{name}"
+        with open(os.path.join(self.directory, thumb_name), "wb") as f:
+            f.write(buffer.tobytes())
+        return thumb_name, len(buffer)
+
+    def _remove_files(self, row):
+        for name in (row["name"], row["thumbnail"]):
+            if not name:
+                continue
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                print(f"[{datetime.now()}] ERROR: Failed to delete old image {name}: {str(e)}")
+
+    def _delete(self, row):
+        self._db.execute("DELETE FROM images WHERE name = ?", (row["name"],))
+        self.count -= 1
+        self.total_bytes -= row["bytes"] + row["thumbnail_bytes"]
+        self._remove_files(row)
+
+    def _over_limit(self, oldest_captured_at):
+        if self.max_count and self.count > self.max_count:
+            return True
+        if self.max_bytes and self.total_bytes > self.max_bytes:
+            return True
+        if self.max_age_sec and oldest_captured_at < time.time() - self.max_age_sec:
+            return True
+        return False
+
+    def _evict(self):
+        """Delete the oldest frames while over a retention limit. Returns how many were deleted."""
+        evicted = 0
+        while self.count > 1:
+            oldest = self._db.execute("SELECT * FROM images ORDER BY captured_at LIMIT 1").fetchone()
+            if oldest is None or not self._over_limit(oldest["captured_at"]):
+                break
+            self._delete(oldest)
+            evicted += 1
+            print(f"[{datetime.now()}] Deleted old image: {oldest['name']}")
+        return evicted
+
+    @tracer.start_as_current_span("image_store.add")
+    def add(self, image):
+        """Write a ProcessedImage to the archive and apply retention. Returns its file name."""
+        span = trace.get_current_span()
+        name = f"plant_{image.captured_at.strftime('%Y%m%d_%H%M%S')}.jpg"
+        image.write(os.path.join(self.directory, name))
+        thumb_name, thumb_bytes = self._write_thumbnail(image, name)
+        span.set_attribute("image.bytes", len(image.jpeg))
+        span.set_attribute("image.thumbnail_bytes", thumb_bytes)
+
+        with self._lock:
+            with self._db:
+                existing = self._db.execute("SELECT * FROM images WHERE name = ?", (name,)).fetchone()
+                if existing:
+                    self.count -= 1
+                    self.total_bytes -= existing["bytes"] + existing["thumbnail_bytes"]
+                self._db.execute(
+                    "INSERT OR REPLACE INTO images (name, captured_at, bytes, thumbnail, thumbnail_bytes) VALUES (?, ?, ?, ?, ?)",
+                    (name, image.captured_at.timestamp(), len(image.jpeg), thumb_name, thumb_bytes))
+                self.count += 1
+                self.total_bytes += len(image.jpeg) + thumb_bytes
+                with tracer.start_as_current_span("image_store.retention") as retention:
+                    retention.set_attribute("retention.evicted", self._evict())
+                    retention.set_attribute("store.count", self.count)
+                    retention.set_attribute("store.total_bytes", self.total_bytes)
+        return name
+
+    def list(self, limit=20, before=None):
+        """Return up to ``limit`` records, newest first, captured before the ``before`` timestamp"""
+        with self._lock:
+            if before is None:
+                rows = self._db.execute("SELECT * FROM images ORDER BY captured_at DESC LIMIT ?", (limit,)).fetchall()
+            else:
+                rows = self._db.execute("SELECT * FROM images WHERE captured_at < ? ORDER BY captured_at DESC LIMIT ?",
+                                        (before, limit)).fetchall()
+        return [dict(row) for row in rows]
+
+    def totals(self):
+        """Return ``(count, bytes)`` from the index; other web workers never see the leader's running totals"""
+        with self._lock:
+            return tuple(self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(bytes + thumbnail_bytes), 0) FROM images").fetchone())
+
+    def path(self, name):
+        """Return the on-disk path of an indexed image or thumbnail, or None"""
+        with self._lock:
+            row = self._db.execute("SELECT 1 FROM images WHERE name = ? OR thumbnail = ?", (name, name)).fetchone()
+        return os.path.join(self.directory, name) if row else None
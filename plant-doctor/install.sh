@@ -53,7 +53,10 @@ mkdir -p "$INSTALL_DIR/templates"
 
 # Copy application files
 echo "📄 Copying files..."
-cp main.py requirements.txt "$INSTALL_DIR"
+cp *.py requirements.txt "$INSTALL_DIR"
+if [[ -f tanks.json ]]; then
+    cp tanks.json "$INSTALL_DIR"
+fi
 cp -r templates/* "$INSTALL_DIR/templates/"
 
 # Store the OpenAI API token securely
@@ -96,12 +99,14 @@ Description=Plant Doctor - AI Plant Health Analysis
 After=network.target
 
 [Service]
-ExecStart=$VENV_DIR/bin/python $INSTALL_DIR/main.py
+ExecStart=$VENV_DIR/bin/gunicorn --workers \${WEB_WORKERS} --threads \${WEB_THREADS} --bind 0.0.0.0:5000 --timeout 120 wsgi:app
 WorkingDirectory=$INSTALL_DIR
 Restart=always
 User=plant
 Group=plant
 Environment="PYTHONUNBUFFERED=1"
+Environment="WEB_WORKERS=2"
+Environment="WEB_THREADS=8"
 EnvironmentFile=$ENV_FILE
 
 [Install]
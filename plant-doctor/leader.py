@@ -0,0 +1,81 @@
+import os
+import json
+import fcntl
+import threading
+from datetime import datetime
+
+# Retry interval for workers waiting to take over from the leader
+LEADER_RETRY_SEC = float(os.environ.get("LEADER_RETRY_SEC", "5"))
+
+
+class LeaderLock:
+    """Elects one process on this host to own the cameras and the scheduler.
+
+    Every worker tries a non-blocking exclusive ``flock`` on ``path``. The
+    winner keeps the file open for its whole life and writes its pid and
+    control URL into it; the others retry every ``retry_sec`` seconds, so
+    another worker takes over if the leader exits or crashes. The kernel
+    releases the lock with the process, so a stale lock file never blocks.
+    """
+
+    def __init__(self, path, on_elected, control_url=None, retry_sec=LEADER_RETRY_SEC):
+        self.path = path
+        self.on_elected = on_elected
+        self.control_url = control_url
+        self.retry_sec = retry_sec
+        self.is_leader = False
+        self.started = False
+        self._file = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _try_acquire(self):
+        f = open(self.path, "a+")
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        f.seek(0)
+        f.truncate()
+        json.dump({"pid": os.getpid(), "control_url": self.control_url, "since": datetime.now().isoformat()}, f)
+        f.flush()
+        self._file = f
+        self.is_leader = True
+        return True
+
+    def start(self):
+        """Try to lead now; if another process leads, keep trying in the background"""
+        if self.started:
+            return
+        self.started = True
+        if self._try_acquire():
+            print(f"[{datetime.now()}] Process {os.getpid()} is the leader")
+            self.on_elected()
+            return
+        print(f"[{datetime.now()}] Process {os.getpid()} is a follower of {self.leader().get('pid')}")
+        self._thread = threading.Thread(target=self._wait_for_leadership, name="leader-election", daemon=True)
+        self._thread.start()
+
+    def _wait_for_leadership(self):
+        while not self._stop.wait(self.retry_sec):
+            if self._try_acquire():
+                print(f"[{datetime.now()}] Process {os.getpid()} took over as leader")
+                self.on_elected()
+                return
+
+    def leader(self):
+        """The current leader's pid and control URL, as written into the lock file"""
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def stop(self):
+        self._stop.set()
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+        self.is_leader = False
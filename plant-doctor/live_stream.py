@@ -0,0 +1,236 @@
+import os
+import time
+import threading
+from collections import deque
+import cv2
+from opentelemetry import metrics
+from image_pipeline import crop_roi
+
+# Per-viewer defaults and limits; viewers can ask for less with ?fps=, ?width= and ?quality=
+STREAM_MIN_FPS = float(os.environ.get("STREAM_MIN_FPS", "1"))
+STREAM_WIDTH = int(os.environ.get("STREAM_WIDTH", "960"))
+STREAM_MIN_WIDTH = int(os.environ.get("STREAM_MIN_WIDTH", "320"))
+STREAM_JPEG_QUALITY = int(os.environ.get("STREAM_JPEG_QUALITY", "70"))
+STREAM_QUEUE_SIZE = int(os.environ.get("STREAM_QUEUE_SIZE", "2"))      # Frames buffered per viewer
+STREAM_MAX_VIEWERS = int(os.environ.get("STREAM_MAX_VIEWERS", "8"))    # Per camera
+STREAM_IDLE_TIMEOUT_SEC = float(os.environ.get("STREAM_IDLE_TIMEOUT_SEC", "5"))  # End the stream without frames
+
+# Every open stream holds a web worker thread, and a forwarded one also a thread of the leader.
+# Viewers of all cameras together stay below WEB_THREADS, so the dashboard and API always get a thread.
+STREAM_MAX_TOTAL_VIEWERS = int(os.environ.get("STREAM_MAX_TOTAL_VIEWERS",
+                                              str(max(1, int(os.environ.get("WEB_THREADS", "8")) // 2))))
+
+# A viewer's rate and size are lowered at most this often while it drops frames,
+# and raised again after this long without a drop
+STREAM_ADAPT_SEC = 2.0
+STREAM_RECOVER_SEC = 10.0
+
+BOUNDARY = "frame"
+CONTENT_TYPE = f"multipart/x-mixed-replace; boundary={BOUNDARY}"
+
+
+class StreamViewer:
+    """One live view client with its own bounded frame queue.
+
+    Frames are offered at up to ``fps``. When the queue is full the oldest
+    frame is dropped, so a slow viewer only loses frames and never holds up
+    the camera or other viewers. While it keeps dropping, its frame rate is
+    halved down to STREAM_MIN_FPS and then its width reduced; after a quiet
+    spell both step back up towards what it asked for.
+    """
+
+    def __init__(self, roi, fps, width, quality, queue_size=STREAM_QUEUE_SIZE):
+        self.roi = roi
+        self.max_fps = self.fps = fps
+        self.max_width = self.width = width
+        self.quality = quality
+        self.queue = deque(maxlen=queue_size)
+        self.sent = 0
+        self.dropped = 0
+        self.closed = False
+        self._cond = threading.Condition()
+        self._next_at = 0.0
+        self._adapted_at = time.monotonic()
+
+    def offer(self, frame_id, frame):
+        """Queue a frame unless it comes too soon for this viewer's rate; runs on the camera thread"""
+        now = time.monotonic()
+        with self._cond:
+            if now < self._next_at:
+                return
+            # A little slack, so camera jitter does not halve the rate
+            self._next_at = now + 0.9 / self.fps
+            if len(self.queue) == self.queue.maxlen:
+                self.dropped += 1
+                self._slow_down(now)
+            elif now - self._adapted_at >= STREAM_RECOVER_SEC:
+                self._speed_up(now)
+            self.queue.append((frame_id, frame))
+            self._cond.notify()
+
+    def _slow_down(self, now):
+        if now - self._adapted_at < STREAM_ADAPT_SEC:
+            return
+        if self.fps > STREAM_MIN_FPS:
+            self.fps = max(STREAM_MIN_FPS, self.fps / 2)
+        elif self.width > STREAM_MIN_WIDTH:
+            self.width = max(STREAM_MIN_WIDTH, self.width * 3 // 4)
+        self._adapted_at = now
+
+    def _speed_up(self, now):
+        if self.width < self.max_width:
+            self.width = min(self.max_width, self.width * 4 // 3)
+        elif self.fps < self.max_fps:
+            self.fps = min(self.max_fps, self.fps * 2)
+        self._adapted_at = now
+
+    def next(self, timeout):
+        """Return ``(frame_id, frame, width)`` for the oldest queued frame, or None on timeout or close"""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.queue or self.closed, timeout=timeout) or self.closed:
+                return None
+            frame_id, frame = self.queue.popleft()
+            return frame_id, frame, self.width
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self.queue.clear()
+            self._cond.notify()
+
+
+# Shared by the streams of every camera in this process
+viewer_slots = threading.BoundedSemaphore(STREAM_MAX_TOTAL_VIEWERS)
+
+
+class LiveStream:
+    """Fans one camera's frames out to any number of live viewers as MJPEG.
+
+    The camera only decodes at its live rate while someone is watching.
+    Encoding happens on the viewers' own threads, never the camera's, and
+    each frame is encoded once per region, width and quality however many
+    viewers share those settings; viewers with different settings encode in
+    parallel. Tanks that share a camera share its stream.
+    """
+
+    def __init__(self, camera, max_viewers=STREAM_MAX_VIEWERS, slots=viewer_slots):
+        self.camera = camera
+        self.max_viewers = max_viewers
+        self.slots = slots
+        self.viewers = []
+        self.sent = 0      # Totals over every viewer, including those that left
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._frame_id = 0
+        self._encode_locks = {}  # (roi, width, quality) -> lock
+        self._encoded = {}       # (roi, width, quality) -> (frame_id, jpeg)
+
+    def _publish(self, captured_at, frame):
+        self._frame_id += 1
+        with self._lock:
+            viewers = list(self.viewers)
+        for viewer in viewers:
+            viewer.offer(self._frame_id, frame)
+
+    def open(self, roi=None, fps=None, width=STREAM_WIDTH, quality=STREAM_JPEG_QUALITY):
+        """Register a viewer, or return None when the camera has ``max_viewers`` or every slot is taken"""
+        max_fps = self.camera.live_fps
+        fps = min(max_fps, max(STREAM_MIN_FPS, fps or max_fps))
+        viewer = StreamViewer(roi, fps, max(STREAM_MIN_WIDTH, width), min(95, max(20, quality)))
+        if not self.slots.acquire(blocking=False):
+            return None
+        with self._lock:
+            if len(self.viewers) >= self.max_viewers:
+                self.slots.release()
+                return None
+            self.viewers.append(viewer)
+            first = len(self.viewers) == 1
+        if first:
+            self.camera.subscribe(self._publish)
+        return viewer
+
+    def close(self, viewer):
+        viewer.close()
+        with self._lock:
+            if viewer not in self.viewers:
+                return
+            self.viewers.remove(viewer)
+            self.sent += viewer.sent
+            self.dropped += viewer.dropped
+            last = not self.viewers
+            if last:
+                self._encode_locks.clear()
+                self._encoded.clear()
+        self.slots.release()
+        if last:
+            self.camera.unsubscribe(self._publish)
+
+    def encode(self, frame_id, frame, roi, width, quality):
+        """JPEG-encode a frame for a viewer, reusing the encode of any viewer with the same settings"""
+        key = (roi, width, quality)
+        with self._lock:
+            lock = self._encode_locks.setdefault(key, threading.Lock())
+        with lock:
+            cached = self._encoded.get(key)
+            if cached is not None and cached[0] == frame_id:
+                return cached[1]
+            frame = crop_roi(frame, roi)
+            height, source_width = frame.shape[:2]
+            if width < source_width:
+                frame = cv2.resize(frame, (width, round(height * width / source_width)), interpolation=cv2.INTER_AREA)
+            ok, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+            if not ok:
+                raise ValueError("Failed to encode frame as JPEG")
+            jpeg = buffer.tobytes()
+            self._encoded[key] = (frame_id, jpeg)
+            return jpeg
+
+    def frames(self, viewer, idle_timeout=STREAM_IDLE_TIMEOUT_SEC):
+        """Yield multipart JPEG parts for ``viewer`` until it disconnects or the camera goes quiet"""
+        try:
+            while True:
+                item = viewer.next(idle_timeout)
+                if item is None:
+                    return
+                frame_id, frame, width = item
+                jpeg = self.encode(frame_id, frame, viewer.roi, width, viewer.quality)
+                # Blocks while this client's socket is full; its queue drops frames meanwhile
+                yield (f"--{BOUNDARY}\r\nContent-Type: image/jpeg\r\nContent-Length: {len(jpeg)}\r\n\r\n".encode()
+                       + jpeg + b"\r\n")
+                viewer.sent += 1
+        finally:
+            self.close(viewer)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "viewers": len(self.viewers),
+                "sent": self.sent + sum(viewer.sent for viewer in self.viewers),
+                "dropped": self.dropped + sum(viewer.dropped for viewer in self.viewers)
+            }
+
+
+class StreamMetrics:
+    """OpenTelemetry instruments for the live streams of every camera"""
+
+    def __init__(self, streams, meter=None):
+        self.streams = streams  # camera port -> LiveStream
+        meter = meter or metrics.get_meter(__name__)
+        meter.create_observable_gauge(
+            name="live_stream_viewers",
+            description="Clients currently watching each camera's live stream",
+            callbacks=[lambda options: self._observe("viewers")]
+        )
+        meter.create_observable_counter(
+            name="live_stream_frames_sent",
+            description="Live stream frames delivered to viewers",
+            callbacks=[lambda options: self._observe("sent")]
+        )
+        meter.create_observable_counter(
+            name="live_stream_frames_dropped",
+            description="Live stream frames dropped because a viewer fell behind",
+            callbacks=[lambda options: self._observe("dropped")]
+        )
+
+    def _observe(self, key):
+        return [metrics.Observation(stream.stats()[key], {"camera.port": port}) for port, stream in self.streams.items()]
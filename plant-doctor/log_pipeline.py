@@ -0,0 +1,165 @@
+import os
+import time
+import logging
+import threading
+from collections import deque
+from datetime import datetime
+from opentelemetry import context, metrics
+from opentelemetry.sdk._logs.export import LogExporter, LogExportResult
+
+# Bounded queue between the application and the OTLP log exporter
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", "1024"))
+LOG_BATCH_SIZE = int(os.environ.get("LOG_BATCH_SIZE", "128"))
+LOG_FLUSH_INTERVAL_SEC = float(os.environ.get("LOG_FLUSH_INTERVAL_SEC", "5"))
+
+
+class InstrumentedLogExporter(LogExporter):
+    """Wraps a log exporter to record export latency, batch sizes and failures"""
+
+    def __init__(self, exporter, meter=None):
+        self._exporter = exporter
+        meter = meter or metrics.get_meter(__name__)
+        self.duration = meter.create_histogram(
+            name="log_export_duration_seconds",
+            unit="s",
+            description="Time taken by each log batch export"
+        )
+        self.exported = meter.create_counter(
+            name="log_records_exported",
+            description="Log records handed to the exporter, by result"
+        )
+
+    def export(self, batch):
+        started = time.monotonic()
+        try:
+            result = self._exporter.export(batch)
+        except Exception:
+            result = LogExportResult.FAILURE
+            raise
+        finally:
+            outcome = "success" if result == LogExportResult.SUCCESS else "failure"
+            self.duration.record(time.monotonic() - started, {"outcome": outcome})
+            self.exported.add(len(batch), {"outcome": outcome})
+        return result
+
+    def shutdown(self):
+        self._exporter.shutdown()
+
+    def force_flush(self, timeout_millis=30_000):
+        return self._exporter.force_flush(timeout_millis)
+
+
+class BatchingLogHandler(logging.Handler):
+    """Bounded, batching queue in front of another logging handler.
+
+    Records are queued without blocking the caller and handed to ``target``
+    in batches of up to ``batch_size`` on a background thread, every
+    ``flush_interval`` seconds or as soon as a batch fills. ``flush`` runs
+    after each batch, so a slow exporter pushes back on this queue instead
+    of overflowing the one behind it.
+
+    When the queue is full the oldest record of the lowest severity is
+    dropped and counted, so a burst of info events can never push out a
+    critical one. The trace context of each record is kept for the target.
+
+    ``target`` may be attached later, records queue up until it is.
+    """
+
+    def __init__(self, target=None, flush=None, max_queue_size=LOG_QUEUE_SIZE, batch_size=LOG_BATCH_SIZE,
+                 flush_interval=LOG_FLUSH_INTERVAL_SEC, meter=None):
+        super().__init__()
+        self.target = target
+        self.flush_target = flush
+        self.max_queue_size = max_queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._stopped = False
+
+        meter = meter or metrics.get_meter(__name__)
+        self.dropped = meter.create_counter(
+            name="log_records_dropped",
+            description="Log records dropped because the export queue was full"
+        )
+        self.flush_duration = meter.create_histogram(
+            name="log_flush_duration_seconds",
+            unit="s",
+            description="Time from handing a batch to the exporter until it was flushed"
+        )
+        self.queue_latency = meter.create_histogram(
+            name="log_queue_latency_seconds",
+            unit="s",
+            description="Time log records spent queued before export"
+        )
+        meter.create_observable_gauge(
+            name="log_queue_depth",
+            description="Log records waiting to be exported",
+            callbacks=[lambda options: [metrics.Observation(len(self._queue))]]
+        )
+
+        self._thread = threading.Thread(target=self._run, name="log-export", daemon=True)
+        self._thread.start()
+
+    def attach(self, target, flush):
+        """Start handing queued records to ``target``, calling ``flush`` after each batch"""
+        with self._cond:
+            self.target = target
+            self.flush_target = flush
+            self._cond.notify()
+
+    def _drop_one(self):
+        lowest = min(range(len(self._queue)), key=lambda i: (self._queue[i][0].levelno, i))
+        record = self._queue[lowest][0]
+        del self._queue[lowest]
+        self.dropped.add(1, {"severity": record.levelname})
+
+    def emit(self, record):
+        with self._cond:
+            if self._stopped:
+                return
+            if len(self._queue) >= self.max_queue_size:
+                self._drop_one()
+            self._queue.append((record, context.get_current(), time.monotonic()))
+            if len(self._queue) >= self.batch_size:
+                self._cond.notify()
+
+    def _take_batch(self):
+        with self._cond:
+            self._cond.wait_for(lambda: self._stopped or (self.target is not None and len(self._queue) >= self.batch_size),
+                                timeout=self.flush_interval)
+            if self.target is None:
+                return []
+            return [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+
+    def _export(self, batch):
+        now = time.monotonic()
+        for record, ctx, queued_at in batch:
+            self.queue_latency.record(now - queued_at)
+            token = context.attach(ctx)
+            try:
+                self.target.handle(record)
+            finally:
+                context.detach(token)
+        started = time.monotonic()
+        if self.flush_target:
+            self.flush_target()
+        self.flush_duration.record(time.monotonic() - started)
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if batch:
+                try:
+                    self._export(batch)
+                except Exception as e:
+                    print(f"[{datetime.now()}] ERROR: Failed to export {len(batch)} log records: {str(e)}")
+            elif self._stopped:
+                return
+
+    def close(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        self._thread.join(timeout=self.flush_interval + 5)
+        super().close()
@@ -1,50 +1,91 @@
 import os
 import time
 import json
+import threading
 from datetime import datetime
-import cv2
-import base64
-from flask import Flask, jsonify, send_file, render_template
+from flask import Flask, Response, abort, jsonify, make_response, render_template, request, send_file, url_for
 from apscheduler.schedulers.background import BackgroundScheduler
-from openai import OpenAI
 from pydantic import BaseModel
-# Import OpenTelemetry modules for logging AI results only
-from opentelemetry.sdk._logs import LoggerProvider, LoggingHandler
-from opentelemetry.sdk._logs.export import BatchLogRecordProcessor
-from opentelemetry.exporter.otlp.proto.http._log_exporter import OTLPLogExporter
-from opentelemetry.sdk.resources import Resource
+# Import OpenTelemetry modules for AI result logs, model call metrics and pipeline traces.
+# The SDK exporters are loaded by init_telemetry in the background warm-up.
+from opentelemetry import trace
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial, wraps
 import requests
-from datetime import datetime, timedelta
+from opentelemetry.propagate import inject
+from werkzeug.serving import make_server
+from analysis_cache import sensor_bucket
+from image_pipeline import crop_roi, preprocess_frame, load_image
+from capture_jobs import CaptureJobQueue
+from tanks import load_tanks
+from model_governor import OPENAI_DAILY_BUDGET, DailyBudget, ModelGovernor, ModelUnavailableError
+from log_pipeline import BatchingLogHandler
+from telemetry import init_telemetry
+from vision_screen import SCREEN_INTERVAL_SEC, ScreenMetrics
+from live_stream import CONTENT_TYPE as STREAM_CONTENT_TYPE, STREAM_JPEG_QUALITY, STREAM_WIDTH, StreamMetrics
+from leader import LeaderLock
+from capture_schedule import CAPTURE_CHECK_SEC, CaptureScheduler, alert_tanks, worst_status
+from plant_regions import PLANT_CROP_MAX_SIDE
+from tracing import instrument_flask, mark_failed, record_error, tracer
 
 # Set up Flask application
 app = Flask(__name__)
 logging.getLogger("werkzeug").setLevel(logging.ERROR)
 logging.getLogger("httpx").setLevel(logging.ERROR)
+logging.getLogger("apscheduler").setLevel(logging.WARNING)  # Every minutely job run would otherwise reach Loki
 
 # File paths
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-IMAGE_DIR = os.path.join(BASE_DIR, "images")
-CURRENT_IMAGE_PATH = os.path.join(IMAGE_DIR, "current.jpg")
-LATEST_ANALYSIS_PATH = os.path.join(IMAGE_DIR, "latest_analysis.json")
+IMAGE_DIR = os.environ.get("IMAGE_DIR", os.path.join(BASE_DIR, "images"))
+TANK_CONFIG = os.environ.get("TANK_CONFIG", os.path.join(BASE_DIR, "tanks.json"))
+
+# Captures and analyses for different tanks run in parallel on this many workers
+CAPTURE_WORKERS = int(os.environ.get("CAPTURE_WORKERS", "2"))
+
+# With several web workers only the leader runs the cameras and scheduler. It also
+# serves the app on this localhost port, where the other workers forward requests
+# that need its in-memory state, such as capture triggers and job progress.
+LEADER_LOCK = os.environ.get("LEADER_LOCK", os.path.join(IMAGE_DIR, "leader.lock"))
+LEADER_CONTROL_PORT = int(os.environ.get("LEADER_CONTROL_PORT", "5001"))
+
+# Shared secret Grafana sends as "Authorization: Bearer <token>" with alert webhooks, unset to accept any
+ALERT_WEBHOOK_TOKEN = os.environ.get("ALERT_WEBHOOK_TOKEN")
 
 # Create images directory if it doesn't exist
 os.makedirs(IMAGE_DIR, exist_ok=True)
 
-# Initialize OpenAI client
-openai_client = OpenAI()
+# Create the OpenAI client on first use, loading the SDK takes a while
+def create_openai_client():
+    from openai import OpenAI
+    return OpenAI(max_retries=0)  # Retries are handled by the model governor
 
-# Global variable to store the latest analysis
-latest_analysis = None
+# Every tank has its own camera, sensor series, image directory and latest results.
+# Without tanks.json a single tank uses the original camera and images/ layout.
+tanks = load_tanks(TANK_CONFIG, IMAGE_DIR)
+
+# The un-namespaced routes serve the first configured tank
+default_tank = next(iter(tanks.values()))
 service_name = "plant_doctor"
 
+# Alloy's OTLP HTTP receiver for logs, metrics and traces
+OTLP_ENDPOINT = os.environ.get("OTLP_ENDPOINT", "http://plant-hub:4318")
+
 # Classes for plant health data
+class PlantBox(BaseModel):
+    # Fractions of the image width and height, from the top left corner
+    x: float
+    y: float
+    width: float
+    height: float
+
 class PlantHealth(BaseModel):
     plant_status: str  # info, warning, critical
     plant_type: str    # venus flytrap, pitcher plant, sundew
     plant_id: int
     plant_diagnosis: str
     plant_position: str
+    plant_box: PlantBox | None = None  # Results from before region tracking have none
 
 class HealthResponse(BaseModel):
     log: list[PlantHealth]
@@ -56,409 +97,707 @@ class TankHealth(BaseModel):
     combined_diagnosis: str
     recommendations: str
 
-resource = Resource.create({"service.name": service_name})
-logger_provider = LoggerProvider(resource=resource)
-# Create OTLP exporter for logs
-otlp_exporter = OTLPLogExporter(endpoint="http://plant-hub:4318/v1/logs")
-logger_provider.add_log_record_processor(BatchLogRecordProcessor(exporter=otlp_exporter, max_queue_size=5, max_export_batch_size=1))
-
-# 3. Attach the OTLP LoggingHandler to a logger
+# Log records queue in a bounded buffer until the warm-up attaches the OTLP pipeline,
+# then are exported in batches, dropping the least severe first when it falls behind
+log_handler = BatchingLogHandler()
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
-logger.addHandler(LoggingHandler(logger_provider=logger_provider))
+logger.addHandler(log_handler)
 
+# Trace every route; spans are exported once the warm-up sets the tracer provider
+instrument_flask(app)
 
-# Function to encode the image for OpenAI
-def encode_image(image_path):
-    with open(image_path, "rb") as image_file:
-        return base64.b64encode(image_file.read()).decode("utf-8")
+# Every model call goes through one governor: daily budget, rate limit, retries and circuit breaker
+model_budget = DailyBudget(OPENAI_DAILY_BUDGET, os.path.join(IMAGE_DIR, "model_budget.json"))
+model_governor = ModelGovernor(create_openai_client, budget=model_budget)
 
-# Function to manage image retention
-def manage_image_retention():
-    """Keep only the 5 most recent images and delete older ones."""
-    try:
-        # Get all plant images in the directory
-        plant_images = [f for f in os.listdir(IMAGE_DIR) if f.startswith("plant_") and f.endswith(".jpg")]
-        
-        # Sort by modification time, newest first
-        plant_images.sort(key=lambda x: os.path.getmtime(os.path.join(IMAGE_DIR, x)), reverse=True)
-        
-        # Delete all but the 5 most recent images
-        for old_image in plant_images[5:]:
-            try:
-                os.remove(os.path.join(IMAGE_DIR, old_image))
-                print(f"[{datetime.now()}] Deleted old image: {old_image}")
-            except Exception as e:
-                print(f"[{datetime.now()}] ERROR: Failed to delete old image {old_image}: {str(e)}")
-                
-    except Exception as e:
-        print(f"[{datetime.now()}] ERROR: Failed to manage image retention: {str(e)}")
+# Per-region colour and change metrics from the local vision screen
+screen_metrics = ScreenMetrics({tank.id: tank.screen for tank in tanks.values()})
+
+# Viewers and delivered/dropped frames of every camera's live stream
+stream_metrics = StreamMetrics({tank.camera.port: tank.live_stream for tank in tanks.values()})
+
+
+# Function to encode a captured frame once for OpenAI and the image files
+@tracer.start_as_current_span("encode_image")
+def encode_image(frame, captured_at=None, roi=None):
+    processed = preprocess_frame(frame, roi=roi, captured_at=captured_at)
+    span = trace.get_current_span()
+    span.set_attribute("image.source_width", frame.shape[1])
+    span.set_attribute("image.source_height", frame.shape[0])
+    span.set_attribute("image.width", processed.pixels.shape[1])
+    span.set_attribute("image.height", processed.pixels.shape[0])
+    span.set_attribute("image.bytes", len(processed.jpeg))
+    return processed
 
 # Function to take a picture
-def take_picture():
+@tracer.start_as_current_span("take_picture")
+def take_picture(tank):
+    trace.get_current_span().set_attribute("tank.id", tank.id)
     try:
-        print(f"[{datetime.now()}] Taking a picture...")
-        cam_port = 0  # Default camera port
+        print(f"[{datetime.now()}] Taking a picture of {tank.name}...")
         
         try:
-            cam = cv2.VideoCapture(cam_port)
-            cam.grab()
-            
-            if not cam.isOpened():
-                print(f"[{datetime.now()}] ERROR: Could not open camera on port {cam_port}")
-                return None
-            
-            # Set camera properties - these are the settings that worked well
-            cam.set(cv2.CAP_PROP_FRAME_WIDTH, 1920)
-            cam.set(cv2.CAP_PROP_FRAME_HEIGHT, 1080)
-            cam.set(cv2.CAP_PROP_BRIGHTNESS, 0)  # Matches v4l2 brightness setting
-            cam.set(cv2.CAP_PROP_CONTRAST, 32)   # Matches v4l2 contrast setting
-            cam.set(cv2.CAP_PROP_SATURATION, 64) # Matches v4l2 saturation setting
-            cam.set(cv2.CAP_PROP_HUE, 0)         # Matches v4l2 hue setting
-            cam.set(cv2.CAP_PROP_SHARPNESS, 5)   # Matches v4l2 sharpness setting
-            cam.set(cv2.CAP_PROP_GAIN, 10)       # Matches v4l2 gain setting
-            cam.set(cv2.CAP_PROP_AUTO_WB, 1)     # Auto white balance ON
-            cam.set(cv2.CAP_PROP_BACKLIGHT, 0)   # Backlight compensation OFF
-            cam.set(cv2.CAP_PROP_EXPOSURE, 200)  # Exposure setting
-
-            time.sleep(2)    
-            
-            result, image = cam.read()
-    
-            # Release the camera
-            cam.release()
+            # Serve the newest settled frame from the always-open camera
+            frame = tank.camera.latest_frame()
             
-            if result and image is not None:
-                # Save original image
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                original_path = os.path.join(IMAGE_DIR, f"plant_{timestamp}.jpg")
-                cv2.imwrite(original_path, image)
+            if frame is not None:
+                captured_at, image = frame
                 
-                # Also save as current.jpg for web display
-                cv2.imwrite(CURRENT_IMAGE_PATH, image)
+                # Encode once, the same JPEG is sent to OpenAI and written to disk
+                processed = encode_image(image, captured_at, tank.roi)
                 
-                # Manage image retention to keep only 5 most recent images
-                manage_image_retention()
+                # Save original image to the archive, which also applies retention
+                tank.image_store.add(processed)
                 
-                print(f"[{datetime.now()}] Image captured and saved successfully")
-                return CURRENT_IMAGE_PATH
+                # Also save as current.jpg for web display
+                with tracer.start_as_current_span("write_current_image", attributes={"image.bytes": len(processed.jpeg)}):
+                    processed.write(tank.current_image_path)
+                set_current_image(tank, processed)
+                
+                print(f"[{datetime.now()}] Image captured and saved successfully ({len(processed.jpeg)} bytes)")
+                return processed
             else:
                 print(f"[{datetime.now()}] ERROR: Failed to capture valid image")
+                mark_failed("No frame available")
                 return None
                 
         except Exception as e:
             print(f"[{datetime.now()}] ERROR with camera: {str(e)}")
+            record_error(e)
             return None
             
     except Exception as e:
         print(f"[{datetime.now()}] ERROR: Failed to take picture: {str(e)}")
+        record_error(e)
         return None
 
 
+# Functions to hold the latest capture in memory for the web routes
+def set_current_image(tank, image):
+    tank.current_image = image
+    tank.current_image_mtime = os.path.getmtime(tank.current_image_path)
+
+def get_current_image(tank):
+    """Return the tank's latest capture, reloading current.jpg when another process replaced it"""
+    try:
+        mtime = os.path.getmtime(tank.current_image_path)
+    except OSError:
+        return tank.current_image
+    if tank.current_image is None or mtime != tank.current_image_mtime:
+        try:
+            tank.current_image = load_image(tank.current_image_path)
+            tank.current_image_mtime = mtime
+        except Exception as e:
+            print(f"[{datetime.now()}] ERROR: Failed to load current image for {tank.name}: {str(e)}")
+    return tank.current_image
+
+# Function to share the latest analysis between web workers through latest_analysis.json
+def get_latest_analysis(tank):
+    """Return the tank's latest plant analysis, reloading it when another process wrote a newer one"""
+    try:
+        mtime = os.path.getmtime(tank.latest_analysis_path)
+    except OSError:
+        return tank.latest_analysis
+    if tank.latest_analysis is None or mtime != tank.latest_analysis_mtime:
+        try:
+            with open(tank.latest_analysis_path, 'r') as f:
+                tank.latest_analysis = HealthResponse.model_validate(json.load(f))
+            tank.latest_analysis_mtime = mtime
+        except Exception as e:
+            print(f"[{datetime.now()}] WARNING: Failed to load analysis for {tank.name}: {str(e)}")
+    return tank.latest_analysis
+
+# Function to build a cacheable response that honours If-None-Match, If-Modified-Since and Range
+def conditional_response(body, mimetype, etag, last_modified):
+    response = Response(body, mimetype=mimetype)
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.no_cache = True  # Clients may cache but must revalidate
+    return response.make_conditional(request, accept_ranges=True, complete_length=len(body))
+
+# Function to run a model call, degrading to the closest cached result when the model is unavailable
+def call_model(tank, kind, image, payload_bytes=None, **request):
+    """Return ``(result, fresh)``, where ``fresh`` is False for a cached fallback"""
+    span = trace.get_current_span()
+    span.set_attribute("image.payload_bytes", payload_bytes if payload_bytes is not None else len(image.data_url))
+    try:
+        response = model_governor.parse(kind, **request)
+        span.set_attribute("analysis.fallback", False)
+        return response.choices[0].message.parsed, True
+    except ModelUnavailableError as e:
+        fallback = tank.analysis_cache.fallback(kind, image.phash)
+        if fallback is None:
+            raise
+        print(f"[{datetime.now()}] WARNING: Model unavailable ({str(e)}), using the closest cached {kind} analysis for {tank.name}")
+        span.set_attribute("analysis.fallback", True)
+        return request["response_format"].model_validate(fallback), False
+
+# While something is wrong a tank is captured sooner, and results from before that interval are not reused
+def reuse_max_age(tank):
+    return tank.schedule.interval if tank.schedule.status in ("warning", "critical") else None
+
 # Analyze the image using OpenAI
-def analyze_image(image_path):
-    global latest_analysis
-    
-    print(f"[{datetime.now()}] Analyzing image: {image_path}")
+@tracer.start_as_current_span("analyze_image")
+def analyze_image(tank, image):
+    print(f"[{datetime.now()}] Analyzing {tank.name} image captured at {image.captured_at}")
     start_time = time.time()
+    span = trace.get_current_span()
+    span.set_attribute("tank.id", tank.id)
     
     try:
-        # Check if image exists
-        if not os.path.exists(image_path):
-            print(f"[{datetime.now()}] ERROR: Image file not found: {image_path}")
-            return None
-        
-        # Encode the image
-        encoded_image = encode_image(image_path)
-        
-        # Create a new OpenAI request
-        response = openai_client.beta.chat.completions.parse(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": "You are a carnivorous plant health expert. Examine the picture of the tank containing the plants. analyse leaves, colour, pitchers or flytraps, growth and any signs of decay"},
-                {"role": "system", "content": "plant_status follows log info, warning, critical. plant_type to be venus flytrap, pitcher plant, sundew. plant_id is the unique identifier of the plant. plant_diagnosis is the diagnosis of the plant. plant_position is where you have seen the plant in frame, for example top left, bottom right etc."},
-                {"role": "system", "content": "There are multiple plants in the image. Please provide the diagnosis for each plant 1 by 1. Note there maybe duplicates so pitcher1, pitcher2 etc."},
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": "Analyze all plants in this image",
-                        },
-                        {
-                            "type": "image_url",
-                            "image_url": {"url": f"data:image/jpg;base64,{encoded_image}"},
-                        },
-                    ],
-                }
-            ],
-            response_format=HealthResponse
-        )
-        
-        # Extract the analysis results
-        analysis_result = response.choices[0].message.parsed
+        # Reuse a previous result if the tank has not visibly changed
+        cached = tank.analysis_cache.lookup("plants", image.phash, max_age=reuse_max_age(tank))
+        span.set_attribute("cache.hit", cached is not None)
+        if cached is not None:
+            print(f"[{datetime.now()}] Analysis cache hit, skipping plant model call")
+            analysis_result = HealthResponse.model_validate(cached)
+            fresh = False
+            diagnosed = set()
+        else:
+            # Only plants whose region changed since their last diagnosis go to the model
+            plan = tank.plant_regions.plan(image.pixels, recheck_after=reuse_max_age(tank))
+            span.set_attribute("regions.full", plan is None)
+            if plan is None:
+                span.set_attribute("regions.reason", tank.plant_regions.last_reason)
+                analysis_result, fresh = analyze_plants(tank, image)
+                diagnosed = {plant.plant_id for plant in analysis_result.log} if fresh else set()
+            else:
+                analysis_result, diagnosed = analyze_changed_plants(tank, image, plan)
+                fresh = bool(diagnosed)
+
+            if fresh:
+                tank.analysis_cache.store("plants", image.phash, analysis_result.model_dump())
         
-        # Save the analysis to a file
-        with open(LATEST_ANALYSIS_PATH, 'w') as f:
+        # Save the analysis to a file atomically, other web workers read it from there
+        tmp_path = f"{tank.latest_analysis_path}.tmp"
+        with open(tmp_path, 'w') as f:
             json.dump(analysis_result.model_dump(), f, indent=2)
+        os.replace(tmp_path, tank.latest_analysis_path)
         
-        latest_analysis = analysis_result
+        tank.latest_analysis = analysis_result
+        tank.latest_analysis_mtime = os.path.getmtime(tank.latest_analysis_path)
+        # History only holds actual diagnoses: not cache or fallback results, nor the unchanged plants of a partial run
+        diagnosed_log = [plant for plant in analysis_result.model_dump()["log"] if plant["plant_id"] in diagnosed]
+        if diagnosed_log:
+            tank.analysis_history.record_plants(diagnosed_log, image.captured_at)
         
-        # Only send AI analysis results to OpenTelemetry
-        for plant in analysis_result.log:
-
-            if plant.plant_status == "info":
-                msg = f"{plant.plant_type}: {plant.plant_id} -> {plant.plant_position}" 
-                logging.info(msg, extra={
-                    "plant.id": plant.plant_id,
-                    "plant.type": plant.plant_type,
-                    "plant.status": plant.plant_status,
-                    "plant.diagnosis": plant.plant_diagnosis,
-                    "plant.position": plant.plant_position
-
-                })
-
-            elif plant.plant_status == "warning":
-                msg = f"{plant.plant_type}: {plant.plant_id} -> {plant.plant_position}"
-                logging.warning(msg, extra={
-                    "plant.id": plant.plant_id,
-                    "plant.type": plant.plant_type,
-                    "plant.status": plant.plant_status,
-                    "plant.diagnosis": plant.plant_diagnosis,
-                    "plant.position": plant.plant_position
-                })
-                
-            elif plant.plant_status == "critical":
-                msg = f"{plant.plant_type}: {plant.plant_id} -> {plant.plant_position}"
-                logging.critical(msg, extra={
-                    "plant.id": plant.plant_id,
-                    "plant.type": plant.plant_type,
-                    "plant.status": plant.plant_status,
-                    "plant.diagnosis": plant.plant_diagnosis,
-                    "plant.position": plant.plant_position
-                })
+        # Only send changes in the AI analysis results to OpenTelemetry
+        span.set_attribute("plant.events", tank.events.plants(analysis_result.log))
+        span.set_attribute("plant.count", len(analysis_result.log))
         
         # Print summary for application logs
         duration_ms = (time.time() - start_time) * 1000
-        print(f"[{datetime.now()}] Successfully analyzed {len(analysis_result.log)} plants in {duration_ms:.2f}ms")
+        print(f"[{datetime.now()}] Successfully analyzed {len(analysis_result.log)} plants in {tank.name} in {duration_ms:.2f}ms")
         
         return analysis_result
         
     except Exception as e:
         print(f"[{datetime.now()}] ERROR: Failed to analyze image: {str(e)}")
+        record_error(e)
         return None
 
+# Diagnose every plant in the whole frame and make their boxes the tracked regions
+def analyze_plants(tank, image):
+    analysis_result, fresh = call_model(
+        tank, "plants", image,
+        model="gpt-4o",
+        messages=[
+            {"role": "system", "content": "You are a carnivorous plant health expert. Examine the picture of the tank containing the plants. analyse leaves, colour, pitchers or flytraps, growth and any signs of decay"},
+            {"role": "system", "content": "plant_status follows log info, warning, critical. plant_type to be venus flytrap, pitcher plant, sundew. plant_id is the unique identifier of the plant. plant_diagnosis is the diagnosis of the plant. plant_position is where you have seen the plant in frame, for example top left, bottom right etc. plant_box is the bounding box around the whole plant as fractions of the image width and height, x and y being its top left corner."},
+            {"role": "system", "content": "There are multiple plants in the image. Please provide the diagnosis for each plant 1 by 1. Note there maybe duplicates so pitcher1, pitcher2 etc."},
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "text",
+                        "text": "Analyze all plants in this image",
+                    },
+                    {
+                        "type": "image_url",
+                        "image_url": {"url": image.data_url},
+                    },
+                ],
+            }
+        ],
+        response_format=HealthResponse
+    )
+    if fresh:
+        # Replace the model's numbering with the tracked plant ids; a cached fallback already has them
+        log = tank.plant_regions.assign(image.pixels, analysis_result.model_dump()["log"])
+        analysis_result = HealthResponse.model_validate({"log": log})
+    return analysis_result, fresh
+
+# Re-diagnose only the changed plants from their crops and keep the others' previous diagnoses.
+# Returns the merged result and the ids of the plants that were actually re-diagnosed.
+def analyze_changed_plants(tank, image, plan):
+    span = trace.get_current_span()
+    span.set_attribute("regions.tracked", len(plan.boxes))
+    span.set_attribute("regions.changed", len(plan.changed))
+    results = {}
+    if plan.changed:
+        print(f"[{datetime.now()}] Re-diagnosing {len(plan.changed)} of {len(plan.boxes)} plants in {tank.name}")
+        content = [{"type": "text", "text": "Analyze each of these plants"}]
+        payload_bytes = 0
+        for plant_id in plan.changed:
+            previous = tank.plant_regions.plants[plant_id]["result"]
+            crop = preprocess_frame(plan.crops[plant_id], max_side=PLANT_CROP_MAX_SIDE, roi=None)
+            payload_bytes += len(crop.data_url)
+            content.append({"type": "text", "text": f"plant_id {plant_id}, a {previous['plant_type']}, last diagnosed as {previous['plant_status']}: {previous['plant_diagnosis']}"})
+            content.append({"type": "image_url", "image_url": {"url": crop.data_url}})
+        response, fresh = call_model(
+            tank, "plants", image,
+            payload_bytes=payload_bytes,
+            model="gpt-4o",
+            messages=[
+                {"role": "system", "content": "You are a carnivorous plant health expert. Each picture is one plant cropped from a tank, preceded by its plant_id and its last diagnosis. analyse leaves, colour, pitchers or flytraps, growth and any signs of decay"},
+                {"role": "system", "content": "plant_status follows log info, warning, critical. plant_type to be venus flytrap, pitcher plant, sundew. Return one entry per picture with the plant_id it was given. plant_diagnosis is the diagnosis of the plant. plant_position and plant_box may be left empty and null."},
+                {"role": "user", "content": content}
+            ],
+            response_format=HealthResponse
+        )
+        # A cached fallback is not a new look at the crops, so they stay pending for the next run
+        if fresh:
+            results = {plant.plant_id: plant.model_dump() for plant in response.log}
+    else:
+        print(f"[{datetime.now()}] No plant in {tank.name} changed, keeping every diagnosis")
+    log = tank.plant_regions.update(plan, results)
+    return HealthResponse.model_validate({"log": log}), set(results) & set(plan.changed)
+
 # Function to fetch sensor data from Prometheus
-def fetch_sensor_data():
-    """Fetch the last 12 hours of sensor data from Prometheus using HTTP API"""
+@tracer.start_as_current_span("fetch_sensor_data")
+def fetch_sensor_data(tank):
+    """Fetch the last 12 hours of the tank's sensor data from Prometheus using HTTP API"""
+    trace.get_current_span().set_attribute("tank.id", tank.id)
     try:
-        # Calculate time range (12 hours ago)
-        end_time = datetime.now()
-        start_time = end_time - timedelta(hours=12)
-        
-        # Prometheus query endpoint
-        prometheus_url = "http://plant-hub:9090/api/v1/query_range"
-        
-        # Query parameters
-        params = {
-            "start": start_time.timestamp(),
-            "end": end_time.timestamp(),
-            "step": "5m"  # 5-minute intervals
-        }
-        
-        # Use Prometheus's built-in functions for calculations
-        queries = {
-            "temperature": {
-                "min": "min_over_time(temperature_celsius[12h])",
-                "max": "max_over_time(temperature_celsius[12h])",
-                "avg": "avg_over_time(temperature_celsius[12h])",
-                "current": "temperature_celsius",
-                "histogram": "rate(temperature_celsius[5m])"  # Rate of change over 5m windows
-            },
-            "humidity": {
-                "min": "min_over_time(humidity_percent[12h])",
-                "max": "max_over_time(humidity_percent[12h])",
-                "avg": "avg_over_time(humidity_percent[12h])",
-                "current": "humidity_percent",
-                "histogram": "rate(humidity_percent[5m])"  # Rate of change over 5m windows
-            }
-        }
-        
-        # Fetch all metrics in one go
-        results = {}
-        for metric, queries in queries.items():
-            results[metric] = {}
-            for stat, query in queries.items():
-                params["query"] = query
-                response = requests.get(prometheus_url, params=params)
-                data = response.json()
-                
-                if data["status"] == "success" and data["data"]["result"]:
-                    if stat == "current":
-                        value = float(data["data"]["result"][0]["values"][-1][1])
-                        results[metric][stat] = value
-                    elif stat == "histogram":
-                        # For histogram, we'll store the last 12 values (1 hour) of rate changes
-                        values = [float(v[1]) for v in data["data"]["result"][0]["values"][-12:]]
-                        results[metric][stat] = {
-                            "values": values,
-                            "avg_rate": sum(values) / len(values) if values else 0,
-                            "max_rate": max(values) if values else 0,
-                            "min_rate": min(values) if values else 0
-                        }
-                    else:
-                        # For range queries (min/max/avg), the value is in the first result
-                        value = float(data["data"]["result"][0]["values"][0][1])
-                        results[metric][stat] = value
-                else:
-                    print(f"[{datetime.now()}] ERROR: Failed to fetch {metric} {stat} from Prometheus")
-                    return None
-        
-        return results
-            
+        return tank.sensor_client.fetch()
     except Exception as e:
         print(f"[{datetime.now()}] ERROR: Failed to fetch sensor data: {str(e)}")
+        record_error(e)
         return None
 
+# Function to describe the locally derived sensor metrics for the tank prompt
+def format_derived_metrics(sensor_data):
+    derived = sensor_data.get("derived")
+    if not derived:
+        return ""
+    return (
+        f"\n\nDerived Data:\n"
+        f"VPD: {derived['vpd_kpa']['current']:.2f} kPa (avg {derived['vpd_kpa']['avg']:.2f}, max {derived['vpd_kpa']['max']:.2f})\n"
+        f"Dew Point: {derived['dew_point_celsius']['current']:.1f}°C ({derived['dew_point_celsius']['margin']:.1f}°C below air temperature)\n"
+        f"Temperature Trend: {derived['temperature_slope_per_hour']['current']:+.2f}°C/h over the last hour\n"
+        f"Humidity Trend: {derived['humidity_slope_per_hour']['current']:+.2f}%/h over the last hour\n"
+        f"Temperature Out Of Band ({derived['temperature_out_of_band']['band'][0]:.0f}-{derived['temperature_out_of_band']['band'][1]:.0f}°C): {derived['temperature_out_of_band']['minutes']:.0f} min\n"
+        f"Humidity Out Of Band ({derived['humidity_out_of_band']['band'][0]:.0f}-{derived['humidity_out_of_band']['band'][1]:.1f}%): {derived['humidity_out_of_band']['minutes']:.0f} min"
+    )
+
 # Function to analyze tank health
-def analyze_tank_health(image_path, sensor_data):
+@tracer.start_as_current_span("analyze_tank_health")
+def analyze_tank_health(tank, image, sensor_data):
     """Analyze tank health using both image and sensor data"""
+    span = trace.get_current_span()
+    span.set_attribute("tank.id", tank.id)
     try:
-        # Encode the image
-        encoded_image = encode_image(image_path)
+        # Reuse a previous result for a matching frame and sensor summary
+        bucket = sensor_bucket(sensor_data)
+        cached = tank.analysis_cache.lookup("tank", image.phash, bucket, max_age=reuse_max_age(tank))
+        span.set_attribute("cache.hit", cached is not None)
+        if cached is not None:
+            print(f"[{datetime.now()}] Analysis cache hit, skipping tank model call")
+            tank_analysis = TankHealth.model_validate(cached)
+            fresh = False
+        else:
+            # Create a new OpenAI request
+            tank_analysis, fresh = call_model(
+                tank, "tank", image,
+                model="gpt-4o",
+                messages=[
+                    {"role": "system", "content": "You are a carnivorous plant tank health expert. Analyze the tank conditions based on both the visual image and sensor data."},
+                    {"role": "system", "content": "tank_status follows log info, warning, critical. temperature_analysis should analyze temperature trends and stability. humidity_analysis should analyze humidity trends and stability. combined_diagnosis should consider both visual and sensor data. recommendations should provide actionable steps."},
+                    {
+                        "role": "user",
+                        "content": [
+                            {
+                                "type": "text",
+                                "text": f"Analyze the tank health based on the image and sensor data:\n\nTemperature Data:\nMin: {sensor_data['temperature']['min']:.1f}°C\nMax: {sensor_data['temperature']['max']:.1f}°C\nAvg: {sensor_data['temperature']['avg']:.1f}°C\nCurrent: {sensor_data['temperature']['current']:.1f}°C\n\nHumidity Data:\nMin: {sensor_data['humidity']['min']:.1f}%\nMax: {sensor_data['humidity']['max']:.1f}%\nAvg: {sensor_data['humidity']['avg']:.1f}%\nCurrent: {sensor_data['humidity']['current']:.1f}%{format_derived_metrics(sensor_data)}",
+                            },
+                            {
+                                "type": "image_url",
+                                "image_url": {"url": image.data_url},
+                            },
+                        ],
+                    }
+                ],
+                response_format=TankHealth
+            )
         
-        # Create a new OpenAI request
-        response = openai_client.beta.chat.completions.parse(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": "You are a carnivorous plant tank health expert. Analyze the tank conditions based on both the visual image and sensor data."},
-                {"role": "system", "content": "tank_status follows log info, warning, critical. temperature_analysis should analyze temperature trends and stability. humidity_analysis should analyze humidity trends and stability. combined_diagnosis should consider both visual and sensor data. recommendations should provide actionable steps."},
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": f"Analyze the tank health based on the image and sensor data:\n\nTemperature Data:\nMin: {sensor_data['temperature']['min']:.1f}°C\nMax: {sensor_data['temperature']['max']:.1f}°C\nAvg: {sensor_data['temperature']['avg']:.1f}°C\nCurrent: {sensor_data['temperature']['current']:.1f}°C\n\nHumidity Data:\nMin: {sensor_data['humidity']['min']:.1f}%\nMax: {sensor_data['humidity']['max']:.1f}%\nAvg: {sensor_data['humidity']['avg']:.1f}%\nCurrent: {sensor_data['humidity']['current']:.1f}%",
-                        },
-                        {
-                            "type": "image_url",
-                            "image_url": {"url": f"data:image/jpg;base64,{encoded_image}"},
-                        },
-                    ],
-                }
-            ],
-            response_format=TankHealth
-        )
+            if fresh:
+                tank.analysis_cache.store("tank", image.phash, tank_analysis.model_dump(), bucket)
         
-        # Extract the analysis results
-        tank_analysis = response.choices[0].message.parsed
+        # History only holds actual diagnoses, not reused cache or fallback results
+        if fresh:
+            tank.analysis_history.record_tank(tank_analysis.model_dump(), image.captured_at)
         
-        # Log the tank health analysis
-        if tank_analysis.tank_status == "info":
-            logging.info("Tank Health Analysis", extra={
-                "tank.status": tank_analysis.tank_status,
-                "temperature.analysis": tank_analysis.temperature_analysis,
-                "humidity.analysis": tank_analysis.humidity_analysis,
-                "combined.diagnosis": tank_analysis.combined_diagnosis,
-                "recommendations": tank_analysis.recommendations
-            })
-        elif tank_analysis.tank_status == "warning":
-            logging.warning("Tank Health Analysis", extra={
-                "tank.status": tank_analysis.tank_status,
-                "temperature.analysis": tank_analysis.temperature_analysis,
-                "humidity.analysis": tank_analysis.humidity_analysis,
-                "combined.diagnosis": tank_analysis.combined_diagnosis,
-                "recommendations": tank_analysis.recommendations
-            })
-        else:  # critical
-            logging.critical("Tank Health Analysis", extra={
-                "tank.status": tank_analysis.tank_status,
-                "temperature.analysis": tank_analysis.temperature_analysis,
-                "humidity.analysis": tank_analysis.humidity_analysis,
-                "combined.diagnosis": tank_analysis.combined_diagnosis,
-                "recommendations": tank_analysis.recommendations
-            })
+        # Log the tank health analysis when it changed
+        tank.events.tank(tank_analysis)
         
+        span.set_attribute("tank.status", tank_analysis.tank_status)
         return tank_analysis
         
     except Exception as e:
         print(f"[{datetime.now()}] ERROR: Failed to analyze tank health: {str(e)}")
+        record_error(e)
         return None
 
 # Function to capture image and analyze
-def capture_and_analyze():
-    print(f"[{datetime.now()}] Starting scheduled plant health check")
+@tracer.start_as_current_span("capture_and_analyze")
+def capture_and_analyze(tank, progress=None):
+    """Take a picture of one tank and run the plant and tank analyses.
+
+    ``progress`` is called with the name of each stage as it starts.
+    Returns a summary with a "status" of success or error.
+    """
+    span = trace.get_current_span()
+    span.set_attribute("tank.id", tank.id)
+
+    def report(stage):
+        span.add_event(stage)
+        if progress:
+            progress(stage)
+
+    print(f"[{datetime.now()}] Starting plant health check for {tank.name}")
     
     # Take a picture
-    image_path = take_picture()
-    
-    if image_path:
-        # Analyze the image
-        analysis = analyze_image(image_path)
-        if analysis:
-            print(f"[{datetime.now()}] Plant health check completed successfully")
-            
-            # Fetch and analyze sensor data
-            sensor_data = fetch_sensor_data()
-            if sensor_data:
-                tank_analysis = analyze_tank_health(image_path, sensor_data)
-                if tank_analysis:
-                    print(f"[{datetime.now()}] Tank health analysis completed successfully")
-                else:
-                    print(f"[{datetime.now()}] ERROR: Failed to analyze tank health")
-            else:
-                print(f"[{datetime.now()}] ERROR: Failed to fetch sensor data")
-        else:
-            print(f"[{datetime.now()}] ERROR: Failed to analyze the image")
-    else:
+    report("capturing")
+    image = take_picture(tank)
+    if not image:
         print(f"[{datetime.now()}] ERROR: Failed to capture the image")
+        mark_failed("Failed to capture the image")
+        return {"status": "error", "message": "Failed to capture the image"}
+
+    # Analyze the image
+    report("analyzing_plants")
+    analysis = analyze_image(tank, image)
+    if not analysis:
+        print(f"[{datetime.now()}] ERROR: Failed to analyze the image")
+        mark_failed("Failed to analyze the image")
+        return {"status": "error", "message": "Failed to analyze the image"}
+    print(f"[{datetime.now()}] Plant health check completed successfully")
+
+    # Later screens are judged against the frame this analysis describes
+    tank.screen.set_baseline(image.pixels, image.captured_at)
+
+    result = {
+        "status": "success",
+        "captured_at": image.captured_at.isoformat(),
+        "plants": analysis.model_dump(),
+        "tank": None
+    }
+
+    # Fetch and analyze sensor data
+    report("fetching_sensor_data")
+    sensor_data = fetch_sensor_data(tank)
+    if not sensor_data:
+        print(f"[{datetime.now()}] ERROR: Failed to fetch sensor data")
+        result["message"] = "Failed to fetch sensor data"
+        mark_failed(result["message"])
+        tank.schedule.record(worst_status(plant.plant_status for plant in analysis.log), image.captured_at)
+        return result
+
+    report("analyzing_tank")
+    tank_analysis = analyze_tank_health(tank, image, sensor_data)
+    if tank_analysis:
+        print(f"[{datetime.now()}] Tank health analysis completed successfully")
+        result["tank"] = tank_analysis.model_dump()
+    else:
+        print(f"[{datetime.now()}] ERROR: Failed to analyze tank health")
+        result["message"] = "Failed to analyze tank health"
+        mark_failed(result["message"])
+
+    # The worst status decides how soon the tank is captured again
+    statuses = [plant.plant_status for plant in analysis.log] + ([tank_analysis.tank_status] if tank_analysis else [])
+    tank.schedule.record(worst_status(statuses), image.captured_at)
+    span.set_attribute("schedule.interval_sec", tank.schedule.interval)
+    return result
+
+# Every capture trigger goes through its tank's queue so runs for one tank never
+# overlap, while different tanks share a bounded pool and run in parallel
+capture_pool = ThreadPoolExecutor(max_workers=CAPTURE_WORKERS, thread_name_prefix="capture")
+for tank in tanks.values():
+    tank.capture_queue = CaptureJobQueue(partial(capture_and_analyze, tank), capture_pool, tank.id)
+
+# Automatic captures are coalesced, kept within the daily model budget and the capture hours
+capture_scheduler = CaptureScheduler(tanks, model_budget)
+
+# Function to capture every tank whose adaptive schedule is due
+def scheduled_capture():
+    if not capture_scheduler.in_hours():
+        return
+    for tank in tanks.values():
+        if not tank.schedule.due():
+            continue
+        # With screening on, a stable tank's analysis is kept until the screen sees a change
+        if SCREEN_INTERVAL_SEC > 0 and tank.schedule.status == "info" and not tank.screen.analysis_due():
+            tank.schedule.postpone()
+            continue
+        job, skipped = capture_scheduler.trigger(tank, "scheduler")
+        if skipped:
+            print(f"[{datetime.now()}] Skipping scheduled capture for {tank.name} ({skipped})")
+            tank.schedule.postpone()
+        else:
+            print(f"[{datetime.now()}] Scheduled capture triggered for {tank.name}, last status "
+                  f"{tank.schedule.status or 'unknown'}, next in {tank.schedule.interval / 60:.0f} min")
+
+# Function to screen every tank's newest frame locally and escalate to a full analysis
+def screen_tanks():
+    for tank in tanks.values():
+        try:
+            frame = tank.camera.latest_frame(timeout=1.0)
+            if frame is None:
+                continue
+            captured_at, image = frame
+            started = time.monotonic()
+            result = tank.screen.screen(crop_roi(image, tank.roi), captured_at)
+            screen_metrics.record(tank.id, result, time.monotonic() - started)
+            if result.escalation:
+                job, skipped = capture_scheduler.trigger(tank, f"screen:{result.escalation}")
+                print(f"[{datetime.now()}] Screen escalated {tank.name} to a full analysis ({result.escalation})"
+                      + (f", skipped ({skipped})" if skipped else ""))
+        except Exception as e:
+            print(f"[{datetime.now()}] ERROR: Failed to screen {tank.name}: {str(e)}")
+
+# Function to resolve the tank a route refers to
+def lookup_tank(tank_id):
+    """Return the tank for ``tank_id``, or the default tank for the un-namespaced routes"""
+    if tank_id is None:
+        return default_tank
+    tank = tanks.get(tank_id)
+    if tank is None:
+        abort(make_response(jsonify({"status": "error", "message": "Unknown tank"}), 404))
+    return tank
+
+# Function to run a route in the leader process, which owns the cameras and capture jobs
+def leader_only(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if leadership.is_leader:
+            return view(*args, **kwargs)
+        control_url = leadership.leader().get("control_url")
+        if not control_url:
+            return jsonify({"status": "error", "message": "No leader process available"}), 503
+        headers = {}
+        inject(headers)  # Continue this request's trace in the leader
+        for name in ("Content-Type", "Authorization"):
+            if name in request.headers:
+                headers[name] = request.headers[name]
+        try:
+            response = requests.request(request.method, control_url + request.full_path, headers=headers,
+                                        data=request.get_data(), timeout=10, stream=True)
+            content_type = response.headers.get("Content-Type")
+            if content_type and content_type.startswith("multipart/"):
+                # Relay live streams part by part until either side disconnects
+                return Response(relay_stream(response), status=response.status_code, content_type=content_type,
+                                headers={"Cache-Control": "no-cache"})
+            content = response.content
+        except requests.RequestException as e:
+            print(f"[{datetime.now()}] ERROR: Failed to reach the leader process: {str(e)}")
+            return jsonify({"status": "error", "message": "Leader process unavailable"}), 503
+        return Response(content, status=response.status_code, content_type=content_type)
+    return wrapper
+
+# Function to pass a streamed leader response through to the client
+def relay_stream(response):
+    try:
+        yield from response.iter_content(chunk_size=None)
+    except requests.RequestException:
+        pass  # The leader ended the stream
+    finally:
+        response.close()
 
 # Flask routes
-@app.route('/')
-def index():
+@app.route('/', defaults={'tank_id': None})
+@app.route('/tanks/<tank_id>/')
+def index(tank_id):
     """Render the main page"""
+    tank = lookup_tank(tank_id)
     capture_time = "Never"
-    if os.path.exists(CURRENT_IMAGE_PATH):
-        capture_time = datetime.fromtimestamp(os.path.getmtime(CURRENT_IMAGE_PATH)).strftime("%Y-%m-%d %H:%M:%S")
+    image = get_current_image(tank)
+    if image:
+        capture_time = image.captured_at.strftime("%Y-%m-%d %H:%M:%S")
     
-    return render_template('index.html', health_data=latest_analysis, capture_time=capture_time)
+    return render_template('index.html', health_data=get_latest_analysis(tank), capture_time=capture_time,
+                           tank=tank, tanks=tanks.values())
+
+@app.route('/api/tanks')
+@leader_only
+def list_tanks():
+    """Return every configured tank"""
+    return jsonify({"status": "success", "tanks": [tank.to_dict() for tank in tanks.values()]})
 
-@app.route('/image')
-def get_image():
+@app.route('/image', defaults={'tank_id': None})
+@app.route('/tanks/<tank_id>/image')
+def get_image(tank_id):
     """Serve the current plant image"""
-    if os.path.exists(CURRENT_IMAGE_PATH):
-        return send_file(CURRENT_IMAGE_PATH, mimetype='image/jpeg')
+    image = get_current_image(lookup_tank(tank_id))
+    if image:
+        return conditional_response(image.jpeg, 'image/jpeg', image.etag, image.last_modified)
     else:
         return "No image available", 404
 
-@app.route('/api/health')
-def get_health():
+@app.route('/stream', defaults={'tank_id': None})
+@app.route('/tanks/<tank_id>/stream')
+@leader_only
+def get_stream(tank_id):
+    """Stream the tank's camera as MJPEG, at up to ?fps= frames per second and ?width= pixels wide"""
+    tank = lookup_tank(tank_id)
+    viewer = tank.live_stream.open(roi=tank.roi, fps=request.args.get('fps', type=float),
+                                   width=request.args.get('width', STREAM_WIDTH, type=int),
+                                   quality=request.args.get('quality', STREAM_JPEG_QUALITY, type=int))
+    if viewer is None:
+        return jsonify({"status": "error", "message": "Too many live viewers"}), 503
+    return Response(tank.live_stream.frames(viewer), content_type=STREAM_CONTENT_TYPE,
+                    headers={"Cache-Control": "no-cache"})
+
+@app.route('/api/images', defaults={'tank_id': None})
+@app.route('/api/tanks/<tank_id>/images')
+def list_images(tank_id):
+    """Return a page of archived images, newest first"""
+    tank = lookup_tank(tank_id)
+    try:
+        limit = max(1, min(int(request.args.get('limit', 20)), 200))
+        before = request.args.get('before', type=float)
+        records = tank.image_store.list(limit=limit, before=before)
+        images = [{
+            "name": record["name"],
+            "captured_at": datetime.fromtimestamp(record["captured_at"]).isoformat(),
+            "bytes": record["bytes"],
+            "url": url_for('get_archived_image', tank_id=tank.id, name=record["name"]),
+            "thumbnail_url": url_for('get_archived_image', tank_id=tank.id, name=record["thumbnail"]) if record["thumbnail"] else None
+        } for record in records]
+        total, total_bytes = tank.image_store.totals()
+        return jsonify({
+            "status": "success",
+            "images": images,
+            "total": total,
+            "total_bytes": total_bytes,
+            "next_before": records[-1]["captured_at"] if records and len(records) == limit else None
+        })
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+@app.route('/api/images/<name>', defaults={'tank_id': None})
+@app.route('/api/tanks/<tank_id>/images/<name>')
+def get_archived_image(tank_id, name):
+    """Serve an archived image or thumbnail"""
+    path = lookup_tank(tank_id).image_store.path(name)
+    if path and os.path.exists(path):
+        return send_file(path, mimetype='image/jpeg', conditional=True)
+    else:
+        return jsonify({"status": "error", "message": "Unknown image"}), 404
+
+# Function to read a time bound from the query string as an epoch or ISO timestamp
+def parse_time_arg(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+@app.route('/api/history/plants/<int:plant_id>', defaults={'tank_id': None})
+@app.route('/api/tanks/<tank_id>/history/plants/<int:plant_id>')
+def get_plant_timeline(tank_id, plant_id):
+    """Return the analysis timeline for one plant"""
+    tank = lookup_tank(tank_id)
+    try:
+        limit = max(1, min(int(request.args.get('limit', 500)), 5000))
+        timeline = tank.analysis_history.plant_timeline(plant_id, parse_time_arg('start'), parse_time_arg('end'), limit)
+        return jsonify({"status": "success", "tank_id": tank.id, "plant_id": plant_id, "results": timeline})
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+@app.route('/api/history/status', defaults={'tank_id': None})
+@app.route('/api/tanks/<tank_id>/history/status')
+def get_status_counts(tank_id):
+    """Return plant and tank status counts over a time range"""
+    tank = lookup_tank(tank_id)
+    try:
+        counts = tank.analysis_history.status_counts(parse_time_arg('start'), parse_time_arg('end'),
+                                                     request.args.get('plant_type'))
+        return jsonify({"status": "success", "tank_id": tank.id, "data": counts})
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+@app.route('/api/history/critical', defaults={'tank_id': None})
+@app.route('/api/tanks/<tank_id>/history/critical')
+def get_latest_critical(tank_id):
+    """Return the most recent critical plant and tank findings"""
+    tank = lookup_tank(tank_id)
+    try:
+        limit = max(1, min(int(request.args.get('limit', 20)), 200))
+        return jsonify({"status": "success", "tank_id": tank.id, "data": tank.analysis_history.latest_critical(limit)})
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+@app.route('/api/health', defaults={'tank_id': None})
+@app.route('/api/tanks/<tank_id>/health')
+def get_health(tank_id):
     """Return plant health data as JSON"""
-    if latest_analysis:
-        return jsonify(latest_analysis.model_dump())
-    elif os.path.exists(LATEST_ANALYSIS_PATH):
-        with open(LATEST_ANALYSIS_PATH, 'r') as f:
-            return jsonify(json.load(f))
+    analysis = get_latest_analysis(lookup_tank(tank_id))
+    if analysis:
+        return jsonify(analysis.model_dump())
     else:
         return jsonify({"error": "No analysis data available yet"})
 
-@app.route('/api/capture')
-def trigger_capture():
+@app.route('/api/capture', defaults={'tank_id': None})
+@app.route('/api/tanks/<tank_id>/capture')
+@leader_only
+def trigger_capture(tank_id):
     """Manually trigger a capture and analysis"""
+    tank = lookup_tank(tank_id)
     try:
-        print(f"[{datetime.now()}] Manual capture triggered")
-        capture_and_analyze()
-        return jsonify({"status": "success", "message": "Capture and analysis triggered"})
+        print(f"[{datetime.now()}] Manual capture triggered for {tank.name}")
+        job = tank.capture_queue.submit("manual")
+        return jsonify({
+            "status": "success",
+            "message": "Capture and analysis queued",
+            "job": job.to_dict()
+        }), 202
     except Exception as e:
         print(f"[{datetime.now()}] ERROR: Manual capture failed: {str(e)}")
         return jsonify({"status": "error", "message": str(e)}), 500
 
-@app.route('/api/metrics')
-def test_metrics():
+@app.route('/api/tanks/capture')
+@leader_only
+def trigger_capture_all():
+    """Manually trigger a capture and analysis of every tank"""
+    print(f"[{datetime.now()}] Manual capture triggered for {len(tanks)} tank(s)")
+    jobs = [tank.capture_queue.submit("manual").to_dict() for tank in tanks.values()]
+    return jsonify({
+        "status": "success",
+        "message": "Capture and analysis queued",
+        "jobs": jobs
+    }), 202
+
+@app.route('/api/jobs/<job_id>')
+@leader_only
+def get_job(job_id):
+    """Return the progress and result of a capture job"""
+    for tank in tanks.values():
+        job = tank.capture_queue.get(job_id)
+        if job:
+            return jsonify({"status": "success", "job": job.to_dict()})
+    return jsonify({"status": "error", "message": "Unknown job"}), 404
+
+@app.route('/api/metrics', defaults={'tank_id': None})
+@app.route('/api/tanks/<tank_id>/metrics')
+def test_metrics(tank_id):
     """Test endpoint to fetch and return sensor metrics"""
+    tank = lookup_tank(tank_id)
     try:
-        print(f"[{datetime.now()}] Testing Prometheus queries")
-        sensor_data = fetch_sensor_data()
+        print(f"[{datetime.now()}] Testing Prometheus queries for {tank.name}")
+        sensor_data = fetch_sensor_data(tank)
         if sensor_data:
             return jsonify({
                 "status": "success",
@@ -476,17 +815,85 @@ def test_metrics():
             "message": str(e)
         }), 500
 
-@app.route('/api/image/base64')
-def get_image_base64():
+@app.route('/api/screen', defaults={'tank_id': None})
+@app.route('/api/tanks/<tank_id>/screen')
+@leader_only
+def get_screen(tank_id):
+    """Return the latest local screen result with per-region colour metrics"""
+    result = lookup_tank(tank_id).screen.last_result
+    if result is None:
+        return jsonify({"status": "error", "message": "No screen result yet"}), 404
+    return jsonify({"status": "success", "screen": result.to_dict()})
+
+@app.route('/api/regions', defaults={'tank_id': None})
+@app.route('/api/tanks/<tank_id>/regions')
+@leader_only
+def get_regions(tank_id):
+    """Return the tracked plant regions and how much each changed at the last analysis"""
+    return jsonify({"status": "success", "regions": lookup_tank(tank_id).plant_regions.to_dict()})
+
+@app.route('/api/schedule')
+@leader_only
+def get_schedule():
+    """Return every tank's adaptive capture schedule and today's model call budget"""
+    return jsonify({"status": "success", "schedule": capture_scheduler.to_dict()})
+
+@app.route('/api/webhooks/alert', methods=['POST'])
+@leader_only
+def alert_webhook():
+    """Capture the tanks named by firing Grafana alerts, e.g. the humidity and temperature rules"""
+    if ALERT_WEBHOOK_TOKEN and request.headers.get('Authorization') != f"Bearer {ALERT_WEBHOOK_TOKEN}":
+        return jsonify({"status": "error", "message": "Invalid webhook token"}), 401
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({"status": "error", "message": "Expected a Grafana alert JSON body"}), 400
+
+    # Grafana sends every alert in the group, Node-RED may forward a single one
+    alerts = payload.get("alerts") or [payload]
+    triggered = {}
+    for alert in alerts:
+        if alert.get("status", payload.get("status", "firing")) != "firing":
+            continue
+        name = (alert.get("labels") or {}).get("alertname", "alert")
+        for tank in alert_tanks(alert, tanks):
+            if tank.id in triggered:
+                continue
+            job, skipped = capture_scheduler.trigger(tank, f"alert:{name}")
+            print(f"[{datetime.now()}] Alert {name} triggered a capture of {tank.name}"
+                  + (f", skipped ({skipped})" if skipped else ""))
+            triggered[tank.id] = {"job": job.to_dict() if job else None, "skipped": skipped}
+    queued = any(entry["job"] for entry in triggered.values())
+    return jsonify({"status": "success", "tanks": triggered}), 202 if queued else 200
+
+@app.route('/api/ready')
+def readiness():
+    """Report which subsystems of this process are up, 503 until all of them are"""
+    subsystems = {
+        "telemetry": {"ready": telemetry_ready.is_set()},
+        "leader_election": {"ready": leadership.started, "role": "leader" if leadership.is_leader else "follower",
+                            "leader_pid": leadership.leader().get("pid")}
+    }
+    if leadership.is_leader:
+        subsystems["model_client"] = {"ready": model_governor.client_ready, "circuit": model_governor.breaker.state}
+        subsystems["scheduler"] = {"ready": scheduler is not None and scheduler.running}
+        cameras = {tank.id: {"running": tank.camera.running, "has_frame": len(tank.camera.frames) > 0,
+                             "has_image": get_current_image(tank) is not None} for tank in tanks.values()}
+        subsystems["cameras"] = {"ready": all(c["has_frame"] for c in cameras.values()), "tanks": cameras}
+    for name, error in warmup_errors.items():
+        subsystems[name]["error"] = error
+
+    ready = all(subsystem["ready"] for subsystem in subsystems.values())
+    return jsonify({"status": "ready" if ready else "starting", "subsystems": subsystems}), 200 if ready else 503
+
+@app.route('/api/image/base64', defaults={'tank_id': None})
+@app.route('/api/tanks/<tank_id>/image/base64')
+def get_image_base64(tank_id):
     """Return the current image in base64 format"""
+    tank = lookup_tank(tank_id)
     try:
-        if os.path.exists(CURRENT_IMAGE_PATH):
-            with open(CURRENT_IMAGE_PATH, "rb") as image_file:
-                encoded_string = base64.b64encode(image_file.read()).decode('utf-8')
-            return jsonify({
-                "status": "success",
-                "data": encoded_string
-            })
+        image = get_current_image(tank)
+        if image:
+            return conditional_response(image.b64_json, 'application/json', f"{image.etag}-b64", image.last_modified)
         else:
             return jsonify({
                 "status": "error",
@@ -499,28 +906,88 @@ def get_image_base64():
             "message": str(e)
         }), 500
 
-# Main entry point
-if __name__ == "__main__":
-    # Set up the scheduler for 9am and 5pm captures
+# Function to start everything only one process may run: cameras, scheduler and captures
+def start_leader_services():
+    global scheduler
+    # Serve the app on localhost so other workers can forward leader-only requests
+    control_server = make_server("127.0.0.1", LEADER_CONTROL_PORT, app, threaded=True)
+    threading.Thread(target=control_server.serve_forever, name="leader-control", daemon=True).start()
+
+    # Check every minute which tanks their adaptive schedules say are due
     scheduler = BackgroundScheduler()
-    scheduler.add_job(capture_and_analyze, 'cron', hour='9,12,17')
+    scheduler.add_job(scheduled_capture, 'interval', seconds=CAPTURE_CHECK_SEC)
+    if SCREEN_INTERVAL_SEC > 0:
+        scheduler.add_job(screen_tanks, 'interval', seconds=SCREEN_INTERVAL_SEC)
     scheduler.start()
     
+    # Open the cameras now so exposure has settled before the first capture
+    for tank in tanks.values():
+        tank.camera.start()
+    
     # Load any existing analysis data
-    if os.path.exists(LATEST_ANALYSIS_PATH):
+    for tank in tanks.values():
+        analysis = get_latest_analysis(tank)
+        if analysis is not None:
+            print(f"[{datetime.now()}] Loaded existing analysis data for {tank.name}")
+            tank.schedule.record(worst_status(plant.plant_status for plant in analysis.log),
+                                 datetime.fromtimestamp(tank.latest_analysis_mtime))
+            image = get_current_image(tank)
+            if image is not None:
+                tank.screen.set_baseline(image.pixels, image.captured_at)
+    
+    # Take an initial picture and analyze at startup if needed, tanks in parallel
+    missing = [tank for tank in tanks.values() if not os.path.exists(tank.current_image_path)]
+    if missing:
+        print(f"[{datetime.now()}] Taking initial picture of {len(missing)} tank(s) at startup")
+        for tank in missing:
+            tank.capture_queue.submit("startup")
+
+leadership = LeaderLock(LEADER_LOCK, start_leader_services, f"http://127.0.0.1:{LEADER_CONTROL_PORT}")
+scheduler = None
+
+# Subsystems brought up in the background, so the web server binds straight away
+telemetry_ready = threading.Event()
+warmup_errors = {}
+warmup_thread = None
+
+def warm_up():
+    try:
+        init_telemetry(service_name, OTLP_ENDPOINT, log_handler)
+        telemetry_ready.set()
+    except Exception as e:
+        print(f"[{datetime.now()}] ERROR: Failed to set up telemetry: {str(e)}")
+        warmup_errors["telemetry"] = str(e)
+
+    leadership.start()
+
+    # Load the OpenAI SDK before the first capture needs it
+    if leadership.is_leader:
         try:
-            with open(LATEST_ANALYSIS_PATH, 'r') as f:
-                analysis_data = json.load(f)
-                latest_analysis = HealthResponse.model_validate(analysis_data)
-            print(f"[{datetime.now()}] Loaded existing analysis data")
+            model_governor.client
         except Exception as e:
-            print(f"[{datetime.now()}] WARNING: Failed to load existing analysis: {str(e)}")
-    
-    # Take an initial picture and analyze at startup if needed
-    if not os.path.exists(CURRENT_IMAGE_PATH):
-        print(f"[{datetime.now()}] Taking initial picture at startup")
-        capture_and_analyze()
+            print(f"[{datetime.now()}] ERROR: Failed to create the OpenAI client: {str(e)}")
+            warmup_errors["model_client"] = str(e)
+    print(f"[{datetime.now()}] Warm-up finished")
+
+def create_app():
+    """Return the Flask app for a WSGI server, e.g. ``gunicorn -w 2 --threads 8 wsgi:app``.
+
+    Every worker serves the dashboard and API. One of them wins the leader
+    lock and runs the cameras, scheduler and captures; the rest share its
+    results through the files in each tank's image directory. Telemetry,
+    leader election and the model client come up on a background thread,
+    /api/ready reports when they have.
+    """
+    global warmup_thread
+    if warmup_thread is None:
+        warmup_thread = threading.Thread(target=warm_up, name="warm-up", daemon=True)
+        warmup_thread.start()
+    return app
+
+# Main entry point
+if __name__ == "__main__":
+    create_app()
     
-    # Start the Flask web server
+    # Start the Flask web server, one thread per request
     print(f"[{datetime.now()}] Starting web server on port 5000")
-    app.run(host='0.0.0.0', port=5000)
+    app.run(host='0.0.0.0', port=5000, threaded=True)
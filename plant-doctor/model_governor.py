@@ -0,0 +1,382 @@
+import os
+import json
+import time
+import random
+import threading
+from datetime import datetime
+from opentelemetry import metrics, trace
+
+# Request pacing shared by every model call, across tanks and triggers
+OPENAI_RATE_PER_MIN = float(os.environ.get("OPENAI_RATE_PER_MIN", "20"))
+OPENAI_BURST = int(os.environ.get("OPENAI_BURST", "3"))
+OPENAI_MAX_CONCURRENCY = int(os.environ.get("OPENAI_MAX_CONCURRENCY", "2"))
+OPENAI_QUEUE_TIMEOUT_SEC = float(os.environ.get("OPENAI_QUEUE_TIMEOUT", "300"))  # Longest a call waits for a slot
+
+# Retries for 429, 5xx and connection errors, with full jitter
+OPENAI_MAX_RETRIES = int(os.environ.get("OPENAI_MAX_RETRIES", "4"))
+OPENAI_RETRY_BASE_SEC = float(os.environ.get("OPENAI_RETRY_BASE_SEC", "1"))
+OPENAI_RETRY_MAX_SEC = float(os.environ.get("OPENAI_RETRY_MAX_SEC", "30"))
+
+# Consecutive failed calls that open the circuit, and how long it stays open
+OPENAI_BREAKER_FAILURES = int(os.environ.get("OPENAI_BREAKER_FAILURES", "3"))
+OPENAI_BREAKER_RESET_SEC = float(os.environ.get("OPENAI_BREAKER_RESET_SEC", "300"))
+
+# Model calls allowed per local day across every tank and trigger, 0 for no limit
+OPENAI_DAILY_BUDGET = int(os.environ.get("OPENAI_DAILY_BUDGET", "40"))
+
+CIRCUIT_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+tracer = trace.get_tracer(__name__)
+
+
+class ModelUnavailableError(Exception):
+    """The model could not be reached: budget spent, circuit open, no slot in time, or retries exhausted"""
+
+
+class TokenBucket:
+    """Allows ``rate`` calls per second on average with bursts of up to ``burst``"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout):
+        """Take a token, waiting up to ``timeout`` seconds. Returns False on timeout."""
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = (1 - self.tokens) / self.rate
+            if now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+    """Opens after ``failure_threshold`` consecutive failures.
+
+    While open every call is refused. After ``reset_sec`` one trial call is let
+    through (half-open); its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold, reset_sec):
+        self.failure_threshold = failure_threshold
+        self.reset_sec = reset_sec
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_sec:
+                self.state = "half_open"
+            if self.state == "closed":
+                return True
+            if self.state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != "closed":
+                print(f"[{datetime.now()}] Model circuit closed")
+            self.state = "closed"
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def release(self):
+        """Give back a trial that never reached the API, without judging it"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    print(f"[{datetime.now()}] WARNING: Model circuit opened after {self.failures} failures, "
+                          f"retrying in {self.reset_sec:.0f}s")
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+
+class DailyBudget:
+    """Counts model calls per local day and refuses them once ``limit`` is spent.
+
+    The count is kept in ``path``, so a restart does not hand out a fresh budget.
+    """
+
+    def __init__(self, limit, path=None):
+        self.limit = limit
+        self.path = path
+        self.day = datetime.now().date().isoformat()
+        self.used = 0
+        self._lock = threading.Lock()
+        if path:
+            try:
+                with open(path, "r") as f:
+                    state = json.load(f)
+                if state.get("day") == self.day:
+                    self.used = int(state.get("used", 0))
+            except (OSError, ValueError):
+                pass
+
+    def _roll_over(self):
+        today = datetime.now().date().isoformat()
+        if today != self.day:
+            self.day = today
+            self.used = 0
+
+    @property
+    def remaining(self):
+        """Calls left today, or None without a limit"""
+        if self.limit <= 0:
+            return None
+        with self._lock:
+            self._roll_over()
+            return max(0, self.limit - self.used)
+
+    def try_spend(self):
+        """Take one call from today's budget. Returns False once it is spent."""
+        with self._lock:
+            self._roll_over()
+            if 0 < self.limit <= self.used:
+                return False
+            self.used += 1
+            self._save()
+            return True
+
+    def refund(self):
+        """Return a call that was never made"""
+        with self._lock:
+            self.used = max(0, self.used - 1)
+            self._save()
+
+    def _save(self):
+        if not self.path:
+            return
+        try:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"day": self.day, "used": self.used}, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"[{datetime.now()}] WARNING: Failed to save the model call budget: {str(e)}")
+
+    def to_dict(self):
+        return {"day": self.day, "limit": self.limit, "used": self.used, "remaining": self.remaining}
+
+
+def is_account_error(error):
+    """Errors about the API key or account, which fail every call until someone fixes them"""
+    import openai  # Already loaded by the client that raised ``error``
+    if isinstance(error, (openai.AuthenticationError, openai.PermissionDeniedError)):
+        return True
+    return isinstance(error, openai.RateLimitError) and getattr(error, "code", None) == "insufficient_quota"
+
+
+def is_retryable(error):
+    import openai
+    if is_account_error(error):
+        return False
+    if isinstance(error, (openai.RateLimitError, openai.InternalServerError, openai.APIConnectionError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+
+def retry_after(error):
+    """Seconds the server asked us to wait, if it said so"""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class ModelGovernor:
+    """Shared gate in front of every OpenAI structured-output call.
+
+    Calls wait for a concurrency slot and a rate-limit token, transient errors
+    are retried with jittered exponential backoff (honouring Retry-After), and
+    repeated failures open a circuit so callers can fall back to cached
+    results instead of queueing behind a dead API. An optional ``budget``
+    caps the calls made per day, refused calls fall back the same way.
+    Latency, outcomes and token usage are recorded as OpenTelemetry metrics.
+
+    ``client`` may be a zero-argument factory instead, called on the first
+    request so the OpenAI SDK is only loaded when it is needed.
+    """
+
+    def __init__(self, client, rate_per_min=OPENAI_RATE_PER_MIN, burst=OPENAI_BURST,
+                 max_concurrency=OPENAI_MAX_CONCURRENCY, queue_timeout=OPENAI_QUEUE_TIMEOUT_SEC,
+                 max_retries=OPENAI_MAX_RETRIES, retry_base=OPENAI_RETRY_BASE_SEC, retry_max=OPENAI_RETRY_MAX_SEC,
+                 breaker=None, budget=None, meter=None):
+        self._client = None if callable(client) else client
+        self._client_factory = client if callable(client) else None
+        self._client_lock = threading.Lock()
+        self.bucket = TokenBucket(rate_per_min / 60.0, burst)
+        self.slots = threading.BoundedSemaphore(max_concurrency)
+        self.queue_timeout = queue_timeout
+        self.max_retries = max_retries
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.breaker = breaker or CircuitBreaker(OPENAI_BREAKER_FAILURES, OPENAI_BREAKER_RESET_SEC)
+        self.budget = budget
+
+        meter = meter or metrics.get_meter(__name__)
+        self.calls = meter.create_counter(
+            name="openai_requests",
+            description="Model requests by outcome: success, retry, error, rejected"
+        )
+        self.latency = meter.create_histogram(
+            name="openai_request_duration_seconds",
+            unit="s",
+            description="Latency of each model request attempt"
+        )
+        self.tokens = meter.create_counter(
+            name="openai_tokens",
+            description="Tokens used by model requests"
+        )
+        self.wait = meter.create_histogram(
+            name="openai_queue_wait_seconds",
+            unit="s",
+            description="Time spent waiting for a concurrency slot and rate-limit token"
+        )
+        meter.create_observable_gauge(
+            name="openai_circuit_state",
+            description="Model circuit breaker state: 0 closed, 1 half open, 2 open",
+            callbacks=[lambda options: [metrics.Observation(CIRCUIT_STATES[self.breaker.state])]]
+        )
+        meter.create_observable_gauge(
+            name="openai_budget_remaining",
+            description="Model calls left in today's budget",
+            callbacks=[lambda options: self._observe_budget()]
+        )
+
+    def _observe_budget(self):
+        remaining = self.budget.remaining if self.budget is not None else None
+        return [] if remaining is None else [metrics.Observation(remaining)]
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = self._client_factory()
+        return self._client
+
+    @client.setter
+    def client(self, client):
+        self._client = client
+
+    @property
+    def client_ready(self):
+        return self._client is not None
+
+    def _backoff(self, attempt, error):
+        delay = random.uniform(0, min(self.retry_max, self.retry_base * 2 ** attempt))
+        server_delay = retry_after(error)
+        if server_delay is not None:
+            delay = max(delay, min(server_delay, self.retry_max))
+        return delay
+
+    def parse(self, kind, **request):
+        """Run ``client.beta.chat.completions.parse(**request)`` under the governor.
+
+        ``kind`` labels the call in metrics, e.g. "plants" or "tank". Raises
+        ModelUnavailableError when the model cannot be reached; other API
+        errors such as a bad request are raised unchanged.
+        """
+        attributes = {"kind": kind, "model": request.get("model", "")}
+        # The span records any exception raised, including ModelUnavailableError
+        with tracer.start_as_current_span(f"openai.parse {kind}", attributes=attributes) as span:
+            return self._parse(span, attributes, kind, request)
+
+    def _reject_locally(self, attributes, reason):
+        """Refuse a call that timed out waiting here; it never reached the API, so it costs no budget and is no API failure"""
+        self.breaker.release()
+        if self.budget is not None:
+            self.budget.refund()
+        self.calls.add(1, {**attributes, "outcome": "rejected"})
+        raise ModelUnavailableError(reason)
+
+    def _parse(self, span, attributes, kind, request):
+        span.set_attribute("circuit.state", self.breaker.state)
+        # Spent first so a refused call never holds the half-open trial, and refunded if the circuit is open
+        if self.budget is not None and not self.budget.try_spend():
+            self.calls.add(1, {**attributes, "outcome": "rejected"})
+            raise ModelUnavailableError("daily model call budget spent")
+        if not self.breaker.allow():
+            if self.budget is not None:
+                self.budget.refund()
+            self.calls.add(1, {**attributes, "outcome": "rejected"})
+            raise ModelUnavailableError("circuit open")
+
+        queued_at = time.monotonic()
+        if not self.slots.acquire(timeout=self.queue_timeout):
+            self._reject_locally(attributes, "no model slot available")
+        try:
+            remaining = max(0.0, self.queue_timeout - (time.monotonic() - queued_at))
+            if not self.bucket.acquire(remaining):
+                self._reject_locally(attributes, "rate limit wait exceeded")
+            self.wait.record(time.monotonic() - queued_at, attributes)
+            span.set_attribute("queue.wait_ms", (time.monotonic() - queued_at) * 1000)
+
+            attempt = 0
+            while True:
+                started = time.monotonic()
+                try:
+                    response = self.client.beta.chat.completions.parse(**request)
+                except Exception as e:
+                    self.latency.record(time.monotonic() - started, {**attributes, "outcome": "error"})
+                    if is_account_error(e):
+                        # Every call would fail the same way, so open the circuit and let callers fall back
+                        self.breaker.record_failure()
+                        self.calls.add(1, {**attributes, "outcome": "error"})
+                        raise ModelUnavailableError(f"{kind} request refused for the account: {e}") from e
+                    if not is_retryable(e):
+                        # Only this request was wrong: it says nothing about the API and was not billed
+                        self.breaker.release()
+                        if self.budget is not None:
+                            self.budget.refund()
+                        self.calls.add(1, {**attributes, "outcome": "error"})
+                        raise
+                    if attempt >= self.max_retries:
+                        self.breaker.record_failure()
+                        self.calls.add(1, {**attributes, "outcome": "error"})
+                        raise ModelUnavailableError(f"{kind} request failed after {attempt + 1} attempts: {e}") from e
+                    delay = self._backoff(attempt, e)
+                    self.calls.add(1, {**attributes, "outcome": "retry"})
+                    print(f"[{datetime.now()}] WARNING: {kind} model request failed ({e}), retrying in {delay:.1f}s")
+                    span.add_event("retry", {"attempt": attempt + 1, "delay_s": delay, "error": str(e)})
+                    time.sleep(delay)
+                    attempt += 1
+                    continue
+
+                self.latency.record(time.monotonic() - started, {**attributes, "outcome": "success"})
+                self.breaker.record_success()
+                self.calls.add(1, {**attributes, "outcome": "success"})
+                span.set_attribute("attempts", attempt + 1)
+                usage = getattr(response, "usage", None)
+                if usage is not None:
+                    span.set_attribute("tokens.prompt", usage.prompt_tokens or 0)
+                    span.set_attribute("tokens.completion", usage.completion_tokens or 0)
+                    self.tokens.add(usage.prompt_tokens or 0, {**attributes, "type": "prompt"})
+                    self.tokens.add(usage.completion_tokens or 0, {**attributes, "type": "completion"})
+                return response
+        finally:
+            self.slots.release()
@@ -0,0 +1,168 @@
+import os
+import re
+import json
+import time
+import logging
+import threading
+from datetime import datetime
+from difflib import SequenceMatcher
+
+# Model statuses and the log level their events are sent at
+LEVELS = {"info": logging.INFO, "warning": logging.WARNING, "critical": logging.CRITICAL}
+
+# How often a summary of every plant is logged even when nothing changed
+PLANT_SUMMARY_INTERVAL_SEC = float(os.environ.get("PLANT_SUMMARY_INTERVAL", str(24 * 3600)))
+
+# Diagnoses at least this similar are treated as a rewording, not a change
+DIAGNOSIS_SIMILARITY = float(os.environ.get("PLANT_DIAGNOSIS_SIMILARITY", "0.8"))
+
+
+def normalize(text):
+    return re.sub(r"\s+", " ", (text or "").strip().lower())
+
+
+def diagnosis_changed(previous, current, threshold=DIAGNOSIS_SIMILARITY):
+    previous, current = normalize(previous), normalize(current)
+    if previous == current:
+        return False
+    return SequenceMatcher(None, previous, current).ratio() < threshold
+
+
+class PlantEventEmitter:
+    """Turns each analysis into log events for what changed since the last run.
+
+    A plant is logged when it first appears, when its status changes, when
+    its diagnosis changes materially, and when it is no longer seen. The tank
+    result is logged the same way. Every ``summary_interval`` seconds one
+    summary event lists the status counts and the plants needing attention,
+    so quiet tanks still show up in Loki.
+
+    The last known state is kept in ``path`` so a restart does not re-emit
+    every plant as new.
+    """
+
+    def __init__(self, tank_id, path, summary_interval=PLANT_SUMMARY_INTERVAL_SEC):
+        self.tank_id = tank_id
+        self.path = path
+        self.summary_interval = summary_interval
+        self._lock = threading.Lock()
+        self._state = {"plants": {}, "tank": None, "last_summary": 0.0}
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r') as f:
+                self._state.update(json.load(f))
+        except Exception as e:
+            print(f"[{datetime.now()}] WARNING: Failed to load plant event state: {str(e)}")
+
+    def _save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self._state, f)
+        os.replace(tmp_path, self.path)
+
+    def _emit(self, status, msg, event_type, attributes):
+        logging.log(LEVELS.get(status, logging.INFO), msg, extra={
+            "tank.id": self.tank_id,
+            "event.type": event_type,
+            **attributes
+        })
+
+    def plants(self, results):
+        """Log changes for a list of PlantHealth results. Returns the number of events."""
+        with self._lock:
+            known = self._state["plants"]
+            seen = set()
+            events = 0
+            for plant in results:
+                key = f"{plant.plant_type}:{plant.plant_id}"
+                seen.add(key)
+                previous = known.get(key)
+                if previous is None:
+                    event_type = "plant.new"
+                elif previous["status"] != plant.plant_status:
+                    event_type = "plant.status_changed"
+                elif diagnosis_changed(previous["diagnosis"], plant.plant_diagnosis):
+                    event_type = "plant.diagnosis_changed"
+                else:
+                    continue
+
+                attributes = {
+                    "plant.id": plant.plant_id,
+                    "plant.type": plant.plant_type,
+                    "plant.status": plant.plant_status,
+                    "plant.diagnosis": plant.plant_diagnosis,
+                    "plant.position": plant.plant_position
+                }
+                if previous is not None:
+                    attributes["plant.previous_status"] = previous["status"]
+                self._emit(plant.plant_status, f"{plant.plant_type}: {plant.plant_id} -> {plant.plant_position}",
+                           event_type, attributes)
+                known[key] = {
+                    "id": plant.plant_id,
+                    "type": plant.plant_type,
+                    "status": plant.plant_status,
+                    "diagnosis": plant.plant_diagnosis,
+                    "position": plant.plant_position
+                }
+                events += 1
+
+            for key in sorted(set(known) - seen):
+                previous = known.pop(key)
+                self._emit("warning", f"{previous['type']}: {previous['id']} no longer seen", "plant.missing", {
+                    "plant.id": previous["id"],
+                    "plant.type": previous["type"],
+                    "plant.previous_status": previous["status"],
+                    "plant.position": previous["position"]
+                })
+                events += 1
+
+            events += self._summarize(time.time())
+            self._save()
+            return events
+
+    def _summarize(self, now):
+        if now - self._state["last_summary"] < self.summary_interval:
+            return 0
+        self._state["last_summary"] = now
+        plants = self._state["plants"].values()
+        counts = {status: 0 for status in LEVELS}
+        for plant in plants:
+            counts[plant["status"]] = counts.get(plant["status"], 0) + 1
+        attention = sorted(f"{p['type']}: {p['id']} ({p['status']})" for p in plants if p["status"] != "info")
+        self._emit("info", "Plant summary", "plant.summary", {
+            "plants.total": len(plants),
+            **{f"plants.{status}": count for status, count in counts.items()},
+            "plants.attention": attention
+        })
+        return 1
+
+    def tank(self, result):
+        """Log a TankHealth result if its status or diagnosis changed. Returns True if logged."""
+        with self._lock:
+            previous = self._state["tank"]
+            if previous is None:
+                event_type = "tank.new"
+            elif previous["status"] != result.tank_status:
+                event_type = "tank.status_changed"
+            elif diagnosis_changed(previous["diagnosis"], result.combined_diagnosis):
+                event_type = "tank.diagnosis_changed"
+            else:
+                return False
+
+            attributes = {
+                "tank.status": result.tank_status,
+                "temperature.analysis": result.temperature_analysis,
+                "humidity.analysis": result.humidity_analysis,
+                "combined.diagnosis": result.combined_diagnosis,
+                "recommendations": result.recommendations
+            }
+            if previous is not None:
+                attributes["tank.previous_status"] = previous["status"]
+            self._emit(result.tank_status, "Tank Health Analysis", event_type, attributes)
+            self._state["tank"] = {"status": result.tank_status, "diagnosis": result.combined_diagnosis}
+            self._save()
+            return True
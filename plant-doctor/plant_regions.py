@@ -0,0 +1,359 @@
+import os
+import json
+import threading
+from datetime import datetime
+import cv2
+import numpy as np
+from vision_screen import MIN_BRIGHTNESS, ScreenFeatures
+
+# A plant is re-diagnosed when its crop drifted in hue, lost pigment or changed shape since its last diagnosis
+PLANT_REGION_CHANGE_THRESHOLD = float(os.environ.get("PLANT_REGION_CHANGE_THRESHOLD", "0.2"))
+PLANT_REGION_DEGRADATION_THRESHOLD = float(os.environ.get("PLANT_REGION_DEGRADATION_THRESHOLD", "0.05"))
+PLANT_REGION_SHAPE_THRESHOLD = float(os.environ.get("PLANT_REGION_SHAPE_THRESHOLD", "0.1"))
+
+# The whole frame is still analysed this often, to find new plants, and whenever
+# more than PLANT_MAX_CHANGED_SHARE of the plants changed; 0 always analyses the whole frame
+PLANT_FULL_ANALYSIS_SEC = float(os.environ.get("PLANT_FULL_ANALYSIS_SEC", str(24 * 3600)))
+PLANT_MAX_CHANGED_SHARE = float(os.environ.get("PLANT_MAX_CHANGED_SHARE", "0.5"))
+
+# Crops sent to the model: box plus this much margin on every side, longest side in pixels
+PLANT_CROP_PADDING = 0.1
+PLANT_CROP_MAX_SIDE = int(os.environ.get("PLANT_CROP_MAX_SIDE", "512"))
+
+# Frame alignment with ORB features on a greyscale copy
+ALIGN_WIDTH = 640
+ALIGN_FEATURES = 1000
+ALIGN_MATCH_RATIO = 0.75
+ALIGN_MIN_INLIERS = 20
+# The camera is taken not to have moved when thumbnails this wide, which average out
+# sensor noise, differ by less than this mean grey level. Saves matching, and works in featureless scenes.
+ALIGN_STILL_WIDTH = 80
+ALIGN_STILL_DIFF = 2.0
+
+# Model boxes of a full analysis keep a tracked plant's id when they overlap it this much
+MATCH_MIN_IOU = 0.3
+
+# Crops are compared at this size on a 2x2 grid, so a change in part of a plant still shows
+FEATURE_SIZE = 128
+FEATURE_GRID = (2, 2)
+
+
+def to_align(pixels):
+    """Greyscale copy of a frame at ALIGN_WIDTH, for alignment"""
+    grey = cv2.cvtColor(pixels, cv2.COLOR_BGR2GRAY) if pixels.ndim == 3 else pixels
+    height = round(grey.shape[0] * ALIGN_WIDTH / grey.shape[1])
+    return cv2.resize(grey, (ALIGN_WIDTH, height), interpolation=cv2.INTER_AREA)
+
+
+def thumbnail(grey):
+    height = max(1, round(grey.shape[0] * ALIGN_STILL_WIDTH / grey.shape[1]))
+    return cv2.resize(grey, (ALIGN_STILL_WIDTH, height), interpolation=cv2.INTER_AREA).astype(np.float32)
+
+
+def clamp_box(box):
+    """Keep a normalised ``(x, y, width, height)`` box inside the frame"""
+    x, y, w, h = box
+    x0, y0 = min(max(x, 0.0), 1.0), min(max(y, 0.0), 1.0)
+    x1, y1 = min(max(x + w, 0.0), 1.0), min(max(y + h, 0.0), 1.0)
+    return [round(float(v), 4) for v in (x0, y0, x1 - x0, y1 - y0)]
+
+
+def iou(a, b):
+    """Intersection over union of two normalised boxes"""
+    ix = max(0.0, min(a[0] + a[2], b[0] + b[2]) - max(a[0], b[0]))
+    iy = max(0.0, min(a[1] + a[3], b[1] + b[3]) - max(a[1], b[1]))
+    intersection = ix * iy
+    union = a[2] * a[3] + b[2] * b[3] - intersection
+    return intersection / union if union > 0 else 0.0
+
+
+def transform_box(matrix, box, size):
+    """Move a normalised box with a 2x3 affine ``matrix`` in align pixels of ``size`` (width, height)"""
+    if matrix is None:
+        return list(box)
+    width, height = size
+    x, y, w, h = box
+    corners = np.float32([[x, y], [x + w, y], [x, y + h], [x + w, y + h]]) * (width, height)
+    moved = cv2.transform(corners[None], matrix)[0] / (width, height)
+    x0, y0 = moved.min(axis=0)
+    x1, y1 = moved.max(axis=0)
+    return clamp_box([float(x0), float(y0), float(x1 - x0), float(y1 - y0)])
+
+
+def crop_box(pixels, box, padding=PLANT_CROP_PADDING):
+    """Crop a normalised box, widened by ``padding`` of its size on every side"""
+    height, width = pixels.shape[:2]
+    x, y, w, h = box
+    x0 = max(0, int((x - w * padding) * width))
+    y0 = max(0, int((y - h * padding) * height))
+    x1 = min(width, int(np.ceil((x + w * (1 + padding)) * width)))
+    y1 = min(height, int(np.ceil((y + h * (1 + padding)) * height)))
+    return pixels[y0:max(y1, y0 + 1), x0:max(x1, x0 + 1)]
+
+
+def region_features(crop):
+    return ScreenFeatures(cv2.resize(crop, (FEATURE_SIZE, FEATURE_SIZE), interpolation=cv2.INTER_AREA),
+                          FEATURE_GRID, width=FEATURE_SIZE)
+
+
+def box_dict(box):
+    return {"x": box[0], "y": box[1], "width": box[2], "height": box[3]}
+
+
+def box_list(box):
+    return [float(box["x"]), float(box["y"]), float(box["width"]), float(box["height"])]
+
+
+class RegionPlan:
+    """Where every tracked plant is in a new frame, and which of them changed"""
+
+    def __init__(self, grey, boxes, crops, features, scores, changed):
+        self.grey = grey
+        self.boxes = boxes        # plant id -> normalised box in the new frame
+        self.crops = crops        # plant id -> BGR crop of the new frame
+        self.features = features  # plant id -> ScreenFeatures of the crop
+        self.scores = scores      # plant id -> change scores against the last diagnosis
+        self.changed = changed    # plant ids to re-diagnose
+
+
+class PlantTracker:
+    """Stable per-plant regions for one tank, persisted under ``directory``.
+
+    A full analysis gives every plant a bounding box. Later frames are
+    aligned to the previous one with ORB feature matching, which carries the
+    boxes across small camera moves, and each plant's crop is compared with
+    the crop it was last diagnosed from. Only plants whose crop changed need
+    a new diagnosis; the others keep theirs. Plant ids are assigned here, so
+    a plant keeps its id however the model numbers it.
+    """
+
+    def __init__(self, directory, full_interval=PLANT_FULL_ANALYSIS_SEC, max_changed_share=PLANT_MAX_CHANGED_SHARE):
+        self.directory = os.path.join(directory, "plant_regions")
+        self.path = os.path.join(directory, "plant_regions.json")
+        self.full_interval = full_interval
+        self.max_changed_share = max_changed_share
+        self.plants = {}    # plant id -> {"box", "result", "analysed_at"}
+        self.features = {}  # plant id -> ScreenFeatures of the crop it was last diagnosed from
+        self.reference = None
+        self.full_at = None
+        self.next_id = 1
+        self.complete = False  # Every plant of the last full analysis had a box
+        self.last_plan = None
+        self.last_reason = None
+        self._orb = cv2.ORB_create(ALIGN_FEATURES)
+        self._reference_features = None
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r") as f:
+                state = json.load(f)
+            reference = cv2.imread(os.path.join(self.directory, "frame.png"), cv2.IMREAD_GRAYSCALE)
+            features = {}
+            for plant_id in state["plants"]:
+                crop = cv2.imread(os.path.join(self.directory, f"{plant_id}.png"))
+                if crop is not None:
+                    features[int(plant_id)] = region_features(crop)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            print(f"[{datetime.now()}] WARNING: Failed to load plant regions: {str(e)}")
+            return
+        self.plants = {int(plant_id): {**plant, "analysed_at": datetime.fromisoformat(plant["analysed_at"])}
+                       for plant_id, plant in state["plants"].items()}
+        self.features = features
+        self.full_at = datetime.fromisoformat(state["full_at"]) if state.get("full_at") else None
+        self.next_id = state.get("next_id", max(self.plants, default=0) + 1)
+        self.complete = state.get("complete", False)
+        self._set_reference(reference)
+
+    def _save(self, crops):
+        os.makedirs(self.directory, exist_ok=True)
+        cv2.imwrite(os.path.join(self.directory, "frame.png"), self.reference)
+        for plant_id, crop in crops.items():
+            cv2.imwrite(os.path.join(self.directory, f"{plant_id}.png"),
+                        cv2.resize(crop, (FEATURE_SIZE, FEATURE_SIZE), interpolation=cv2.INTER_AREA))
+        for name in os.listdir(self.directory):
+            stem, ext = os.path.splitext(name)
+            if ext == ".png" and stem.isdigit() and int(stem) not in self.plants:
+                os.remove(os.path.join(self.directory, name))
+
+        state = {
+            "next_id": self.next_id,
+            "full_at": self.full_at.isoformat() if self.full_at else None,
+            "complete": self.complete,
+            "plants": {str(plant_id): {**plant, "analysed_at": plant["analysed_at"].isoformat()}
+                       for plant_id, plant in self.plants.items()}
+        }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def _set_reference(self, grey):
+        self.reference = grey
+        self._reference_features = self._orb.detectAndCompute(grey, None) if grey is not None else None
+
+    def align(self, grey):
+        """Affine transform from the reference frame to ``grey``, or None if they cannot be matched"""
+        if self.reference is None or self.reference.shape != grey.shape:
+            return None
+        if np.abs(thumbnail(self.reference) - thumbnail(grey)).mean() < ALIGN_STILL_DIFF:
+            return np.float32([[1, 0, 0], [0, 1, 0]])
+        reference_keypoints, reference_descriptors = self._reference_features
+        keypoints, descriptors = self._orb.detectAndCompute(grey, None)
+        if reference_descriptors is None or descriptors is None:
+            return None
+        pairs = cv2.BFMatcher(cv2.NORM_HAMMING).knnMatch(reference_descriptors, descriptors, k=2)
+        good = [pair[0] for pair in pairs if len(pair) == 2 and pair[0].distance < ALIGN_MATCH_RATIO * pair[1].distance]
+        if len(good) < ALIGN_MIN_INLIERS:
+            return None
+        source = np.float32([reference_keypoints[m.queryIdx].pt for m in good])
+        target = np.float32([keypoints[m.trainIdx].pt for m in good])
+        matrix, inliers = cv2.estimateAffinePartial2D(source, target, method=cv2.RANSAC, ransacReprojThreshold=3.0)
+        if matrix is None or inliers is None or int(inliers.sum()) < ALIGN_MIN_INLIERS:
+            return None
+        return matrix
+
+    def plan(self, pixels, now=None, recheck_after=None):
+        """Locate the tracked plants in ``pixels`` and work out which changed.
+
+        Plants at warning or critical whose diagnosis is older than
+        ``recheck_after`` seconds are re-diagnosed even if they look the same.
+        Returns None when the whole frame should be analysed instead, with
+        the reason in ``last_reason``.
+        """
+        now = now or datetime.now()
+        self.last_plan = None
+        with self._lock:
+            if not self.plants or not self.complete:
+                self.last_reason = "no_regions"
+            elif self.full_interval <= 0 or self.full_at is None \
+                    or (now - self.full_at).total_seconds() >= self.full_interval:
+                self.last_reason = "full_due"
+            else:
+                self.last_reason = None
+            if self.last_reason:
+                return None
+
+            grey = to_align(pixels)
+            if float(grey.mean()) < MIN_BRIGHTNESS:
+                self.last_reason = "dark"
+                return None
+            matrix = self.align(grey)
+            if matrix is None:
+                self.last_reason = "alignment_lost"
+                return None
+
+            size = (grey.shape[1], grey.shape[0])
+            boxes, crops, features, scores, changed = {}, {}, {}, {}, []
+            for plant_id, plant in self.plants.items():
+                boxes[plant_id] = transform_box(matrix, plant["box"], size)
+                crops[plant_id] = crop_box(pixels, boxes[plant_id])
+                features[plant_id] = region_features(crops[plant_id])
+                previous = self.features.get(plant_id)
+                if previous is None:
+                    scores[plant_id] = None
+                    changed.append(plant_id)
+                    continue
+                scores[plant_id] = {
+                    "drift": float(features[plant_id].drift(previous).max()),
+                    "degradation": float(features[plant_id].degradation(previous).max()),
+                    "shape": float(features[plant_id].change(previous).max())
+                }
+                recheck = recheck_after is not None \
+                    and str(plant["result"].get("plant_status", "")).lower() in ("warning", "critical") \
+                    and (now - plant["analysed_at"]).total_seconds() >= recheck_after
+                if recheck or scores[plant_id]["drift"] >= PLANT_REGION_CHANGE_THRESHOLD \
+                        or scores[plant_id]["degradation"] >= PLANT_REGION_DEGRADATION_THRESHOLD \
+                        or scores[plant_id]["shape"] >= PLANT_REGION_SHAPE_THRESHOLD:
+                    changed.append(plant_id)
+
+            plan = RegionPlan(grey, boxes, crops, features, scores, changed)
+            self.last_plan = plan
+            if len(changed) > self.max_changed_share * len(self.plants):
+                self.last_reason = "mostly_changed"
+                return None
+            return plan
+
+    def assign(self, pixels, log, now=None):
+        """Give the plants of a full analysis stable ids and track their boxes.
+
+        ``log`` holds PlantHealth dicts whose ``plant_box`` is normalised to
+        the frame. A plant overlapping a tracked plant keeps its id, others get
+        new ones. Returns the log with the ids replaced.
+        """
+        now = now or datetime.now()
+        with self._lock:
+            grey = to_align(pixels)
+            # Without a match the camera most likely has not moved, so compare the boxes as they are
+            matrix = self.align(grey)
+            size = (grey.shape[1], grey.shape[0])
+            tracked = {plant_id: transform_box(matrix, plant["box"], size) for plant_id, plant in self.plants.items()}
+
+            boxes = {i: clamp_box(box_list(entry["plant_box"])) for i, entry in enumerate(log) if entry.get("plant_box")}
+            pairs = sorted(((iou(box, tracked_box), i, plant_id) for i, box in boxes.items()
+                            for plant_id, tracked_box in tracked.items()), reverse=True)
+            ids = {}
+            for overlap, i, plant_id in pairs:
+                if overlap < MATCH_MIN_IOU:
+                    break
+                if i not in ids and plant_id not in ids.values():
+                    ids[i] = plant_id
+            for i in range(len(log)):
+                if i not in ids:
+                    ids[i] = self.next_id
+                    self.next_id += 1
+
+            merged = [{**entry, "plant_id": ids[i]} for i, entry in enumerate(log)]
+            crops = {ids[i]: crop_box(pixels, box) for i, box in boxes.items()}
+            self.plants = {ids[i]: {"box": box, "result": merged[i], "analysed_at": now} for i, box in boxes.items()}
+            self.features = {plant_id: region_features(crop) for plant_id, crop in crops.items()}
+            self.complete = len(boxes) == len(log)
+            self.full_at = now
+            self._set_reference(grey)
+            self._save(crops)
+            return merged
+
+    def update(self, plan, results, now=None):
+        """Merge the diagnoses of re-analysed plants into the tracked ones.
+
+        ``results`` maps plant ids to PlantHealth dicts for the changed
+        plants. Their status and diagnosis replace the previous ones; type and
+        position are kept, so a crop cannot rename a plant. Every region
+        moves to the new frame. Returns the merged log for the whole tank.
+        """
+        now = now or datetime.now()
+        with self._lock:
+            crops = {}
+            for plant_id, plant in self.plants.items():
+                plant["box"] = plan.boxes[plant_id]
+                result = results.get(plant_id) if plant_id in plan.changed else None
+                if result is not None:
+                    plant["result"] = {**plant["result"], "plant_status": result["plant_status"],
+                                       "plant_diagnosis": result["plant_diagnosis"]}
+                    plant["analysed_at"] = now
+                    self.features[plant_id] = plan.features[plant_id]
+                    crops[plant_id] = plan.crops[plant_id]
+                plant["result"] = {**plant["result"], "plant_id": plant_id, "plant_box": box_dict(plant["box"])}
+            self._set_reference(plan.grey)
+            self._save(crops)
+            return [plant["result"] for plant in self.plants.values()]
+
+    def to_dict(self):
+        plan = self.last_plan
+        with self._lock:
+            return {
+                "full_at": self.full_at.isoformat() if self.full_at else None,
+                "last_reason": self.last_reason,
+                "plants": [{
+                    "plant_id": plant_id,
+                    "plant_type": plant["result"].get("plant_type"),
+                    "plant_status": plant["result"].get("plant_status"),
+                    "box": box_dict(plant["box"]),
+                    "analysed_at": plant["analysed_at"].isoformat(),
+                    "changed": plan is not None and plant_id in plan.changed,
+                    "scores": plan.scores.get(plant_id) if plan is not None else None
+                } for plant_id, plant in self.plants.items()]
+            }
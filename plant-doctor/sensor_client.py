@@ -0,0 +1,335 @@
+import os
+import time
+import threading
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+from opentelemetry import context, trace
+
+# Prometheus connection settings
+PROMETHEUS_URL = os.environ.get("PROMETHEUS_URL", "http://plant-hub:9090")
+QUERY_TIMEOUT_SEC = float(os.environ.get("PROMETHEUS_QUERY_TIMEOUT", "5"))
+SENSOR_CACHE_TTL_SEC = float(os.environ.get("SENSOR_CACHE_TTL", "60"))
+
+# "promql" runs one server-side query per statistic, "raw" fetches both
+# series once and computes every statistic locally. Raw statistics come from
+# the step-sampled points, so they differ slightly from the *_over_time ones.
+SENSOR_MODE = os.environ.get("SENSOR_MODE", "promql")
+
+# Comfort bands used for the time-out-of-band statistic
+TEMPERATURE_BAND = (15.0, 32.0)  # °C
+HUMIDITY_BAND = (80.0, 99.5)     # %, matches the Grafana humidity alert and the sensor heater threshold
+SLOPE_WINDOW_SEC = 3600          # Trailing window for the rolling slope
+
+# Use Prometheus's built-in functions for calculations
+SENSOR_QUERIES = {
+    "temperature": {
+        "min": "min_over_time(temperature_celsius[12h])",
+        "max": "max_over_time(temperature_celsius[12h])",
+        "avg": "avg_over_time(temperature_celsius[12h])",
+        "current": "temperature_celsius",
+        "histogram": "rate(temperature_celsius[5m])"  # Rate of change over 5m windows
+    },
+    "humidity": {
+        "min": "min_over_time(humidity_percent[12h])",
+        "max": "max_over_time(humidity_percent[12h])",
+        "avg": "avg_over_time(humidity_percent[12h])",
+        "current": "humidity_percent",
+        "histogram": "rate(humidity_percent[5m])"  # Rate of change over 5m windows
+    }
+}
+
+RAW_SERIES_QUERY = '{__name__=~"temperature_celsius|humidity_percent"}'
+RAW_SERIES_NAMES = {"temperature_celsius": "temperature", "humidity_percent": "humidity"}
+
+tracer = trace.get_tracer(__name__)
+
+
+def with_selector(query, selector):
+    """Restrict every sensor series in ``query`` to the label matchers in ``selector``"""
+    if not selector:
+        return query
+    if query.startswith("{"):
+        return query[:-1] + "," + selector + "}"
+    for name in RAW_SERIES_NAMES:
+        query = query.replace(name, f"{name}{{{selector}}}")
+    return query
+
+
+def rolling_slope(timestamps, values, window_sec=SLOPE_WINDOW_SEC):
+    """Least-squares slope (units per hour) over a trailing time window,
+    evaluated at every sample using running sums."""
+    n = len(values)
+    if n < 2:
+        return np.zeros(n)
+    # Shift the time axis to hours from the first sample to keep the running sums well conditioned
+    x = (timestamps - timestamps[0]) / 3600.0
+    y = values
+    zero = np.zeros(1)
+    cx = np.concatenate((zero, np.cumsum(x)))
+    cy = np.concatenate((zero, np.cumsum(y)))
+    cxx = np.concatenate((zero, np.cumsum(x * x)))
+    cxy = np.concatenate((zero, np.cumsum(x * y)))
+
+    end = np.arange(1, n + 1)
+    start = np.searchsorted(timestamps, timestamps - window_sec, side="left")
+    k = end - start
+    sx = cx[end] - cx[start]
+    sy = cy[end] - cy[start]
+    sxx = cxx[end] - cxx[start]
+    sxy = cxy[end] - cxy[start]
+    denom = k * sxx - sx * sx
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = np.where(denom > 0, (k * sxy - sx * sy) / denom, 0.0)
+    return slope
+
+
+def time_out_of_band(timestamps, values, band):
+    """Minutes and fraction of the window spent outside ``band``"""
+    if len(values) < 2:
+        return {"minutes": 0.0, "fraction": 0.0, "band": list(band)}
+    dt = np.diff(timestamps)
+    outside = (values[:-1] < band[0]) | (values[:-1] > band[1])
+    seconds = float(np.sum(dt[outside]))
+    total = float(timestamps[-1] - timestamps[0])
+    return {
+        "minutes": seconds / 60.0,
+        "fraction": seconds / total if total > 0 else 0.0,
+        "band": list(band)
+    }
+
+
+def compute_tank_statistics(timestamps, temperature, humidity):
+    """Compute the tank summary from aligned raw temperature and humidity series.
+
+    Returns the same min/max/avg/current/histogram layout as the PromQL
+    queries, plus a ``derived`` section with VPD, dew point, rolling slopes
+    and time spent outside the comfort bands.
+    """
+    timestamps = np.asarray(timestamps, dtype=float)
+    series = {
+        "temperature": np.asarray(temperature, dtype=float),
+        "humidity": np.asarray(humidity, dtype=float)
+    }
+
+    results = {}
+    for metric, values in series.items():
+        # Per-second change between samples, the local equivalent of rate() over each step
+        rates = np.diff(values) / np.diff(timestamps) if len(values) > 1 else np.zeros(0)
+        last_hour = rates[-12:]
+        results[metric] = {
+            "min": float(values.min()),
+            "max": float(values.max()),
+            "avg": float(values.mean()),
+            "current": float(values[-1]),
+            "histogram": {
+                "values": last_hour.tolist(),
+                "avg_rate": float(last_hour.mean()) if len(last_hour) else 0,
+                "max_rate": float(last_hour.max()) if len(last_hour) else 0,
+                "min_rate": float(last_hour.min()) if len(last_hour) else 0
+            }
+        }
+
+    t = series["temperature"]
+    rh = np.clip(series["humidity"], 0.1, 100.0)
+
+    # Saturation vapour pressure (Tetens) and vapour pressure deficit in kPa
+    svp = 0.6108 * np.exp(17.27 * t / (t + 237.3))
+    vpd = svp * (1.0 - rh / 100.0)
+
+    # Dew point (Magnus formula)
+    gamma = np.log(rh / 100.0) + 17.62 * t / (243.12 + t)
+    dew_point = 243.12 * gamma / (17.62 - gamma)
+
+    temp_slope = rolling_slope(timestamps, t)
+    hum_slope = rolling_slope(timestamps, series["humidity"])
+
+    results["derived"] = {
+        "vpd_kpa": {
+            "min": float(vpd.min()),
+            "max": float(vpd.max()),
+            "avg": float(vpd.mean()),
+            "current": float(vpd[-1])
+        },
+        "dew_point_celsius": {
+            "min": float(dew_point.min()),
+            "max": float(dew_point.max()),
+            "avg": float(dew_point.mean()),
+            "current": float(dew_point[-1]),
+            "margin": float(t[-1] - dew_point[-1])  # °C above condensation
+        },
+        "temperature_slope_per_hour": {
+            "current": float(temp_slope[-1]),
+            "max_abs": float(np.abs(temp_slope).max())
+        },
+        "humidity_slope_per_hour": {
+            "current": float(hum_slope[-1]),
+            "max_abs": float(np.abs(hum_slope).max())
+        },
+        "temperature_out_of_band": time_out_of_band(timestamps, t, TEMPERATURE_BAND),
+        "humidity_out_of_band": time_out_of_band(timestamps, series["humidity"], HUMIDITY_BAND)
+    }
+    return results
+
+
+class SensorDataClient:
+    """Prometheus client that keeps a connection pool, runs the sensor
+    queries concurrently and caches the combined result for a short TTL."""
+
+    def __init__(self, base_url=PROMETHEUS_URL, window=timedelta(hours=12), step="5m",
+                 timeout=QUERY_TIMEOUT_SEC, cache_ttl=SENSOR_CACHE_TTL_SEC, mode=SENSOR_MODE, selector=""):
+        self.mode = mode
+        self.selector = selector  # PromQL label matchers for one tank's sensor, e.g. tank="tank-1"
+        self.query_range_url = f"{base_url}/api/v1/query_range"
+        self.window = window
+        self.step = step
+        self.timeout = timeout
+        self.cache_ttl = cache_ttl
+
+        query_count = sum(len(stats) for stats in SENSOR_QUERIES.values())
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=query_count)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=query_count, thread_name_prefix="prometheus")
+
+        self._lock = threading.Lock()
+        self._cached = None
+        self._cached_at = 0.0
+
+    def _request(self, query, params, parent=None):
+        """Run a range query in its own span and return the decoded response.
+
+        ``parent`` carries the trace context into executor threads.
+        """
+        with tracer.start_as_current_span("prometheus.query_range", context=parent,
+                                          attributes={"db.query.text": query, "tank.sensor_selector": self.selector}) as span:
+            response = self.session.get(self.query_range_url, params={**params, "query": query}, timeout=self.timeout)
+            span.set_attribute("http.response.status_code", response.status_code)
+            span.set_attribute("http.response.body.size", len(response.content))
+            data = response.json()
+            if data["status"] == "success":
+                span.set_attribute("prometheus.series", len(data["data"]["result"]))
+            return data
+
+    def _query_range(self, query, params, parent=None):
+        """Run a single range query and return the first series' values"""
+        data = self._request(query, params, parent)
+        if data["status"] == "success" and data["data"]["result"]:
+            return data["data"]["result"][0]["values"]
+        return None
+
+    @staticmethod
+    def _summarise(stat, values):
+        if stat == "current":
+            return float(values[-1][1])
+        elif stat == "histogram":
+            # For histogram, we'll store the last 12 values (1 hour) of rate changes
+            rates = [float(v[1]) for v in values[-12:]]
+            return {
+                "values": rates,
+                "avg_rate": sum(rates) / len(rates) if rates else 0,
+                "max_rate": max(rates) if rates else 0,
+                "min_rate": min(rates) if rates else 0
+            }
+        else:
+            # For range queries (min/max/avg), the value is in the first result
+            return float(values[0][1])
+
+    def _range_params(self):
+        end_time = datetime.now()
+        start_time = end_time - self.window
+        return {
+            "start": start_time.timestamp(),
+            "end": end_time.timestamp(),
+            "step": self.step
+        }
+
+    def _fetch_raw(self):
+        """Fetch both raw series in one request and summarise them locally"""
+        data = self._request(with_selector(RAW_SERIES_QUERY, self.selector), self._range_params())
+        if data["status"] != "success":
+            print(f"[{datetime.now()}] ERROR: Failed to fetch raw sensor series from Prometheus")
+            return None
+
+        series = {}
+        for result in data["data"]["result"]:
+            metric = RAW_SERIES_NAMES.get(result["metric"].get("__name__"))
+            if metric and metric not in series and result["values"]:
+                values = np.asarray(result["values"], dtype=float)
+                series[metric] = values
+
+        if len(series) != len(RAW_SERIES_NAMES):
+            missing = set(RAW_SERIES_NAMES.values()) - set(series)
+            print(f"[{datetime.now()}] ERROR: Failed to fetch {', '.join(sorted(missing))} from Prometheus")
+            return None
+
+        # Align both series on their shared step timestamps
+        temperature, humidity = series["temperature"], series["humidity"]
+        timestamps, t_idx, h_idx = np.intersect1d(temperature[:, 0], humidity[:, 0], return_indices=True)
+        if len(timestamps) == 0:
+            print(f"[{datetime.now()}] ERROR: Temperature and humidity series do not overlap")
+            return None
+
+        return compute_tank_statistics(timestamps, temperature[t_idx, 1], humidity[h_idx, 1])
+
+    def _fetch_promql(self):
+        params = self._range_params()
+
+        # Fire all queries at once over the pooled session
+        parent = context.get_current()
+        futures = {}
+        for metric, stats in SENSOR_QUERIES.items():
+            for stat, query in stats.items():
+                futures[(metric, stat)] = self.executor.submit(self._query_range, with_selector(query, self.selector), params, parent)
+
+        # Every query shares one deadline so a slow series cannot stall the caller
+        deadline = time.monotonic() + self.timeout
+        results = {metric: {} for metric in SENSOR_QUERIES}
+        failed = False
+        for (metric, stat), future in futures.items():
+            try:
+                values = future.result(timeout=max(0.0, deadline - time.monotonic()))
+            except FutureTimeoutError:
+                print(f"[{datetime.now()}] ERROR: Timed out fetching {metric} {stat} from Prometheus")
+                failed = True
+                continue
+            except Exception as e:
+                print(f"[{datetime.now()}] ERROR: Failed to fetch {metric} {stat} from Prometheus: {str(e)}")
+                failed = True
+                continue
+
+            if values:
+                results[metric][stat] = self._summarise(stat, values)
+            else:
+                print(f"[{datetime.now()}] ERROR: Failed to fetch {metric} {stat} from Prometheus")
+                failed = True
+
+        if failed:
+            for future in futures.values():
+                future.cancel()
+            return None
+        return results
+
+    def fetch(self, force=False):
+        """Return sensor statistics, serving from cache while it is fresh.
+
+        Concurrent callers wait on the same refresh instead of each
+        issuing their own set of queries.
+        """
+        with self._lock, tracer.start_as_current_span("prometheus.fetch", attributes={"sensor.mode": self.mode}) as span:
+            cache_hit = not force and self._cached is not None and time.monotonic() - self._cached_at < self.cache_ttl
+            span.set_attribute("cache.hit", cache_hit)
+            if cache_hit:
+                return self._cached
+
+            if self.mode == "raw":
+                results = self._fetch_raw()
+            else:
+                results = self._fetch_promql()
+            if results is not None:
+                self._cached = results
+                self._cached_at = time.monotonic()
+            return results
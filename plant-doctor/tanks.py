@@ -0,0 +1,126 @@
+import os
+import json
+from image_pipeline import default_roi, parse_roi
+from sensor_client import SensorDataClient
+from camera import CAMERA_PORT, CameraManager
+from image_store import ImageStore
+from analysis_history import AnalysisHistory
+from analysis_cache import AnalysisCache
+from plant_events import PlantEventEmitter
+from vision_screen import VisionScreen
+from live_stream import LiveStream
+from capture_schedule import CaptureSchedule
+from plant_regions import PlantTracker
+
+DEFAULT_TANK_ID = "default"
+
+
+class Tank:
+    """One enclosure: its camera, sensor series, image directory and latest results.
+
+    Every file a tank writes lives under its own ``image_dir``, so tanks never
+    share a cache, archive or history database.
+    """
+
+    def __init__(self, tank_id, name, camera, sensor_client, image_dir, roi=None, live_stream=None,
+                 sensor_labels=None):
+        self.id = tank_id
+        self.name = name
+        self.camera = camera
+        self.live_stream = live_stream or LiveStream(camera)
+        self.sensor_client = sensor_client
+        self.sensor_labels = sensor_labels or {}
+        self.image_dir = image_dir
+        self.roi = roi
+        os.makedirs(image_dir, exist_ok=True)
+
+        self.current_image_path = os.path.join(image_dir, "current.jpg")
+        self.latest_analysis_path = os.path.join(image_dir, "latest_analysis.json")
+
+        # Indexed archive of captured frames with count/bytes/age retention
+        self.image_store = ImageStore(image_dir, os.path.join(image_dir, "image_index.sqlite"))
+
+        # Every plant and tank result, queryable by plant, status and time
+        self.analysis_history = AnalysisHistory(os.path.join(image_dir, "analysis_history.sqlite"))
+
+        # Model results keyed by perceptual hash, so unchanged frames skip the API call
+        self.analysis_cache = AnalysisCache(os.path.join(image_dir, "analysis_cache.json"))
+
+        # Logs only what changed since the previous run, plus periodic summaries
+        self.events = PlantEventEmitter(tank_id, os.path.join(image_dir, "plant_events.json"))
+
+        # Local colour and change screen that decides when a model analysis is worth it
+        self.screen = VisionScreen()
+
+        # When the next automatic capture is due, sooner while something is wrong
+        self.schedule = CaptureSchedule()
+
+        # Each plant's region, tracked across frames, so only changed plants are re-diagnosed
+        self.plant_regions = PlantTracker(image_dir)
+
+        self.latest_analysis = None
+        self.current_image = None
+        # Modification times of the files the in-memory copies were loaded from
+        self.latest_analysis_mtime = None
+        self.current_image_mtime = None
+        self.capture_queue = None  # Assigned once the capture runner exists
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "camera": self.camera.port,
+            "sensor_selector": self.sensor_client.selector,
+            "has_image": self.current_image is not None or os.path.exists(self.current_image_path),
+            "has_analysis": self.latest_analysis is not None,
+            "screen": self.screen.last_result.to_dict() if self.screen.last_result else None,
+            "schedule": self.schedule.to_dict()
+        }
+
+
+def sensor_selector(labels):
+    """Turn ``{"tank": "tank-1"}`` into the PromQL label matcher ``tank="tank-1"``"""
+    return ",".join(f'{name}="{value}"' for name, value in sorted((labels or {}).items()))
+
+
+def load_tanks(path, image_dir):
+    """Build the tank registry from a JSON config file, keyed by tank id.
+
+    The file holds ``{"tanks": [{"id": ..., "name": ..., "camera": 0,
+    "sensor": {"tank": "tank-1"}, "image_dir": ..., "roi": "x,y,w,h"}]}``.
+    ``sensor`` holds the labels that select the tank's series in Prometheus.
+    Without a file, one tank uses CAMERA_PORT, every sensor series and
+    ``image_dir`` itself, as before.
+
+    Tanks that list the same camera share one CameraManager and live
+    stream, e.g. one wide camera with an ``roi`` per tank.
+    """
+    try:
+        with open(path, "r") as f:
+            entries = json.load(f)["tanks"]
+    except FileNotFoundError:
+        return {DEFAULT_TANK_ID: Tank(DEFAULT_TANK_ID, "Tank", CameraManager(CAMERA_PORT), SensorDataClient(),
+                                      image_dir, default_roi())}
+
+    cameras = {}
+    streams = {}
+    tanks = {}
+    for entry in entries:
+        tank_id = entry["id"]
+        if tank_id in tanks:
+            raise ValueError(f"Tank ids in {path} must be unique")
+        port = entry.get("camera", CAMERA_PORT)
+        if port not in cameras:
+            cameras[port] = CameraManager(port)
+            streams[port] = LiveStream(cameras[port])
+        tanks[tank_id] = Tank(
+            tank_id,
+            entry.get("name", tank_id),
+            cameras[port],
+            SensorDataClient(selector=sensor_selector(entry.get("sensor"))),
+            os.path.join(image_dir, entry.get("image_dir", tank_id)),
+            parse_roi(entry.get("roi", "")),
+            streams[port],
+            entry.get("sensor")
+        )
+    return tanks
@@ -0,0 +1,47 @@
+from opentelemetry import metrics, trace
+from log_pipeline import LOG_BATCH_SIZE, LOG_QUEUE_SIZE, InstrumentedLogExporter
+
+# How often metrics are pushed to Alloy
+METRIC_EXPORT_INTERVAL_MS = 60_000
+
+
+def init_telemetry(service_name, endpoint, log_handler):
+    """Build the OTLP log, metric and trace pipelines and attach them.
+
+    The SDK exporters are imported here rather than at module level, so
+    the web server can start before they load. Meters and tracers obtained
+    earlier are proxies that switch over once the providers are set, and
+    ``log_handler`` keeps queueing records until it is given a target.
+    Returns the providers so they can be flushed on shutdown.
+    """
+    from opentelemetry.sdk._logs import LoggerProvider, LoggingHandler
+    from opentelemetry.sdk._logs.export import BatchLogRecordProcessor
+    from opentelemetry.exporter.otlp.proto.http._log_exporter import OTLPLogExporter
+    from opentelemetry.sdk.metrics import MeterProvider
+    from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
+    from opentelemetry.exporter.otlp.proto.http.metric_exporter import OTLPMetricExporter
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+    from opentelemetry.sdk.resources import Resource
+
+    resource = Resource.create({"service.name": service_name})
+
+    # Export model call latency, outcomes, token usage and log pipeline health
+    metric_reader = PeriodicExportingMetricReader(OTLPMetricExporter(endpoint=f"{endpoint}/v1/metrics"),
+                                                  export_interval_millis=METRIC_EXPORT_INTERVAL_MS)
+    meter_provider = MeterProvider(metric_readers=[metric_reader], resource=resource)
+    metrics.set_meter_provider(meter_provider)
+
+    # Create OTLP exporter for logs, counting exported records, failures and export latency
+    logger_provider = LoggerProvider(resource=resource)
+    log_exporter = InstrumentedLogExporter(OTLPLogExporter(endpoint=f"{endpoint}/v1/logs"))
+    logger_provider.add_log_record_processor(BatchLogRecordProcessor(exporter=log_exporter, max_queue_size=LOG_QUEUE_SIZE,
+                                                                     max_export_batch_size=LOG_BATCH_SIZE))
+    log_handler.attach(LoggingHandler(logger_provider=logger_provider), logger_provider.force_flush)
+
+    # Trace every capture, model call, Prometheus query and route to Tempo
+    tracer_provider = TracerProvider(resource=resource)
+    tracer_provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter(endpoint=f"{endpoint}/v1/traces")))
+    trace.set_tracer_provider(tracer_provider)
+    return meter_provider, logger_provider, tracer_provider
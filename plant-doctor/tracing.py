@@ -0,0 +1,60 @@
+from flask import g, request
+from opentelemetry import context, trace
+from opentelemetry.propagate import extract
+from opentelemetry.trace import SpanKind, Status, StatusCode
+
+tracer = trace.get_tracer(__name__)
+
+
+def record_error(error, span=None):
+    """Mark ``span`` (the current span by default) as failed with ``error``"""
+    span = span or trace.get_current_span()
+    span.record_exception(error)
+    span.set_status(Status(StatusCode.ERROR, str(error)))
+
+
+def mark_failed(message, span=None):
+    """Mark ``span`` (the current span by default) as failed without an exception"""
+    (span or trace.get_current_span()).set_status(Status(StatusCode.ERROR, message))
+
+
+def instrument_flask(app):
+    """Wrap every Flask request in a server span named after its route.
+
+    Child spans started while handling the request, such as Prometheus
+    queries for /api/metrics, are parented to it. A ``traceparent`` header,
+    as sent when a worker forwards a request to the leader, continues the
+    caller's trace.
+    """
+
+    @app.before_request
+    def start_request_span():
+        route = request.url_rule.rule if request.url_rule else request.path
+        span = tracer.start_span(f"{request.method} {route}", context=extract(request.headers), kind=SpanKind.SERVER, attributes={
+            "http.request.method": request.method,
+            "http.route": route,
+            "url.path": request.path
+        })
+        g.otel_span = span
+        g.otel_token = context.attach(trace.set_span_in_context(span))
+
+    @app.after_request
+    def record_response(response):
+        span = g.get("otel_span")
+        if span is not None:
+            span.set_attribute("http.response.status_code", response.status_code)
+            if response.content_length is not None:
+                span.set_attribute("http.response.body.size", response.content_length)
+            if response.status_code >= 500:
+                span.set_status(Status(StatusCode.ERROR))
+        return response
+
+    @app.teardown_request
+    def end_request_span(error):
+        span = g.pop("otel_span", None)
+        if span is None:
+            return
+        if error is not None:
+            record_error(error, span)
+        span.end()
+        context.detach(g.pop("otel_token"))
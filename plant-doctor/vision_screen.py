@@ -0,0 +1,246 @@
+import os
+import time
+import threading
+from datetime import datetime
+import cv2
+import numpy as np
+from opentelemetry import metrics
+
+# How often every tank's camera frame is screened locally, 0 disables screening
+SCREEN_INTERVAL_SEC = float(os.environ.get("SCREEN_INTERVAL_SEC", "60"))
+SCREEN_GRID = os.environ.get("SCREEN_GRID", "3x3")           # "rows x columns" of regions
+SCREEN_WIDTH = int(os.environ.get("SCREEN_WIDTH", "320"))    # Frames are screened at this width
+
+# Escalation to the model: hue distribution shift or pigment loss in any region since the last analysis
+SCREEN_CHANGE_THRESHOLD = float(os.environ.get("SCREEN_CHANGE_THRESHOLD", "0.2"))
+SCREEN_DEGRADATION_THRESHOLD = float(os.environ.get("SCREEN_DEGRADATION_THRESHOLD", "0.05"))
+SCREEN_MIN_INTERVAL_SEC = float(os.environ.get("SCREEN_MIN_INTERVAL_SEC", "1800"))  # Between escalations
+SCREEN_MAX_AGE_SEC = float(os.environ.get("SCREEN_MAX_AGE_SEC", str(6 * 3600)))      # Scheduled runs skip younger analyses
+
+# Pixel classes, in OpenCV's HSV ranges (hue 0-179)
+MIN_SATURATION = 60
+MIN_VALUE = 40
+GREEN_HUE = (35, 85)
+RED_HUE = (10, 170)      # Red is below the first or above the second
+HUE_BINS = 18
+MIN_BRIGHTNESS = float(os.environ.get("SCREEN_MIN_BRIGHTNESS", "30"))  # Darker frames (lights off) are not judged
+
+
+def parse_grid(value):
+    """Parse a "3x3" grid string into ``(rows, columns)``"""
+    rows, cols = (int(v) for v in value.lower().split("x"))
+    return rows, cols
+
+
+def region_names(rows, cols):
+    return [f"r{row}c{col}" for row in range(rows) for col in range(cols)]
+
+
+def blocks(array, rows, cols):
+    """Split an ``(h, w)`` array into ``(rows * cols, pixels)`` region blocks"""
+    h, w = array.shape[0] // rows, array.shape[1] // cols
+    array = array[:h * rows, :w * cols]
+    return array.reshape(rows, h, cols, w).swapaxes(1, 2).reshape(rows * cols, h * w)
+
+
+class ScreenFeatures:
+    """Per-region colour statistics of one frame, computed on a downscaled copy"""
+
+    def __init__(self, frame, grid, width=SCREEN_WIDTH):
+        rows, cols = grid
+        height = max(rows, round(frame.shape[0] * width / frame.shape[1]))
+        small = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+        hsv = cv2.cvtColor(small, cv2.COLOR_BGR2HSV)
+        hue, sat, val = (blocks(hsv[:, :, i], rows, cols) for i in range(3))
+
+        self.grid = grid
+        self.brightness = float(val.mean())
+        coloured = (sat >= MIN_SATURATION) & (val >= MIN_VALUE)
+        self.green = (coloured & (hue >= GREEN_HUE[0]) & (hue <= GREEN_HUE[1])).mean(axis=1)
+        self.red = (coloured & ((hue < RED_HUE[0]) | (hue > RED_HUE[1]))).mean(axis=1)
+
+        # Hue histogram of the coloured pixels of every region in one bincount
+        bins = hue.astype(np.int64) * HUE_BINS // 180
+        index = np.arange(len(bins))[:, None] * HUE_BINS + bins
+        counts = np.bincount(index.ravel(), weights=coloured.ravel(), minlength=len(bins) * HUE_BINS)
+        counts = counts.reshape(len(bins), HUE_BINS)
+        self.histogram = counts / np.maximum(counts.sum(axis=1, keepdims=True), 1)
+
+        # Brightness-normalised grey levels for frame differencing
+        grey = blocks(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), rows, cols).astype(np.float32)
+        self.grey = grey - grey.mean()
+
+    def comparable(self, other):
+        return other is not None and other.grid == self.grid and other.grey.shape == self.grey.shape
+
+    def change(self, other):
+        """Mean absolute grey-level difference per region, 0 to 1"""
+        return np.abs(self.grey - other.grey).mean(axis=1) / 255.0
+
+    def drift(self, other):
+        """Total variation distance between the regions' hue histograms, 0 to 1"""
+        return 0.5 * np.abs(self.histogram - other.histogram).sum(axis=1)
+
+    def degradation(self, other):
+        """Share of each region that lost green or red pigment"""
+        return np.maximum(0.0, (other.green + other.red) - (self.green + self.red))
+
+
+class ScreenResult:
+    """Outcome of screening one frame, and whether it escalated to the model"""
+
+    def __init__(self, captured_at, names, features, change=None, drift=None, degradation=None):
+        self.captured_at = captured_at
+        self.names = names
+        self.features = features
+        self.dark = features.brightness < MIN_BRIGHTNESS
+        zeros = np.zeros(len(names))
+        self.change = change if change is not None else zeros
+        self.drift = drift if drift is not None else zeros
+        self.degradation = degradation if degradation is not None else zeros
+        self.escalation = None
+
+    def to_dict(self):
+        return {
+            "captured_at": self.captured_at.isoformat(),
+            "brightness": self.features.brightness,
+            "dark": bool(self.dark),
+            "escalation": self.escalation,
+            "change": float(self.change.max()),
+            "drift": float(self.drift.max()),
+            "degradation": float(self.degradation.max()),
+            "regions": [{
+                "region": name,
+                "green_ratio": float(self.features.green[i]),
+                "red_ratio": float(self.features.red[i]),
+                "change": float(self.change[i]),
+                "drift": float(self.drift[i]),
+                "degradation": float(self.degradation[i]),
+                "hue_histogram": [round(float(v), 4) for v in self.features.histogram[i]]
+            } for i, name in enumerate(self.names)]
+        }
+
+
+class EscalationPolicy:
+    """Decides when a screened frame is worth a model call.
+
+    A frame escalates when any region's hue distribution has drifted by
+    ``change_threshold`` or lost ``degradation_threshold`` of its pigment
+    since the frame the last analysis described, or when there is no such
+    frame yet. Dark frames never escalate, and escalations are at least
+    ``min_interval`` seconds apart.
+    """
+
+    def __init__(self, change_threshold=SCREEN_CHANGE_THRESHOLD, degradation_threshold=SCREEN_DEGRADATION_THRESHOLD,
+                 min_interval=SCREEN_MIN_INTERVAL_SEC):
+        self.change_threshold = change_threshold
+        self.degradation_threshold = degradation_threshold
+        self.min_interval = min_interval
+
+    def decide(self, result, has_baseline, since_escalation):
+        """Return the reason to escalate, or None"""
+        if result.dark or since_escalation < self.min_interval:
+            return None
+        if not has_baseline:
+            return "no_baseline"
+        if result.degradation.max() >= self.degradation_threshold:
+            return "degradation"
+        if result.drift.max() >= self.change_threshold:
+            return "change"
+        return None
+
+
+class VisionScreen:
+    """Cheap per-frame health screen for one tank.
+
+    Every frame is compared with the previous screened frame (``change``)
+    and with the frame behind the latest model analysis (``drift`` and
+    ``degradation``). The policy decides whether that warrants a new
+    analysis.
+    """
+
+    def __init__(self, grid=parse_grid(SCREEN_GRID), policy=None, max_age=SCREEN_MAX_AGE_SEC):
+        self.grid = grid
+        self.names = region_names(*grid)
+        self.policy = policy or EscalationPolicy()
+        self.max_age = max_age
+        self.baseline = None
+        self.analysed_at = None
+        self.previous = None
+        self.last_result = None
+        self.last_escalated = float("-inf")
+        self._lock = threading.Lock()
+
+    def set_baseline(self, pixels, analysed_at=None):
+        """Record the frame the latest model analysis describes"""
+        features = ScreenFeatures(pixels, self.grid)
+        with self._lock:
+            self.baseline = features
+            self.analysed_at = analysed_at or datetime.now()
+
+    def analysis_due(self):
+        """True if the latest analysis is older than ``max_age``, or there is none"""
+        return self.analysed_at is None or (datetime.now() - self.analysed_at).total_seconds() >= self.max_age
+
+    def screen(self, frame, captured_at):
+        """Screen an ROI-cropped frame and return a ScreenResult with any escalation reason"""
+        features = ScreenFeatures(frame, self.grid)
+        with self._lock:
+            previous = self.previous if features.comparable(self.previous) else None
+            baseline = self.baseline if features.comparable(self.baseline) else None
+            result = ScreenResult(
+                captured_at, self.names, features,
+                change=features.change(previous) if previous else None,
+                drift=features.drift(baseline) if baseline else None,
+                degradation=features.degradation(baseline) if baseline else None
+            )
+            if not result.dark:
+                self.previous = features
+
+            now = time.monotonic()
+            result.escalation = self.policy.decide(result, baseline is not None, now - self.last_escalated)
+            if result.escalation:
+                self.last_escalated = now
+            self.last_result = result
+        return result
+
+
+class ScreenMetrics:
+    """OpenTelemetry instruments for the vision screens of every tank"""
+
+    def __init__(self, screens, meter=None):
+        self.screens = screens  # tank id -> VisionScreen
+        meter = meter or metrics.get_meter(__name__)
+        self.duration = meter.create_histogram(
+            name="vision_screen_duration_seconds",
+            unit="s",
+            description="Time taken to screen one frame locally"
+        )
+        self.escalations = meter.create_counter(
+            name="vision_escalations",
+            description="Screened frames escalated to a model analysis, by reason"
+        )
+        for name, description, values in (
+            ("vision_green_ratio", "Share of each region's pixels that are green", lambda r: r.features.green),
+            ("vision_red_ratio", "Share of each region's pixels that are red", lambda r: r.features.red),
+            ("vision_change_score", "Frame difference from the previous screened frame", lambda r: r.change),
+            ("vision_drift_score", "Hue histogram distance from the last analysed frame", lambda r: r.drift),
+            ("vision_degradation_score", "Pigment lost since the last analysed frame", lambda r: r.degradation),
+        ):
+            meter.create_observable_gauge(name=name, description=description,
+                                          callbacks=[lambda options, values=values: self._observe(values)])
+
+    def _observe(self, values):
+        observations = []
+        for tank_id, screen in self.screens.items():
+            result = screen.last_result
+            if result is None or result.dark:
+                continue
+            for region, value in zip(result.names, values(result)):
+                observations.append(metrics.Observation(float(value), {"tank.id": tank_id, "region": region}))
+        return observations
+
+    def record(self, tank_id, result, duration):
+        self.duration.record(duration, {"tank.id": tank_id})
+        if result.escalation:
+            self.escalations.add(1, {"tank.id": tank_id, "reason": result.escalation})
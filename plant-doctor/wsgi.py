@@ -0,0 +1,4 @@
+# WSGI entry point: gunicorn --workers 2 --threads 8 --bind 0.0.0.0:5000 wsgi:app
+from main import create_app
+
+app = create_app()
@@ -0,0 +1,244 @@
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import board
+import adafruit_sht31d
+
+HEATER_HUMIDITY = 99.5     # % at which condensation is likely
+HEATER_DURATION_SEC = 60
+MIN_RETRY_SEC = 1.0
+MAX_RETRY_SEC = 60.0
+
+
+def open_bus(bus):
+    """Return the I2C bus for a device, the board default when ``bus`` is None"""
+    if bus is None:
+        return board.I2C()  # uses board.SCL and board.SDA
+    # Additional /dev/i2c-N buses need adafruit-extended-bus
+    from adafruit_extended_bus import ExtendedI2C
+    return ExtendedI2C(bus)
+
+
+def load_devices(path):
+    """Build the sensor registry from a JSON config file.
+
+    The file holds ``{"sensors": [{"name": ..., "address": "0x44", "bus": 1,
+    "attributes": {...}}]}``. Without a file, one SHT31-D on the default bus
+    is used.
+    """
+    try:
+        with open(path, "r") as f:
+            config = json.load(f)
+    except FileNotFoundError:
+        return [SensorDevice()]
+
+    devices = []
+    for entry in config["sensors"]:
+        address = entry.get("address", 0x44)
+        devices.append(SensorDevice(
+            name=entry["name"],
+            address=int(address, 0) if isinstance(address, str) else address,
+            bus=entry.get("bus"),
+            attributes=entry.get("attributes")
+        ))
+    names = [device.name for device in devices]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Sensor names in {path} must be unique")
+    return devices
+
+
+class SensorDevice:
+    """An SHT31-D with its own heater state and non-blocking reconnect.
+
+    A failed read never sleeps. The device is marked disconnected and the
+    next reconnect attempt is scheduled with exponential backoff, so the
+    acquisition loop keeps its timing while the bus recovers.
+    """
+
+    def __init__(self, name="SHT31-D", address=0x44, bus=None, attributes=None):
+        self.name = name
+        self.address = address
+        self.bus = bus  # Linux I2C bus number, None for the board's default bus
+        self.attributes = attributes or {}
+        self.sensor = None
+        self.serial_number = None
+        self.heater_on = False
+        self.heater_started = 0.0
+        self.retry_delay = MIN_RETRY_SEC
+        self.next_retry_at = 0.0
+        self.failures = 0
+        self.reconnects = 0
+        self.connected_once = False
+        self.busy_ticks = 0  # Ticks skipped because the previous read had not finished
+
+    @property
+    def connected(self):
+        return self.sensor is not None
+
+    def _connect(self):
+        try:
+            i2c = open_bus(self.bus)
+            sensor = adafruit_sht31d.SHT31D(i2c, address=self.address)
+            sensor.heater = False
+            self.serial_number = sensor.serial_number  # Retrieve sensor's serial number
+        except Exception as e:
+            print(f"❌ {self.name} at {hex(self.address)} unavailable: {e}, retrying in {self.retry_delay:.0f}s")
+            return False
+
+        if self.connected_once:
+            self.reconnects += 1
+            print(f"✅ {self.name} at {hex(self.address)} reconnected")
+        self.connected_once = True
+        self.sensor = sensor
+        self.heater_on = False
+        self.retry_delay = MIN_RETRY_SEC
+        return True
+
+    def _schedule_retry(self, now):
+        self.next_retry_at = now + self.retry_delay
+        self.retry_delay = min(self.retry_delay * 2, MAX_RETRY_SEC)
+
+    def read(self):
+        """Return ``(temperature, humidity)`` or None if the device is unavailable"""
+        now = time.monotonic()
+        if self.sensor is None:
+            if now < self.next_retry_at:
+                return None
+            if not self._connect():
+                self._schedule_retry(now)
+                return None
+
+        try:
+            # One single-shot measurement for both values
+            return self.sensor.measurements
+        except Exception as e:
+            self.failures += 1
+            print(f"❌ {self.name} read failed: {e}")
+            self.sensor = None
+            self._schedule_retry(now)
+            return None
+
+    def update_heater(self, hum, now):
+        """Run the heater for HEATER_DURATION_SEC when condensation is likely"""
+        if self.sensor is None:
+            return
+        try:
+            # 🌡️ **Heater Strategy**
+            if hum >= HEATER_HUMIDITY and not self.heater_on:
+                print(f"⚠️ Condensation risk detected on {self.name}! Enabling heater for 1 min.")
+                self.sensor.heater = True
+                self.heater_on = True
+                self.heater_started = now  # Store heater activation time
+
+            # 🔄 **Turn off heater after 1 min**
+            if self.heater_on and (now - self.heater_started > HEATER_DURATION_SEC):
+                print(f"✅ Heater cycle complete on {self.name}, turning off.")
+                self.sensor.heater = False
+                self.heater_on = False
+        except Exception as e:
+            print(f"❌ Failed to switch heater on {self.name}: {e}")
+
+
+class AcquisitionLoop:
+    """Reads every device on a shared, drift-free schedule.
+
+    Ticks are scheduled against the monotonic clock at ``start + n * interval``
+    instead of sleeping a fixed time after each read, so read time and
+    scheduling delays do not accumulate. If a tick overruns, the missed ticks
+    are skipped and counted, and the original phase is kept.
+
+    Each device is read on its own worker so a slow or recovering device never
+    delays the others. A device whose previous read is still running sits out
+    the tick rather than queueing behind it.
+    """
+
+    def __init__(self, devices, interval, on_reading, on_tick=None):
+        self.devices = devices
+        self.interval = interval
+        self.on_reading = on_reading
+        self.on_tick = on_tick
+        self.ticks = 0
+        self.missed_ticks = 0
+        self.last_jitter = {}
+        self.max_jitter = {}
+        self.last_latency = {}
+        self.max_latency = {}
+        self._in_flight = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=len(devices), thread_name_prefix="sensor")
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="acquisition", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self._executor.shutdown(wait=True)
+
+    def join(self):
+        self._thread.join()
+
+    def _read(self, device, scheduled):
+        try:
+            started = time.monotonic()
+            jitter = started - scheduled
+            reading = device.read()
+            latency = time.monotonic() - started
+
+            self.last_jitter[device.name] = jitter
+            self.max_jitter[device.name] = max(self.max_jitter.get(device.name, 0.0), jitter)
+            self.last_latency[device.name] = latency
+            self.max_latency[device.name] = max(self.max_latency.get(device.name, 0.0), latency)
+            if self.on_tick:
+                self.on_tick(device, jitter, latency, reading is not None)
+            if reading is not None:
+                self.on_reading(device, time.time(), *reading)
+        except Exception as e:
+            print(f"❌ Failed to process reading from {device.name}: {e}")
+        finally:
+            with self._lock:
+                self._in_flight.discard(device.name)
+
+    def _run(self):
+        next_tick = time.monotonic()
+        while not self._stop.is_set():
+            self.ticks += 1
+            for device in self.devices:
+                with self._lock:
+                    if device.name in self._in_flight:
+                        device.busy_ticks += 1
+                        continue
+                    self._in_flight.add(device.name)
+                self._executor.submit(self._read, device, next_tick)
+
+            next_tick += self.interval
+            behind = time.monotonic() - next_tick
+            if behind >= 0:
+                skipped = int(behind // self.interval) + 1
+                self.missed_ticks += skipped
+                next_tick += skipped * self.interval
+            self._stop.wait(max(0.0, next_tick - time.monotonic()))
+
+    def health(self):
+        return {
+            "ticks": self.ticks,
+            "missed_ticks": self.missed_ticks,
+            "devices": {
+                device.name: {
+                    "connected": device.connected,
+                    "address": hex(device.address),
+                    "bus": device.bus,
+                    "failures": device.failures,
+                    "reconnects": device.reconnects,
+                    "busy_ticks": device.busy_ticks,
+                    "jitter_ms": {"last": self.last_jitter.get(device.name, 0.0) * 1000,
+                                  "max": self.max_jitter.get(device.name, 0.0) * 1000},
+                    "read_latency_ms": {"last": self.last_latency.get(device.name, 0.0) * 1000,
+                                        "max": self.max_latency.get(device.name, 0.0) * 1000}
+                }
+                for device in self.devices
+            }
+        }
@@ -35,7 +35,10 @@ mkdir -p "$INSTALL_DIR"
 
 # Copy script and requirements file
 echo "📄 Copying files..."
-cp sensor_monitor.py requirements.txt "$INSTALL_DIR"
+cp *.py requirements.txt "$INSTALL_DIR"
+if [[ -f sensors.json ]]; then
+    cp sensors.json "$INSTALL_DIR"
+fi
 
 # Set correct permissions
 chown -R plant:plant "$INSTALL_DIR"  # Change user if necessary
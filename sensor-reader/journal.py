@@ -0,0 +1,244 @@
+import os
+import json
+import time
+import struct
+import threading
+from opentelemetry.sdk.metrics.export import (
+    MetricExporter,
+    MetricExportResult,
+    MetricsData,
+    ResourceMetrics,
+    ScopeMetrics,
+    Metric,
+    Gauge,
+    NumberDataPoint,
+)
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.util.instrumentation import InstrumentationScope
+
+# Record layouts. A series record maps a small id to the metric name, scope,
+# resource and attributes; point records then cost 19 bytes each.
+SERIES_HEADER = struct.Struct("<cHH")   # b"S", series id, JSON length
+POINT = struct.Struct("<cHQd")          # b"P", series id, time_unix_nano, value
+
+
+class MetricJournal:
+    """Append-only, segmented on-disk journal of gauge readings.
+
+    Segments are rotated at ``segment_bytes``. Whole segments are dropped,
+    oldest first, when the journal exceeds ``max_bytes`` or a segment has
+    not been written for ``max_age_sec``. This bounds SD card usage during
+    a long outage.
+    """
+
+    def __init__(self, directory, max_bytes, segment_bytes, max_age_sec):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.segment_bytes = segment_bytes
+        self.max_age_sec = max_age_sec
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._segments = sorted(f for f in os.listdir(directory) if f.endswith(".wal"))
+        self._next_id = int(self._segments[-1].split(".")[0]) + 1 if self._segments else 0
+        self._current = None
+        self._current_series = {}
+        self.dropped_segments = 0
+
+    @property
+    def pending(self):
+        return bool(self._segments)
+
+    def _segment_path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _open_segment(self):
+        name = f"{self._next_id:012d}.wal"
+        self._next_id += 1
+        self._segments.append(name)
+        self._current = open(self._segment_path(name), "ab")
+        self._current_series = {}
+
+    def _close_segment(self):
+        if self._current is not None:
+            self._current.close()
+            self._current = None
+            self._current_series = {}
+
+    def _enforce_limits(self):
+        now = time.time()
+        sizes = {name: os.path.getsize(self._segment_path(name)) for name in self._segments}
+        total = sum(sizes.values())
+        while self._segments:
+            oldest = self._segments[0]
+            expired = now - os.path.getmtime(self._segment_path(oldest)) > self.max_age_sec
+            if total <= self.max_bytes and not expired:
+                break
+            if self._current is not None and oldest == self._segments[-1]:
+                self._close_segment()
+            os.remove(self._segment_path(oldest))
+            self._segments.pop(0)
+            total -= sizes[oldest]
+            self.dropped_segments += 1
+            print(f"⚠️ Dropped journal segment {oldest} ({'expired' if expired else 'journal full'})")
+
+    def append(self, metrics_data):
+        """Journal every gauge point in ``metrics_data``. Returns the number of points written."""
+        written = 0
+        with self._lock:
+            for resource_metrics in metrics_data.resource_metrics:
+                resource = dict(resource_metrics.resource.attributes)
+                for scope_metrics in resource_metrics.scope_metrics:
+                    for metric in scope_metrics.metrics:
+                        if not isinstance(metric.data, Gauge):
+                            continue
+                        for point in metric.data.data_points:
+                            key = json.dumps({
+                                "resource": resource,
+                                "scope": scope_metrics.scope.name,
+                                "name": metric.name,
+                                "description": metric.description,
+                                "unit": metric.unit,
+                                "attributes": dict(point.attributes or {})
+                            }, sort_keys=True)
+                            self._write_point(key, point.time_unix_nano, point.value)
+                            written += 1
+            if self._current is not None:
+                self._current.flush()
+            self._enforce_limits()
+        return written
+
+    def _write_point(self, key, time_unix_nano, value):
+        if self._current is None or self._current.tell() >= self.segment_bytes:
+            self._close_segment()
+            self._open_segment()
+        series_id = self._current_series.get(key)
+        if series_id is None:
+            series_id = len(self._current_series)
+            self._current_series[key] = series_id
+            encoded = key.encode("utf-8")
+            self._current.write(SERIES_HEADER.pack(b"S", series_id, len(encoded)) + encoded)
+        self._current.write(POINT.pack(b"P", series_id, time_unix_nano, float(value)))
+
+    @staticmethod
+    def _read_segment(path):
+        """Yield ``(series, time_unix_nano, value)`` for every point in a segment.
+
+        Reading stops at the first incomplete or undecodable record, which is
+        the torn tail a power cut leaves behind; everything before it is kept.
+        """
+        series = {}
+        with open(path, "rb") as f:
+            data = f.read()
+        offset = 0
+        while offset < len(data):
+            kind = data[offset:offset + 1]
+            if kind == b"S" and offset + SERIES_HEADER.size <= len(data):
+                _, series_id, length = SERIES_HEADER.unpack_from(data, offset)
+                offset += SERIES_HEADER.size
+                if offset + length > len(data):
+                    break
+                try:
+                    series[series_id] = json.loads(data[offset:offset + length])
+                except ValueError:
+                    break
+                offset += length
+            elif kind == b"P" and offset + POINT.size <= len(data):
+                _, series_id, time_unix_nano, value = POINT.unpack_from(data, offset)
+                offset += POINT.size
+                if series_id in series:
+                    yield series[series_id], time_unix_nano, value
+            else:
+                break  # Torn write at the end of a segment
+
+    @staticmethod
+    def _build_batch(points):
+        """Rebuild MetricsData from journaled points, keeping their original timestamps"""
+        grouped = {}
+        for info, time_unix_nano, value in points:
+            resource_key = json.dumps(info["resource"], sort_keys=True)
+            metric_key = (info["scope"], info["name"], info["description"], info["unit"])
+            grouped.setdefault(resource_key, {}).setdefault(metric_key, []).append(
+                NumberDataPoint(attributes=info["attributes"], start_time_unix_nano=0,
+                                time_unix_nano=time_unix_nano, value=value))
+
+        resource_metrics = []
+        for resource_key, metrics_by_key in grouped.items():
+            scopes = {}
+            for (scope, name, description, unit), data_points in metrics_by_key.items():
+                scopes.setdefault(scope, []).append(
+                    Metric(name=name, description=description, unit=unit, data=Gauge(data_points=data_points)))
+            resource_metrics.append(ResourceMetrics(
+                resource=Resource(json.loads(resource_key)),
+                scope_metrics=[ScopeMetrics(scope=InstrumentationScope(scope), metrics=metrics, schema_url="")
+                               for scope, metrics in scopes.items()],
+                schema_url=""))
+        return MetricsData(resource_metrics=resource_metrics)
+
+    def replay(self, export, batch_points, max_seconds=None):
+        """Send the oldest segments through ``export`` until the journal is empty.
+
+        ``export`` takes a MetricsData and returns True on success. A segment is
+        deleted only after all of its batches are accepted; if a batch fails,
+        replay stops and the segment is retried later. With ``max_seconds`` no
+        new segment is started after that long, so one call cannot hold up
+        the exporter indefinitely; the rest follows on the next export.
+        """
+        replayed = 0
+        started = time.monotonic()
+        with self._lock:
+            self._close_segment()
+            while self._segments:
+                if max_seconds is not None and time.monotonic() - started >= max_seconds:
+                    break
+                name = self._segments[0]
+                batch = []
+                for point in self._read_segment(self._segment_path(name)):
+                    batch.append(point)
+                    if len(batch) >= batch_points:
+                        if not export(self._build_batch(batch)):
+                            return replayed
+                        replayed += len(batch)
+                        batch = []
+                if batch:
+                    if not export(self._build_batch(batch)):
+                        return replayed
+                    replayed += len(batch)
+                os.remove(self._segment_path(name))
+                self._segments.pop(0)
+        return replayed
+
+
+class JournalingMetricExporter(MetricExporter):
+    """Wraps an exporter so failed exports are journaled and replayed on recovery"""
+
+    def __init__(self, exporter, journal, replay_batch_points=500):
+        super().__init__(preferred_temporality=exporter._preferred_temporality,
+                         preferred_aggregation=exporter._preferred_aggregation)
+        self._exporter = exporter
+        self._journal = journal
+        self._replay_batch_points = replay_batch_points
+        self._journaled = 0  # Points journaled since the exporter started failing
+
+    def export(self, metrics_data, timeout_millis=10_000, **kwargs):
+        result = self._exporter.export(metrics_data, timeout_millis=timeout_millis, **kwargs)
+        if result == MetricExportResult.SUCCESS:
+            if self._journaled:
+                print(f"✅ Metrics export recovered after journaling {self._journaled} readings")
+                self._journaled = 0
+            if self._journal.pending:
+                replayed = self._journal.replay(
+                    lambda batch: self._exporter.export(batch, timeout_millis=timeout_millis) == MetricExportResult.SUCCESS,
+                    self._replay_batch_points, max_seconds=timeout_millis / 1000)
+                if replayed:
+                    print(f"✅ Replayed {replayed} journaled readings")
+        else:
+            if not self._journaled:
+                print(f"⚠️ Metrics export failed, journaling readings to {self._journal.directory}")
+            self._journaled += self._journal.append(metrics_data)
+        return result
+
+    def force_flush(self, timeout_millis=10_000):
+        return self._exporter.force_flush(timeout_millis=timeout_millis)
+
+    def shutdown(self, timeout_millis=30_000, **kwargs):
+        self._exporter.shutdown(timeout_millis=timeout_millis, **kwargs)
@@ -0,0 +1,127 @@
+import math
+import threading
+from array import array
+from collections import deque
+
+# Aggregation windows in seconds
+WINDOWS = {"5m": 300, "1h": 3600, "12h": 43200}
+METRICS = ("temperature", "humidity")
+
+
+class RollingWindow:
+    """Incremental min, max, mean and variance of one metric over a trailing time window.
+
+    Mean and variance use Welford's update with the matching removal step,
+    and min/max use monotonic deques, so every sample costs amortised O(1)
+    to add and to expire.
+    """
+
+    def __init__(self, duration):
+        self.duration = duration
+        self.head = 0  # Sequence number of the oldest sample still in the window
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min_seq = deque()
+        self.max_seq = deque()
+
+    def add(self, seq, value, values):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+        while self.min_seq and values[self.min_seq[-1] % len(values)] >= value:
+            self.min_seq.pop()
+        self.min_seq.append(seq)
+        while self.max_seq and values[self.max_seq[-1] % len(values)] <= value:
+            self.max_seq.pop()
+        self.max_seq.append(seq)
+
+    def expire(self, values, timestamps, now, oldest_available):
+        """Drop samples older than the window or overwritten in the ring"""
+        capacity = len(values)
+        while self.count and (self.head < oldest_available or timestamps[self.head % capacity] < now - self.duration):
+            value = values[self.head % capacity]
+            if self.count == 1:
+                self.count, self.mean, self.m2 = 0, 0.0, 0.0
+            else:
+                delta = value - self.mean
+                self.count -= 1
+                self.mean -= delta / self.count
+                self.m2 = max(0.0, self.m2 - delta * (value - self.mean))
+            if self.min_seq and self.min_seq[0] == self.head:
+                self.min_seq.popleft()
+            if self.max_seq and self.max_seq[0] == self.head:
+                self.max_seq.popleft()
+            self.head += 1
+
+    def summary(self, values):
+        if not self.count:
+            return {"count": 0, "min": None, "max": None, "mean": None, "variance": None, "stddev": None}
+        capacity = len(values)
+        variance = self.m2 / self.count
+        return {
+            "count": self.count,
+            "min": values[self.min_seq[0] % capacity],
+            "max": values[self.max_seq[0] % capacity],
+            "mean": self.mean,
+            "variance": variance,
+            "stddev": math.sqrt(variance)
+        }
+
+
+class RollingStats:
+    """Fixed-memory ring buffer of readings with rolling aggregates per window.
+
+    ``capacity`` should cover the longest window at the sampling rate; if it
+    does not, the longest windows simply cover the samples that fit.
+    """
+
+    def __init__(self, interval_sec, windows=WINDOWS):
+        self.windows = windows
+        self.capacity = int(max(windows.values()) / interval_sec) + 1
+        self.timestamps = array("d", [0.0]) * self.capacity
+        self.values = {metric: array("d", [0.0]) * self.capacity for metric in METRICS}
+        self.aggregates = {metric: {name: RollingWindow(duration) for name, duration in windows.items()}
+                           for metric in METRICS}
+        self.total = 0
+        self._lock = threading.Lock()
+
+    def add(self, timestamp, **readings):
+        """Record one reading, e.g. ``add(time.time(), temperature=21.5, humidity=88.0)``"""
+        with self._lock:
+            seq = self.total
+            slot = seq % self.capacity
+            oldest_available = seq + 1 - self.capacity
+            # Expire before overwriting the slot so removals still see the old value
+            for metric in METRICS:
+                for window in self.aggregates[metric].values():
+                    window.expire(self.values[metric], self.timestamps, timestamp, oldest_available)
+
+            self.timestamps[slot] = timestamp
+            for metric in METRICS:
+                self.values[metric][slot] = readings[metric]
+                for window in self.aggregates[metric].values():
+                    window.add(seq, readings[metric], self.values[metric])
+            self.total += 1
+
+    def snapshot(self, now=None):
+        """Return the latest reading and every window's aggregates"""
+        with self._lock:
+            if now is not None:
+                for metric in METRICS:
+                    for window in self.aggregates[metric].values():
+                        window.expire(self.values[metric], self.timestamps, now, self.total - self.capacity)
+            latest = None
+            if self.total:
+                slot = (self.total - 1) % self.capacity
+                latest = {"timestamp": self.timestamps[slot],
+                          **{metric: self.values[metric][slot] for metric in METRICS}}
+            return {
+                "latest": latest,
+                "samples": min(self.total, self.capacity),
+                **{metric: {name: window.summary(self.values[metric])
+                            for name, window in self.aggregates[metric].items()}
+                   for metric in METRICS}
+            }
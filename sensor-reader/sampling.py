@@ -0,0 +1,66 @@
+from collections import deque
+
+
+class EmaFilter:
+    """Exponential moving average, ``alpha`` is the weight of the newest sample"""
+
+    def __init__(self, alpha):
+        self.alpha = alpha
+        self.value = None
+
+    def update(self, sample):
+        if self.value is None:
+            self.value = sample
+        else:
+            self.value += self.alpha * (sample - self.value)
+        return self.value
+
+
+class MedianFilter:
+    """Running median of the last ``window`` samples, robust to single-read spikes"""
+
+    def __init__(self, window):
+        self.samples = deque(maxlen=window)
+
+    def update(self, sample):
+        self.samples.append(sample)
+        ordered = sorted(self.samples)
+        mid = len(ordered) // 2
+        if len(ordered) % 2:
+            return ordered[mid]
+        return (ordered[mid - 1] + ordered[mid]) / 2
+
+
+class PassthroughFilter:
+    def update(self, sample):
+        return sample
+
+
+def make_filter(kind, ema_alpha, median_window):
+    if kind == "ema":
+        return EmaFilter(ema_alpha)
+    elif kind == "median":
+        return MedianFilter(median_window)
+    return PassthroughFilter()
+
+
+class Deadband:
+    """Publish only when a value moves by at least ``threshold`` from the last
+    published value, or when ``heartbeat_sec`` has passed without a publish."""
+
+    def __init__(self, threshold, heartbeat_sec):
+        self.threshold = threshold
+        self.heartbeat_sec = heartbeat_sec
+        self.last_value = None
+        self.last_time = 0.0
+        self.suppressed = 0
+
+    def should_publish(self, value, now):
+        if (self.last_value is None
+                or abs(value - self.last_value) >= self.threshold
+                or now - self.last_time >= self.heartbeat_sec):
+            self.last_value = value
+            self.last_time = now
+            return True
+        self.suppressed += 1
+        return False
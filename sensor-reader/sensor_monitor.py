@@ -1,40 +1,114 @@
+import os
 import time
-import board
-import adafruit_sht31d
 # Import metrics-related modules for managing and exporting metrics with OpenTelemetry.
 from opentelemetry import metrics
 from opentelemetry.sdk.metrics import MeterProvider
 from opentelemetry.exporter.otlp.proto.http.metric_exporter import OTLPMetricExporter
 from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
+from opentelemetry.sdk.metrics.view import View, ExplicitBucketHistogramAggregation
 from opentelemetry.sdk.resources import Resource
-
-# Create sensor object, communicating over the board's default I2C bus
-i2c = board.I2C()  # uses board.SCL and board.SDA
-sensor = adafruit_sht31d.SHT31D(i2c)
-sensor_name = "SHT31-D"
-serial_number = sensor.serial_number  # Retrieve sensor's serial number
+from rolling_stats import RollingStats
+from stats_server import start_stats_server
+from sampling import Deadband, make_filter
+from journal import MetricJournal, JournalingMetricExporter
+from acquisition import AcquisitionLoop, load_devices
+
+# Sensors to read, one SHT31-D on the default I2C bus unless sensors.json lists more
+SENSOR_CONFIG = os.environ.get("SENSOR_CONFIG", os.path.join(os.path.dirname(os.path.abspath(__file__)), "sensors.json"))
+devices = load_devices(SENSOR_CONFIG)
 service_name = "sensor_reader"
 
-temp = 0
-hum = 0
-
-
-INTERVAL_SEC=5
+# Sensor is read at READ_INTERVAL_SEC and smoothed; the exporter collects every EXPORT_INTERVAL_SEC
+READ_INTERVAL_SEC = float(os.environ.get("READ_INTERVAL_SEC", "1"))
+EXPORT_INTERVAL_SEC = float(os.environ.get("EXPORT_INTERVAL_SEC", "5"))
+SMOOTHING = os.environ.get("SMOOTHING", "ema")  # ema, median or none
+EMA_ALPHA = float(os.environ.get("EMA_ALPHA", "0.2"))
+MEDIAN_WINDOW = int(os.environ.get("MEDIAN_WINDOW", "5"))
+
+# Only export a gauge when it moves by its deadband, or every HEARTBEAT_SEC regardless
+TEMP_DEADBAND = float(os.environ.get("TEMP_DEADBAND", "0.1"))    # °C
+HUM_DEADBAND = float(os.environ.get("HUM_DEADBAND", "0.5"))      # %
+HEARTBEAT_SEC = float(os.environ.get("HEARTBEAT_SEC", "60"))
+EXPORT_HISTOGRAM = os.environ.get("EXPORT_HISTOGRAM", "false").lower() == "true"
+
+STATS_PORT = int(os.environ.get("STATS_PORT", "8000"))
+
+# Readings that cannot be exported are journaled here and replayed once plant-hub is back
+JOURNAL_DIR = os.environ.get("JOURNAL_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "journal"))
+JOURNAL_MAX_BYTES = int(os.environ.get("JOURNAL_MAX_BYTES", str(16 * 1024 * 1024)))
+JOURNAL_SEGMENT_BYTES = int(os.environ.get("JOURNAL_SEGMENT_BYTES", str(256 * 1024)))
+JOURNAL_MAX_AGE_SEC = float(os.environ.get("JOURNAL_MAX_AGE_SEC", str(6 * 3600)))
+REPLAY_BATCH_POINTS = int(os.environ.get("REPLAY_BATCH_POINTS", "500"))
+
+class SensorChannel:
+    """Smoothing, deadband and rolling stats state for one device"""
+
+    def __init__(self, device):
+        self.device = device
+        self.temp = 0
+        self.hum = 0
+        self.temp_filter = make_filter(SMOOTHING, EMA_ALPHA, MEDIAN_WINDOW)
+        self.hum_filter = make_filter(SMOOTHING, EMA_ALPHA, MEDIAN_WINDOW)
+        self.temp_deadband = Deadband(TEMP_DEADBAND, HEARTBEAT_SEC)
+        self.hum_deadband = Deadband(HUM_DEADBAND, HEARTBEAT_SEC)
+        # Rolling 5m/1h/12h aggregates of every reading, served locally over HTTP
+        self.stats = RollingStats(READ_INTERVAL_SEC)
+        self.last_reading = 0
+
+    def attributes(self):
+        return {**self.device.attributes, "serial_number": self.device.serial_number, "sensor_name": self.device.name}
+
+channels = {device.name: SensorChannel(device) for device in devices}
+
+# Raw-sample distribution between exports, enabled with EXPORT_HISTOGRAM=true
+temp_histogram = None
+hum_histogram = None
+
+# Acquisition timing, recorded on every tick
+jitter_histogram = None
+latency_histogram = None
+TIMING_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0]
 
 def read_temperature(observer):
-    global temp
-    return [metrics.Observation(value=temp, attributes={"serial_number": serial_number, "sensor_name": sensor_name})]
+    now = time.time()
+    return [metrics.Observation(value=channel.temp, attributes=channel.attributes())
+            for channel in channels.values()
+            if channel.device.serial_number is not None and channel.temp_deadband.should_publish(channel.temp, now)]
 
 def read_humidity(observer):
-    global hum
-    return [metrics.Observation(value=hum,  attributes={"serial_number": serial_number, "sensor_name": sensor_name})]
+    now = time.time()
+    return [metrics.Observation(value=channel.hum, attributes=channel.attributes())
+            for channel in channels.values()
+            if channel.device.serial_number is not None and channel.hum_deadband.should_publish(channel.hum, now)]
+
+def read_failures(observer):
+    return [metrics.Observation(value=device.failures, attributes={"sensor_name": device.name}) for device in devices]
+
+def read_reconnects(observer):
+    return [metrics.Observation(value=device.reconnects, attributes={"sensor_name": device.name}) for device in devices]
 
 def create_guage():
-    exporter = OTLPMetricExporter(endpoint="http://plant-hub:4318/v1/metrics")
-    metric_reader = PeriodicExportingMetricReader(exporter, INTERVAL_SEC)
+    global temp_histogram, hum_histogram, jitter_histogram, latency_histogram
+    journal = MetricJournal(JOURNAL_DIR, JOURNAL_MAX_BYTES, JOURNAL_SEGMENT_BYTES, JOURNAL_MAX_AGE_SEC)
+    exporter = JournalingMetricExporter(
+                    OTLPMetricExporter(endpoint="http://plant-hub:4318/v1/metrics"),
+                    journal,
+                    REPLAY_BATCH_POINTS
+                )
+    metric_reader = PeriodicExportingMetricReader(exporter, export_interval_millis=EXPORT_INTERVAL_SEC * 1000)
     meter_provider = MeterProvider(
                     metric_readers=[metric_reader], 
-                    resource=Resource.create({"service.name": service_name})
+                    resource=Resource.create({"service.name": service_name}),
+                    views=[
+                        View(instrument_name="temperature_celsius_samples",
+                             aggregation=ExplicitBucketHistogramAggregation([float(b) for b in range(0, 41, 2)])),
+                        View(instrument_name="humidity_percent_samples",
+                             aggregation=ExplicitBucketHistogramAggregation([float(b) for b in range(0, 101, 5)])),
+                        View(instrument_name="sensor_schedule_jitter_seconds",
+                             aggregation=ExplicitBucketHistogramAggregation(TIMING_BUCKETS)),
+                        View(instrument_name="sensor_read_latency_seconds",
+                             aggregation=ExplicitBucketHistogramAggregation(TIMING_BUCKETS))
+                    ]
                 )
 
     metrics.set_meter_provider(meter_provider)
@@ -52,49 +126,81 @@ def create_guage():
                 description="Relative Humidity",
                 callbacks=[read_humidity]
             )
+
+    meter.create_observable_counter(
+                name="sensor_read_failures",
+                description="Failed sensor reads",
+                callbacks=[read_failures]
+            )
+
+    meter.create_observable_counter(
+                name="sensor_reconnects",
+                description="Successful sensor reconnections after a failure",
+                callbacks=[read_reconnects]
+            )
+
+    jitter_histogram = meter.create_histogram(
+                name="sensor_schedule_jitter_seconds",
+                unit="s",
+                description="Delay between a scheduled acquisition tick and the read starting"
+            )
+
+    latency_histogram = meter.create_histogram(
+                name="sensor_read_latency_seconds",
+                unit="s",
+                description="Time taken by each sensor read, including reconnect attempts"
+            )
+
+    if EXPORT_HISTOGRAM:
+        temp_histogram = meter.create_histogram(
+                    name="temperature_celsius_samples",
+                    unit="Cel",
+                    description="Distribution of raw temperature samples between exports"
+                )
+        hum_histogram = meter.create_histogram(
+                    name="humidity_percent_samples",
+                    unit="%",
+                    description="Distribution of raw humidity samples between exports"
+                )
     return temp_guage, humidity_gauge
 
+def record_tick(device, jitter, latency, ok):
+    attributes = {"sensor_name": device.name}
+    jitter_histogram.record(jitter, attributes)
+    # Failed reads include reconnect attempts, so keep them apart from the normal read latency
+    latency_histogram.record(latency, {**attributes, "outcome": "ok" if ok else "failed"})
+
+def handle_reading(device, current_time, raw_temp, raw_hum):
+    """Smooth, record and act on one reading from a device's acquisition worker"""
+    channel = channels[device.name]
+
+    # Smooth the fast samples; the gauges export the smoothed value
+    channel.temp = channel.temp_filter.update(raw_temp)
+    channel.hum = channel.hum_filter.update(raw_hum)
+    if temp_histogram is not None:
+        attributes = channel.attributes()
+        temp_histogram.record(raw_temp, attributes)
+        hum_histogram.record(raw_hum, attributes)
+
+    channel.stats.add(current_time, temperature=channel.temp, humidity=channel.hum)
+    device.update_heater(raw_hum, current_time)  # The heater reacts to saturation spikes the smoothing would hide
+
+    if current_time - channel.last_reading > 60:
+         print(f"🌡️ {device.name} Temp: {channel.temp:.2f}°C | 💧 Humidity: {channel.hum:.2f}%")
+         channel.last_reading = current_time
+
+def stats_snapshot(now):
+    return {"sensors": {name: channel.stats.snapshot(now=now) for name, channel in channels.items()}}
+
 def main():
-    """Main loop with controlled heater usage."""
-    heater_on = False
-    last_heater_time = 0
-    last_reading = 0
+    """Start the acquisition thread, metrics export and stats endpoint."""
     create_guage()
-
-    while True:
-        global temp, hum
-        try: 
-            temp = sensor.temperature
-            hum = sensor.relative_humidity
-        except:
-            print("Sensor has failed to connect")
-            time.sleep(5)
-            i2c = board.I2C()  # uses board.SCL and board.SDA
-            sensor = adafruit_sht31d.SHT31D(i2c)
-            time.sleep(1)
-            temp = sensor.temperature
-            hum = sensor.relative_humidity
-
-
-        current_time = time.time()
-
-        # 🌡️ **Heater Strategy**
-        if hum >= 99.5 and not heater_on:  
-            print("⚠️ Condensation risk detected! Enabling heater for 1 min.")
-            sensor.heater = True
-            heater_on = True
-            last_heater_time = current_time  # Store heater activation time
-
-        # 🔄 **Turn off heater after 1 min**
-        if heater_on and (current_time - last_heater_time > 60):
-            print("✅ Heater cycle complete, turning off.")
-            sensor.heater = False
-            heater_on = False
-
-        if current_time - last_reading > 60:
-             print(f"🌡️ Temp: {temp:.2f}°C | 💧 Humidity: {hum:.2f}%")
-             last_reading = current_time
-        time.sleep(5)
+    acquisition = AcquisitionLoop(devices, READ_INTERVAL_SEC, handle_reading, record_tick)
+    acquisition.start()
+    print(f"📡 Reading {len(devices)} sensor(s): {', '.join(device.name for device in devices)}")
+    start_stats_server(stats_snapshot, STATS_PORT, extra=lambda: {"acquisition": acquisition.health()})
+    print(f"📊 Serving rolling stats on port {STATS_PORT}")
+    acquisition.join()
         
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,35 @@
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def start_stats_server(snapshot, port, host="0.0.0.0", extra=None):
+    """Serve ``snapshot(now)`` as JSON on a daemon thread.
+
+    ``extra`` may return a dict of additional top-level fields to include.
+    """
+
+    class StatsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/", "/stats"):
+                self.send_error(404)
+                return
+            data = snapshot(time.time())
+            if extra is not None:
+                data.update(extra())
+            body = json.dumps(data).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("Cache-Control", "no-store")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # Keep request logs out of the journal
+
+    server = ThreadingHTTPServer((host, port), StatsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="stats-server", daemon=True).start()
+    return server